@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Под ASGI меню читают async-версии view (menu/async_views.py)
+os.environ.setdefault('MENU_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
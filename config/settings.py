@@ -1,3 +1,4 @@
+import sys
 from pathlib import Path
 import environ
 
@@ -15,12 +16,18 @@ DEBUG = True
 
 TELEGRAM_TOKEN = env('TELEGRAM_TOKEN')
 
+# manage.py test: тесты не пишут в рабочие файлы кеша и метрик
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
 # Секретный ключ для редактирования меню (можно задать в .env как EDIT_SECRET_KEY)
 EDIT_SECRET_KEY = env('EDIT_SECRET_KEY', default='admin123edit')
 
 
 # OPENAI_API_KEY = env('OPENAI_API_KEY')
 ALLOWED_HOSTS = ['*']
+# Адрес сайта для абсолютных ссылок в меню (og:image), например https://buxoro.uz.
+# Пусто - og:image не выводится
+SITE_URL = env('SITE_URL', default='')
 CSRF_TRUSTED_ORIGINS = [
     'https://4fe3-92-38-9-203.ngrok-free.app',  # Добавь сюда свой ngrok-адрес
 ]
@@ -43,7 +50,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым: замер охватывает весь запрос (menu/profiling.py)
+    'menu.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Лимит проверяется до загрузки сессии: отклоненный запрос ничего не стоит
+    'menu.middleware.RateLimitMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,9 +63,55 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'menu.middleware.SaveUserIdMiddleware',
-    'menu.middleware.RateLimitMiddleware',
+    'menu.middleware.CartMiddleware',
 ]
 
+# Замер времени запросов (PerformanceMiddleware): разбивка на БД, кеш, шаблоны
+# и обработку изображений - в метриках и журнале медленных запросов
+PERFORMANCE_ENABLED = env.bool('PERFORMANCE_ENABLED', default=True)
+# Заголовок Server-Timing раскрывает клиентам число и время запросов к БД -
+# включать для диагностики. Ответам, которые может хранить CDN, он не добавляется
+PERFORMANCE_SERVER_TIMING = env.bool('PERFORMANCE_SERVER_TIMING', default=False)
+# Доля запросов, для которых собираются тексты SQL; медленные из них
+# (дольше PERFORMANCE_SLOW_REQUEST_MS) пишутся в JSONL-журнал. 0 - выключено
+PERFORMANCE_SLOW_SAMPLE_RATE = env.float('PERFORMANCE_SLOW_SAMPLE_RATE', default=0.05)
+PERFORMANCE_SLOW_REQUEST_MS = env.int('PERFORMANCE_SLOW_REQUEST_MS', default=500)
+PERFORMANCE_SLOW_LOG = env('PERFORMANCE_SLOW_LOG', default=str(BASE_DIR / 'logs' / 'slow_requests.jsonl'))
+PERFORMANCE_SLOW_LOG_MAX_BYTES = 10 * 1024 * 1024
+PERFORMANCE_SLOW_LOG_BACKUP_COUNT = 5
+
+# Метрики для Prometheus (/metrics/, доступ - сотрудники или METRICS_TOKEN).
+# Каждый воркер раз в METRICS_FLUSH_INTERVAL секунд пишет свой срез в METRICS_DIR
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=True)
+METRICS_DIR = None if TESTING else env('METRICS_DIR', default=str(BASE_DIR / '.metrics'))
+METRICS_FLUSH_INTERVAL = 5.0
+# Квантили p50/p95/p99 в /metrics/ считаются за последние N секунд
+METRICS_QUANTILE_WINDOW = 300
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+
+# Ограничение частоты запросов (menu/ratelimit.py).
+# Правила проверяются по порядку, срабатывает первое подходящее;
+# rate - среднее число запросов за период, burst - сколько можно подряд.
+RATELIMIT_ENABLED = env.bool('RATELIMIT_ENABLED', default=True)
+RATELIMIT_POLICIES = {
+    'edit': {'path': r'^/update-dish/', 'rate': '30/m', 'burst': 10},
+    'cart': {'path': r'^/(add-to-cart|remove-from-cart|update_cart|api/cart)/', 'rate': '60/m', 'burst': 30},
+    'api': {'path': r'^/api/', 'rate': '300/m', 'burst': 60},
+    'admin': {'path': r'^/admin/', 'rate': '120/m', 'burst': 60, 'methods': ['POST']},
+    'pages': {'path': r'^/', 'rate': '600/m', 'burst': 120},
+}
+# Пути без ограничений: статика, медиа и PDF меню (одна страница меню - десятки картинок)
+RATELIMIT_EXEMPT_PATHS = [r'^/static/', r'^/media/', r'^/$', r'^/favicon\.ico$']
+# Лимиты считаются в каждом воркере отдельно. True - раз в RATELIMIT_SYNC_INTERVAL
+# секунд суммировать их в общем кеше и блокировать клиента сразу во всех воркерах
+RATELIMIT_SHARED_SYNC = env.bool('RATELIMIT_SHARED_SYNC', default=False)
+RATELIMIT_SYNC_INTERVAL = 1.0
+# Заголовок с адресом клиента (за прокси - например, HTTP_X_REAL_IP или HTTP_X_FORWARDED_FOR)
+RATELIMIT_CLIENT_IP_HEADER = env('RATELIMIT_CLIENT_IP_HEADER', default='REMOTE_ADDR')
+# Сколько своих прокси дописывают адрес в X-Forwarded-For (nginx - 1, CDN и nginx - 2):
+# клиентом считается этот по счету адрес справа, левее - подделываемые клиентом
+RATELIMIT_TRUSTED_PROXIES = env.int('RATELIMIT_TRUSTED_PROXIES', default=1)
+
 CORS_ORIGIN_ALLOW_ALL = True  # Разрешить все домены (для разработки)
 CORS_ALLOW_CREDENTIALS = True  # Разрешить передачу куки
 
@@ -63,11 +120,11 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени отрисовки для Server-Timing
+        'BACKEND': 'menu.profiling.TimedDjangoTemplates',
         'DIRS': [
             BASE_DIR / 'templates',
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -75,33 +132,119 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Шаблоны компилируются один раз на процесс (вместо APP_DIRS)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Чтение меню (страница, load-dishes, PDF, API списков) обслуживают async-версии
+# view (menu/async_views.py). Включается в config/asgi.py; под WSGI - sync-версии.
+MENU_ASYNC_VIEWS = env.bool('MENU_ASYNC_VIEWS', default=False)
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Соединение переиспользуется между запросами и проверяется перед использованием.
+        # Под ASGI синхронный код запроса выполняется в отдельном потоке, и постоянные
+        # соединения накапливались бы - там они по умолчанию выключены
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=0 if MENU_ASYNC_VIEWS else 600),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# PRAGMA для каждого нового соединения SQLite: значения по умолчанию - в menu/db.py
+# (DEFAULT_SQLITE_PRAGMAS), здесь - только отличия, например {'mmap_size': 0}
+SQLITE_PRAGMAS = {}
+
+# Кеш в файле SQLite общий для всех воркеров на сервере: меню прогревается
+# один раз, а сброс версии меню после правки видят все процессы.
+# CACHE_BACKEND=locmem - прежний кеш в памяти каждого процесса (он же в тестах;
+# SQLiteCache проверяется отдельно на временном файле).
+if env('CACHE_BACKEND', default='locmem' if TESTING else 'sqlite') == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'menu.cache_backends.SQLiteCache',
+            'LOCATION': env('CACHE_LOCATION', default=str(BASE_DIR / 'cache.sqlite3')),
+            'OPTIONS': {
+                'MAX_ENTRIES': 5000,
+                # Время обращения (для LRU) при чтении обновляется не чаще раза в минуту
+                'TOUCH_INTERVAL': 60,
+            },
+        }
     }
-}
+
+# Анонимные GET меню и API меню отдаются с Cache-Control: public, s-maxage=N -
+# CDN или reverse proxy перед Django сам отвечает на повторные запросы N секунд
+# (после правки меню прокси может отдавать старые данные до N секунд). 0 - выключено
+MENU_PUBLIC_CACHE_SECONDS = env.int('MENU_PUBLIC_CACHE_SECONDS', default=60)
+
+# PDF меню (static/menu/menu.pdf): время кеширования в браузере и режим отдачи.
+# Файл может обновляться, поэтому браузер перепроверяет его по ETag (ответ 304).
+MENU_PDF_MAX_AGE = 60 * 60
+# None - файл отдает Django; 'x-sendfile' (Apache/lighttpd) или 'x-accel-redirect' (nginx) -
+# Django только проверяет заголовки, а файл (и Range) отдает фронт-сервер
+MENU_PDF_SENDFILE = env('MENU_PDF_SENDFILE', default=None)
+# Внутренний location nginx для X-Accel-Redirect
+MENU_PDF_ACCEL_PREFIX = '/protected/menu/'
+
+# PDF меню собирается из базы (menu/pdf.py, manage.py build_menu_pdf).
+# True - пересобирать в фоне после каждого изменения меню (в uWSGI - только с
+# --enable-threads; на PythonAnywhere False + периодическая задача build_menu_pdf)
+MENU_PDF_AUTOBUILD = env.bool('MENU_PDF_AUTOBUILD', default=True)
+# Текст в PDF векторный; разрешение фотографий блюд и шрифт с кириллицей
+# (встраивается в PDF; по умолчанию ищется DejaVuSans)
+MENU_PDF_IMAGE_DPI = 200
+MENU_PDF_FONT = env('MENU_PDF_FONT', default='')
+# Сверстанные разделы (категории) для пересборки только изменившихся
+MENU_PDF_CACHE_DIR = BASE_DIR / '.menu_pdf_cache'
+
+# Время жизни кеша меню (ключи версионируются, сброс - по сигналам моделей)
+MENU_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Сколько дней помнить удаленные блюда/категории для api/changes/.
+# Клиент, не обновлявшийся дольше, получит полную выгрузку
+MENU_TOMBSTONE_RETENTION_DAYS = env.int('MENU_TOMBSTONE_RETENTION_DAYS', default=30)
+
+# Фоновая обработка загруженных изображений (ресайз + WebP) в пуле потоков.
+# Потоки в uWSGI работают только с --enable-threads: иначе (PythonAnywhere) нужна
+# периодическая задача process_image_jobs (DEPLOYMENT.md).
+# False - обработка сразу при сохранении модели
+IMAGE_PROCESSING_ASYNC = env.bool('IMAGE_PROCESSING_ASYNC', default=True)
+IMAGE_PROCESSING_WORKERS = 2
+# Ширины уменьшенных копий изображений для srcset
+IMAGE_VARIANT_WIDTHS = (160, 320, 640, 1024)
 
 SESSION_COOKIE_AGE = 500
 SESSION_COOKIE_SAMESITE = 'Lax'  # Dlya prodashn nujno sdelat None
 SESSION_COOKIE_SECURE = False  # Dlya prodakshn nujno sdelat True
 # CSRF_COOKIE_SECURE = True  # CSRF-токены тоже должны быть защищены
-SESSION_SAVE_EVERY_REQUEST = True
+# Сессия сохраняется только при изменении: просмотр меню не пишет в БД
+SESSION_SAVE_EVERY_REQUEST = False
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 
+# Хранилище корзины: подписанная cookie (по умолчанию), кеш или сессия в БД
+#   menu.cart.SignedCookieCartBackend / menu.cart.CacheCartBackend / menu.cart.SessionCartBackend
+CART_BACKEND = env('CART_BACKEND', default='menu.cart.SignedCookieCartBackend')
+CART_COOKIE_NAME = 'cart'
+CART_COOKIE_AGE = 60 * 60 * 3
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -155,6 +298,10 @@ STORAGES = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = env('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
 
+# Обработанные изображения хранятся в MEDIA_ROOT/images/ под именами по хешу
+# содержимого и могут отдаваться с Cache-Control: immutable
+CONTENT_ADDRESSED_MEDIA_PREFIX = 'images'
+
 MEDIA_DIRS = [
     BASE_DIR / 'media',
 ]
@@ -1,7 +1,9 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from menu.views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -9,5 +11,7 @@ urlpatterns = [
 
 ]
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if settings.DEBUG:
+    # Медиа с заголовком immutable для файлов, названных по хешу
+    urlpatterns += [re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serve_media)]
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
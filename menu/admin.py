@@ -1,13 +1,15 @@
 from django.contrib import admin
 
-from .models import Category, Dish, Restaurant
+from .models import Category, Dish, ImageJob, Restaurant
+from .search import search_index
+from .storage import release_image_files
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'display_order', 'image')
     list_editable = ('display_order',)
-    search_fields = ('name',)
+    search_fields = ('name',)  # подстрока в названии, см. get_search_results
     ordering = ('display_order',)
 
 
@@ -31,21 +33,32 @@ class ImageFilter(admin.SimpleListFilter):
 
 @admin.register(Dish)
 class DishAdmin(admin.ModelAdmin):
-    list_display = ('name', 'image', 'category', 'price', 'is_available', 'display_order')
+    list_display = ('name', 'image', 'category', 'price', 'is_available', 'display_order', 'image_status')
     list_editable = ('price', 'is_available', 'display_order')
-    search_fields = ('name',)
-    list_filter = ('category', 'is_available', ImageFilter)  # Добавляем новый фильтр
+    list_select_related = ('category',)  # Dish.__str__ и колонка категории без N+1
+    search_fields = ('name',)  # подстрока в названии, см. get_search_results
+    list_filter = ('category', 'is_available', ImageFilter, 'image_status')  # Добавляем новый фильтр
     ordering = ('category', 'display_order')
 
     actions = ['clear_image']
 
+    def get_search_results(self, request, queryset, search_term):
+        """Подстрока в названии, как со search_fields, но по индексу в памяти вместо
+        LIKE '%...%' по всей таблице и без учета регистра кириллицы"""
+        if not search_term:
+            return queryset, False
+        search_index.ensure_current()
+        return queryset.filter(pk__in=search_index.name_contains(search_term)), False
+
     @admin.action(description="Очистить изображение")
     def clear_image(self, request, queryset):
         for dish in queryset:
             if dish.image:
-                dish.image.delete(save=False)
+                # Файл может использоваться другими объектами (дедупликация по хешу)
+                release_image_files(dish.image.name, dish.image_variants, exclude=dish)
                 dish.image = None
-                dish.save(update_fields=['image'])
+                dish.image_variants = {}
+                dish.save(update_fields=['image', 'image_variants'])
 
         self.message_user(request, "Изображение успешно удалено", level="info")
 
@@ -53,3 +66,10 @@ class DishAdmin(admin.ModelAdmin):
 @admin.register(Restaurant)
 class RestaurantAdmin(admin.ModelAdmin):
     list_display = ('name',)
+
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ('source', 'model_label', 'object_id', 'status', 'created_at', 'finished_at')
+    list_filter = ('status', 'model_label')
+    readonly_fields = [field.name for field in ImageJob._meta.fields]
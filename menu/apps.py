@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class MenuConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'menu'
+
+    def ready(self):
+        # Подключаем обработчики сигналов инвалидации кеша
+        from . import signals  # noqa: F401
+        # Настройка соединений SQLite (WAL, pragmas)
+        from . import db  # noqa: F401
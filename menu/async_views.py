@@ -0,0 +1,168 @@
+"""Async-версии view чтения меню для ASGI (config/asgi.py включает MENU_ASYNC_VIEWS).
+
+Ответы те же, что у sync-версий в views.py. Под ASGI sync view выполняется
+в потоке, и поток занят, пока запрос ждет кеш, БД или отправку файла; здесь
+ожидание идет в цикле событий, а в поток уходят только синхронные операции.
+API отдает только JSON: браузерный API DRF (нет поддержки async) - под WSGI.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotAllowed
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.renderers import JSONRenderer
+
+from . import views
+from .compiler import aget_compiled_menu
+from .documents import menu_pdf
+from .models import Category, Dish, Restaurant
+from .pagination import apaginate_queryset, parse_page_size
+from .revision import aget_menu_revision
+from .serializers import CategorySerializer, DishSerializer, RestaurantSerializer
+from .views import _cache_publicly, _dishes_page_response, _finish_menu_response, _menu_etag
+
+# Готовая страница меню (без режима редактирования): (версия, HTML).
+# Страница не зависит от Host и схемы запроса (ссылки - от SITE_URL)
+_local_page = (None, None)
+
+
+async def _menu_revision(request):
+    """Ревизия меню, запомненная на время запроса (ее же читает views._menu_revision)"""
+    if not hasattr(request, '_menu_revision'):
+        request._menu_revision = await aget_menu_revision()
+    return request._menu_revision
+
+
+def menu_conditional(view_func):
+    """Async-версия views.menu_conditional (декоратор condition в Django 4.2 не поддерживает async view)"""
+
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        # Как у APIView: данные меню только читаются
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        version, modified = await _menu_revision(request)
+        etag = quote_etag(_menu_etag(request))
+        last_modified = int(modified.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = await view_func(request, *args, **kwargs)
+        if not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(last_modified)
+        response.headers.setdefault('ETag', etag)
+        return _finish_menu_response(request, response)
+
+    return wrapper
+
+
+def _json(data, status=200):
+    # Те же байты, что отдает DRF (JSONRenderer)
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+async def serve_menu_pdf(request):
+    """PDF меню с асинхронным чтением файла (StaticDocument.aserve)"""
+    return await menu_pdf.aserve(request)
+
+
+async def menu_view(request):
+    """Главная страница меню.
+
+    Без режима редактирования страница одинакова для всех посетителей: она
+    рисуется sync-версией в потоке один раз на версию меню, затем отдается
+    из памяти процесса.
+    """
+    global _local_page
+    version = (await _menu_revision(request))[0]
+    if 'edit' in request.GET:
+        return await sync_to_async(views.menu_view)(request)
+
+    cached_version, content = _local_page
+    if cached_version != version:
+        response = await sync_to_async(views.menu_view)(request)
+        session = getattr(request, 'session', None)
+        if (response.status_code == 200 and not response.cookies
+                and not (session is not None and session.accessed)):
+            _local_page = (version, response.content)
+        return response
+
+    response = HttpResponse(content)
+    if not _cache_publicly(request, response):
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+@menu_conditional
+async def load_dishes(request, category_id):
+    """Загрузка блюд по категории из снимка меню (views.load_dishes)"""
+    compiled = await aget_compiled_menu((await _menu_revision(request))[0])
+    return _dishes_page_response(request, compiled, category_id)
+
+
+@menu_conditional
+async def bulk_data(request):
+    """Все категории и блюда одним ответом (views.BulkDataAPIView)"""
+    compiled = await aget_compiled_menu((await _menu_revision(request))[0])
+    return HttpResponse(compiled.bulk, content_type='application/json')
+
+
+@menu_conditional
+async def restaurant_list(request):
+    """Рестораны (views.RestaurantListView)"""
+    restaurants = [restaurant async for restaurant in Restaurant.objects.all()]
+    return _json(RestaurantSerializer(restaurants, many=True).data)
+
+
+@menu_conditional
+async def category_list(request):
+    """Категории (views.CategoryListView)"""
+    categories = [category async for category in Category.objects.all().order_by('display_order')]
+    return _json(CategorySerializer(categories, many=True).data)
+
+
+@menu_conditional
+async def dish_list(request, category_id=None):
+    """Блюда с пагинацией по номеру страницы или курсору (views.DishListView)"""
+    try:
+        items_per_page = parse_page_size(request.GET.get('per_page'), 20)
+        page_number = int(request.GET.get('page', 1))
+    except ValueError:
+        return _json({'error': 'Неверный формат параметров'}, status=400)
+
+    dishes = Dish.objects.select_related('category').filter(is_available=True).order_by('display_order', 'id')
+    if category_id:
+        if not await Category.objects.filter(id=category_id).aexists():
+            return _json({'detail': 'Страница не найдена.'}, status=404)
+        dishes = dishes.filter(category_id=category_id)
+
+    if 'cursor' in request.GET:
+        try:
+            page = await apaginate_queryset(dishes, request.GET['cursor'], items_per_page)
+        except ValueError as e:
+            return _json({'error': str(e)}, status=400)
+
+        data = {
+            'dishes': DishSerializer(page.items, many=True).data,
+            'has_next': page.has_next(),
+            'has_previous': page.has_previous(),
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+        }
+        if request.GET.get('count') == '1':
+            data['count'] = await dishes.acount()
+        return _json(data)
+
+    # Paginator синхронный; номер вне диапазона дает последнюю страницу, как Paginator.get_page
+    total_pages = max(1, -(-await dishes.acount() // items_per_page))
+    if page_number < 1 or page_number > total_pages:
+        page_number = total_pages
+    start = (page_number - 1) * items_per_page
+    page_dishes = [dish async for dish in dishes[start:start + items_per_page]]
+    return _json({
+        'dishes': DishSerializer(page_dishes, many=True).data,
+        'has_next': page_number < total_pages,
+        'has_previous': page_number > 1,
+        'total_pages': total_pages,
+        'current_page': page_number,
+    })
@@ -0,0 +1,111 @@
+"""Нагрузочные замеры, запускаются командой manage.py benchmark <набор>"""
+import statistics
+import threading
+import time
+from importlib import import_module
+
+from django.db import connections
+
+# Имя набора -> модуль с функцией run(options), возвращающей список результатов
+SUITES = {
+    'cache': 'menu.benchmarks.cache',
+    'sqlite': 'menu.benchmarks.sqlite',
+    'ratelimit': 'menu.benchmarks.ratelimit',
+    'search': 'menu.benchmarks.search',
+    'metrics': 'menu.benchmarks.metrics',
+    'http': 'menu.benchmarks.http',
+    'asgi': 'menu.benchmarks.asgi',
+}
+
+
+def get_suite(name):
+    return import_module(SUITES[name])
+
+
+def measure(name, func, iterations, warmup=10):
+    """Вызывает func iterations раз и возвращает статистику задержки в микросекундах"""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter_ns()
+        func()
+        timings.append((time.perf_counter_ns() - started) / 1000)
+    return summarize(name, timings)
+
+
+def measure_concurrent(name, func, clients, iterations, setup=None, warmup=5):
+    """Вызывает func из clients потоков (всего iterations раз): задержки и пропускная способность.
+
+    setup() создает состояние клиента (например, тестовый Client с cookie),
+    которое передается в func. func возвращает False при ошибке.
+    """
+    per_client = max(1, iterations // clients)
+    timings = [[] for _ in range(clients)]
+    errors = [0] * clients
+    barrier = threading.Barrier(clients + 1)
+
+    def worker(index):
+        try:
+            state = setup() if setup else None
+            for _ in range(warmup):
+                func(state)
+        except BaseException:
+            # Остальные потоки не должны ждать упавший
+            barrier.abort()
+            connections.close_all()
+            raise
+        try:
+            barrier.wait()
+            local = timings[index]
+            for _ in range(per_client):
+                started = time.perf_counter_ns()
+                ok = func(state)
+                local.append((time.perf_counter_ns() - started) / 1000)
+                if ok is False:
+                    errors[index] += 1
+        finally:
+            # У каждого потока свое соединение с БД
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        for thread in threads:
+            thread.join()
+        raise RuntimeError(f"{name}: клиент завершился с ошибкой при подготовке")
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    result = summarize(name, [timing for local in timings for timing in local])
+    result['clients'] = clients
+    result['throughput_rps'] = round(result['iterations'] / elapsed, 1)
+    result['errors'] = sum(errors)
+    return result
+
+
+def summarize(name, timings):
+    timings = sorted(timings)
+    return {
+        'name': name,
+        'iterations': len(timings),
+        'mean_us': round(statistics.fmean(timings), 2),
+        'p50_us': round(percentile(timings, 50), 2),
+        'p95_us': round(percentile(timings, 95), 2),
+        'p99_us': round(percentile(timings, 99), 2),
+    }
+
+
+def percentile(sorted_values, percent):
+    """Перцентиль с линейной интерполяцией по отсортированному списку"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
@@ -0,0 +1,143 @@
+"""Емкость одного ASGI-процесса: те же маршруты с sync view (до перевода) и async view.
+
+Запросы передаются прямо в ASGIHandler (без сети) из одного цикла событий:
+clients соединений одновременно, каждое принимает ответ порциями с задержкой,
+как медленный мобильный клиент. threads_peak - сколько потоков держал процесс,
+rss_growth_mb - рост занятой памяти за замер (только Linux).
+Sync FileResponse под ASGI Django читает в память целиком (в потоке) -
+предупреждение об этом в замере скрыто. Меню - из текущей базы (generate_menu).
+"""
+import asyncio
+import itertools
+import os
+import threading
+import time
+import types
+import warnings
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test import override_settings
+
+from menu.documents import menu_pdf
+from menu.models import Category
+from menu.urls import menu_urlpatterns
+
+from . import summarize
+
+CONCURRENCY = (10, 100)
+# Задержка клиента на каждую порцию ответа (64 КБ), секунды
+SLOW_CLIENT_DELAY = 0.005
+
+
+def _rss_mb():
+    """Занятая процессом память (None, если /proc недоступен)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+
+async def _request(app, path, delay):
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'accept', b'*/*')],
+        'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Клиент не отключается
+        await asyncio.Event().wait()
+
+    status = None
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif delay:
+            await asyncio.sleep(delay)
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _load(app, paths, clients, total, delay):
+    paths = itertools.cycle(paths)
+    remaining = total
+    timings, errors, threads_peak = [], 0, threading.active_count()
+    rss_start = rss_peak = _rss_mb()
+
+    async def client():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter_ns()
+            status = await _request(app, next(paths), delay)
+            timings.append((time.perf_counter_ns() - started) / 1000)
+            if status is None or status >= 400:
+                errors += 1
+
+    async def monitor():
+        nonlocal threads_peak, rss_peak
+        while True:
+            threads_peak = max(threads_peak, threading.active_count())
+            if rss_start is not None:
+                rss_peak = max(rss_peak, _rss_mb())
+            await asyncio.sleep(0.005)
+
+    watcher = asyncio.create_task(monitor())
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    watcher.cancel()
+    rss_growth = round(rss_peak - rss_start, 1) if rss_start is not None else None
+    return timings, errors, threads_peak, rss_growth, elapsed
+
+
+def run(options):
+    iterations = options['iterations']
+    category_ids = list(Category.objects.values_list('id', flat=True)[:5])
+    if not category_ids:
+        raise CommandError("Меню пустое: заполните базу командой generate_menu")
+    paths = ['/v2/', '/api/categories/', '/api/bulk/']
+    for category_id in category_ids:
+        paths += [f'/load-dishes/{category_id}/', f'/api/dishes/{category_id}/?page=2']
+    if menu_pdf.stat() is not None:
+        paths.append('/')
+
+    levels = (options['clients'],) if options.get('clients') else CONCURRENCY
+    results = []
+    for async_read in (False, True):
+        urlconf = types.ModuleType('benchmark_urls')
+        urlconf.urlpatterns = menu_urlpatterns(async_read=async_read)
+        with override_settings(ROOT_URLCONF=urlconf, RATELIMIT_ENABLED=False,
+                               PERFORMANCE_SLOW_SAMPLE_RATE=0, METRICS_ENABLED=False), \
+                warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='StreamingHttpResponse must consume synchronous iterators')
+            app = ASGIHandler()
+            # Прогрев: снимок меню и страница в кеше
+            asyncio.run(_load(app, paths, 1, len(paths), 0))
+            for clients in levels:
+                timings, errors, threads_peak, rss_growth, elapsed = asyncio.run(
+                    _load(app, paths, clients, max(iterations, clients), SLOW_CLIENT_DELAY)
+                )
+                result = summarize(f'{"async" if async_read else "sync"}_views_c{clients}', timings)
+                result['clients'] = clients
+                result['throughput_rps'] = round(result['iterations'] / elapsed, 1)
+                result['errors'] = errors
+                result['threads_peak'] = threads_peak
+                result['rss_growth_mb'] = rss_growth
+                results.append(result)
+        connections.close_all()
+    return results
@@ -0,0 +1,44 @@
+"""Сравнение задержки кеша: LocMemCache против общего SQLiteCache"""
+import os
+import tempfile
+
+from django.core.cache.backends.locmem import LocMemCache
+
+from menu.cache_backends import SQLiteCache
+
+from . import measure
+
+# Размер значения - порядка страницы блюд из скомпилированного меню
+VALUE_SIZE = 4096
+KEY_COUNT = 500
+
+
+def _backends(directory):
+    return {
+        'locmem': LocMemCache('benchmark', {'OPTIONS': {'MAX_ENTRIES': KEY_COUNT * 2}}),
+        'sqlite': SQLiteCache(os.path.join(directory, 'cache.sqlite3'), {'OPTIONS': {'MAX_ENTRIES': KEY_COUNT * 2}}),
+    }
+
+
+def run(options):
+    iterations = options['iterations']
+    value = os.urandom(VALUE_SIZE)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for backend_name, backend in _backends(directory).items():
+            backend.set_many({f'key:{i}': value for i in range(KEY_COUNT)}, timeout=None)
+            counter = iter(range(10 ** 9))
+
+            def hit():
+                backend.get(f'key:{next(counter) % KEY_COUNT}')
+
+            def miss():
+                backend.get('missing')
+
+            def write():
+                backend.set(f'key:{next(counter) % KEY_COUNT}', value, timeout=None)
+
+            results.append(measure(f'{backend_name}.get_hit', hit, iterations))
+            results.append(measure(f'{backend_name}.get_miss', miss, iterations))
+            results.append(measure(f'{backend_name}.set', write, iterations))
+    return results
@@ -0,0 +1,94 @@
+"""Запросы к основным страницам и API параллельными клиентами (на текущей базе).
+
+Запросы выполняет тестовый клиент Django в потоках этого же процесса - без
+сети и веб-сервера (gunicorn/uvicorn), под GIL. Замер показывает стоимость
+view, middleware, БД и кеша и годится для сравнения коммитов, но не емкость
+сервера: ее нужно мерить внешним генератором нагрузки (wrk, locust).
+
+Меню для замера создается командой generate_menu. Лимитер запросов и
+журнал медленных запросов на время замера отключены.
+"""
+import random
+
+from django.core.files.base import ContentFile
+from django.core.management.base import CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from menu.image_pipeline import IMAGE_VARIANT_WIDTHS
+from menu.management.commands.generate_menu import synthetic_image
+from menu.models import Category, Dish, process_image_variants
+
+from . import measure_concurrent
+
+DEFAULT_CLIENTS = 4
+SEARCH_QUERIES = ('плов', 'шаш', 'баранина рис', 'лагмн', 'сыр')
+
+
+def _ok(response):
+    return response.status_code < 400
+
+
+def run(options):
+    iterations = options['iterations']
+    clients = options.get('clients') or DEFAULT_CLIENTS
+    category_ids = list(Category.objects.values_list('id', flat=True))
+    dish_ids = list(Dish.objects.filter(is_available=True).values_list('id', flat=True)[:1000])
+    if not category_ids or not dish_ids:
+        raise CommandError("Меню пустое: заполните базу командой generate_menu")
+
+    def client():
+        return Client(), random.Random()
+
+    def menu_view(state):
+        return _ok(state[0].get(reverse('menu')))
+
+    def load_dishes(state):
+        http, rng = state
+        return _ok(http.get(reverse('load_dishes', args=[rng.choice(category_ids)]), {'page': rng.randint(1, 3)}))
+
+    def dish_list(state):
+        http, rng = state
+        return _ok(http.get(reverse('dish_list_by_category', args=[rng.choice(category_ids)]),
+                            HTTP_ACCEPT='application/json'))
+
+    def bulk_data(state):
+        return _ok(state[0].get(reverse('bulk_data'), HTTP_ACCEPT='application/json'))
+
+    def search(state):
+        http, rng = state
+        return _ok(http.get(reverse('search_dishes'), {'q': rng.choice(SEARCH_QUERIES)}))
+
+    def cart_flow(state):
+        # Добавить блюдо, изменить количество, открыть корзину
+        http, rng = state
+        dish_id = rng.choice(dish_ids)
+        responses = [
+            http.get(reverse('add_to_cart', args=[dish_id])),
+            http.post(reverse('update_cart'), {'dish_id': dish_id, 'quantity': rng.randint(1, 5)}),
+            http.get(reverse('get_cart')),
+            http.get(reverse('view_cart')),
+        ]
+        return all(_ok(response) for response in responses)
+
+    image = synthetic_image(random.Random(1))
+
+    def process_image(state):
+        process_image_variants(ContentFile(image, name='benchmark.jpg'), quality=Dish.IMAGE_QUALITY,
+                               max_size=Dish.IMAGE_MAX_SIZE, widths=IMAGE_VARIANT_WIDTHS)
+
+    scenarios = [
+        ('menu_view', menu_view, iterations),
+        ('load_dishes', load_dishes, iterations),
+        ('dish_list_api', dish_list, iterations),
+        ('bulk_data_api', bulk_data, iterations),
+        ('search_api', search, iterations),
+        ('cart_flow', cart_flow, max(iterations // 4, clients)),
+        # Обработка изображения на порядки дольше запроса к меню
+        ('process_image', process_image, max(iterations // 100, clients)),
+    ]
+    with override_settings(RATELIMIT_ENABLED=False, PERFORMANCE_SLOW_SAMPLE_RATE=0, METRICS_ENABLED=False):
+        return [
+            measure_concurrent(name, func, clients, count, setup=client, warmup=2 if name == 'process_image' else 5)
+            for name, func, count in scenarios
+        ]
@@ -0,0 +1,40 @@
+"""Стоимость учета запроса в реестре метрик и сборки ответа /metrics/"""
+import tempfile
+
+from django.test import RequestFactory
+from django.urls import resolve
+
+from menu import metrics
+from menu.metrics import MetricsRegistry, record_request
+from menu.profiling import RequestMetrics
+
+from . import measure
+
+WORKERS = 8
+
+
+def run(options):
+    iterations = options['iterations']
+    original = metrics.registry
+    with tempfile.TemporaryDirectory() as directory:
+        # Замер не должен попасть в метрики сервера
+        registry = metrics.registry = MetricsRegistry(directory, flush_interval=5.0)
+        try:
+            request = RequestFactory().get('/load-dishes/1/')
+            request.resolver_match = resolve('/load-dishes/1/')
+            request_metrics = RequestMetrics()
+            request_metrics.add('db', 0.001, 3)
+            request_metrics.cache_hits = 2
+            results = [
+                measure('record_request', lambda: record_request(request, 200, 0.012, request_metrics), iterations),
+            ]
+
+            # Срезы остальных воркеров
+            for _ in range(WORKERS - 1):
+                worker = MetricsRegistry(directory)
+                worker._counters, worker._histograms = registry._counters, registry._histograms
+                worker.flush()
+            results.append(measure(f'render_{WORKERS}_workers', registry.render, max(iterations // 20, 10), warmup=2))
+        finally:
+            metrics.registry = original
+    return results
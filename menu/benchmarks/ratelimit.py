@@ -0,0 +1,33 @@
+"""Накладные расходы лимитера на один запрос"""
+from django.test import RequestFactory
+
+from menu.ratelimit import build_limiter
+
+from . import measure
+
+CLIENTS = 1000
+
+
+def run(options):
+    iterations = options['iterations']
+    limiter = build_limiter()
+    factory = RequestFactory()
+    # Лимит в замере не должен срабатывать - даем корзинам неисчерпаемый запас
+    for policy in limiter.policies:
+        policy.burst = policy.count = 10 ** 9
+
+    asset = factory.get('/media/images/ab/ab12.webp')
+    page = factory.get('/load-dishes/1/')
+    requests = [factory.get('/api/dishes/', REMOTE_ADDR=f'10.0.{i // 256}.{i % 256}') for i in range(CLIENTS)]
+    counter = iter(range(10 ** 9))
+
+    results = [
+        measure('exempt_path', lambda: limiter.check(asset), iterations),
+        measure('one_client', lambda: limiter.check(page), iterations),
+        measure(f'{CLIENTS}_clients', lambda: limiter.check(requests[next(counter) % CLIENTS]), iterations),
+    ]
+
+    limiter.shared_sync = True
+    limiter.reset()
+    results.append(measure('one_client_shared_sync', lambda: limiter.check(page), iterations))
+    return results
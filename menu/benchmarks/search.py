@@ -0,0 +1,50 @@
+"""Поиск блюд по индексу в памяти на синтетическом меню"""
+import random
+import time
+
+from menu.models import Category, Dish
+from menu.search import SearchIndex
+
+from . import measure
+
+DISHES = 10000
+WORDS = (
+    'плов', 'шашлык', 'лагман', 'манты', 'самса', 'шурпа', 'чучвара', 'нарын', 'долма', 'казан',
+    'кабоб', 'osh', 'norin', 'qozon', 'говядина', 'баранина', 'курица', 'овощи', 'зелень', 'томат',
+    'лук', 'морковь', 'рис', 'тесто', 'сыр', 'грибы', 'острый', 'домашний', 'фирменный', 'tandir',
+)
+
+
+def build_index(dish_count):
+    rng = random.Random(1)
+    categories = [Category(id=i, name=f'{WORDS[i]} категория') for i in range(20)]
+    index = SearchIndex()
+    for i in range(dish_count):
+        dish = Dish(
+            id=i + 1,
+            category=categories[i % len(categories)],
+            name=' '.join(rng.sample(WORDS, 2)) + f' {i}',
+            description=' '.join(rng.sample(WORDS, 6)),
+            price=10000,
+        )
+        index.add(dish)
+    return index
+
+
+def run(options):
+    iterations = options['iterations']
+    started = time.perf_counter()
+    index = build_index(DISHES)
+    build_ms = round((time.perf_counter() - started) * 1000)
+
+    queries = {
+        'prefix_short': 'пл',
+        'exact_word': 'шашлык',
+        'two_words': 'плов баранина',
+        'uzbek_latin': 'qozon',
+        'typo': 'шашлвк',
+    }
+    results = [measure(name, lambda query=query: index.search(query), iterations) for name, query in queries.items()]
+    results[0]['build_ms'] = build_ms
+    results[0]['dishes'] = DISHES
+    return results
@@ -0,0 +1,127 @@
+"""Конкурентный доступ к SQLite: N читателей меню и M писателей корзин.
+
+Сравниваются настройки по умолчанию (журнал DELETE) и настройки из
+menu/db.py. busy_timeout в замере отключен: каждое ожидание блокировки
+считается и повторяется, чтобы была видна доля операций, упершихся в блокировку.
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from menu.db import apply_pragmas, get_sqlite_pragmas
+
+from . import summarize
+
+DISH_COUNT = 300
+READERS = 8
+WRITERS = 2
+
+
+def _prepare(path):
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        'CREATE TABLE dish (id INTEGER PRIMARY KEY, category_id INTEGER, name TEXT, price TEXT, display_order INTEGER);'
+        'CREATE TABLE session (key TEXT PRIMARY KEY, data TEXT, expire REAL);'
+        'CREATE INDEX dish_order ON dish (category_id, display_order, id);'
+    )
+    connection.executemany(
+        'INSERT INTO dish (category_id, name, price, display_order) VALUES (?, ?, ?, ?)',
+        [(i % 10, f'Блюдо {i}', '25000.00', i) for i in range(DISH_COUNT)],
+    )
+    connection.commit()
+    connection.close()
+
+
+def _connect(path, pragmas):
+    connection = sqlite3.connect(path, timeout=0, check_same_thread=False)
+    apply_pragmas(connection, pragmas)
+    return connection
+
+
+def _retrying(connection, operation, stats):
+    while True:
+        try:
+            return operation(connection)
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            connection.rollback()
+            stats['lock_waits'] += 1
+            time.sleep(0.0005)
+
+
+def _read_page(connection):
+    category_id = random.randrange(10)
+    connection.execute(
+        'SELECT id, name, price FROM dish WHERE category_id = ? ORDER BY display_order, id LIMIT 15', (category_id,)
+    ).fetchall()
+
+
+def _write_cart(connection):
+    key = f'session-{random.randrange(1000)}'
+    connection.execute('BEGIN IMMEDIATE')
+    connection.execute('REPLACE INTO session (key, data, expire) VALUES (?, ?, ?)', (key, '{"cart": {"1": 2}}', time.time()))
+    connection.execute('COMMIT')
+
+
+def _worker(path, pragmas, operation, count, stats, timings, barrier):
+    connection = _connect(path, pragmas)
+    connection.isolation_level = None
+    barrier.wait()
+    for _ in range(count):
+        started = time.perf_counter_ns()
+        _retrying(connection, operation, stats)
+        timings.append((time.perf_counter_ns() - started) / 1000)
+        stats['operations'] += 1
+    connection.close()
+
+
+def _run_config(name, pragmas, options):
+    readers = options.get('readers') or READERS
+    writers = options.get('writers') or WRITERS
+    iterations = options['iterations']
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.sqlite3')
+        _prepare(path)
+        # journal_mode хранится в самом файле базы
+        setup = sqlite3.connect(path)
+        setup.execute(f"PRAGMA journal_mode = {pragmas.get('journal_mode', 'DELETE')}")
+        setup.close()
+
+        groups = {
+            'read': (_read_page, readers, {'operations': 0, 'lock_waits': 0}, []),
+            'write': (_write_cart, writers, {'operations': 0, 'lock_waits': 0}, []),
+        }
+        barrier = threading.Barrier(readers + writers)
+        threads = []
+        started = time.perf_counter()
+        for operation, workers, stats, timings in groups.values():
+            for _ in range(workers):
+                # Счетчики общие на группу; редкие потерянные инкременты на замер не влияют
+                thread = threading.Thread(
+                    target=_worker, args=(path, pragmas, operation, iterations, stats, timings, barrier)
+                )
+                threads.append(thread)
+                thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    results = []
+    for group, (_, workers, stats, timings) in groups.items():
+        result = summarize(f'{name}.{group}', timings)
+        result.update({
+            'workers': workers,
+            'ops_per_sec': round(stats['operations'] / elapsed, 1),
+            'lock_wait_rate': round(stats['lock_waits'] / max(stats['operations'], 1), 4),
+        })
+        results.append(result)
+    return results
+
+
+def run(options):
+    tuned = {name: value for name, value in get_sqlite_pragmas().items() if name != 'busy_timeout'}
+    return _run_config('default', {}, options) + _run_config('tuned', tuned, options)
@@ -0,0 +1,79 @@
+import gzip
+import hashlib
+import json
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него отдаем gzip
+    brotli = None
+
+# Ширина уменьшенной копии, которую service worker кеширует для офлайна
+THUMBNAIL_WIDTH = 320
+
+# Не больше стольких хешей в ?known= (защита от огромных запросов)
+MAX_KNOWN_HASHES = 500
+
+
+def _dump(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _thumbnail_url(image_url, image_variants):
+    """Копия не уже THUMBNAIL_WIDTH (или самая большая из имеющихся)"""
+    for width, url in image_variants.items():
+        if int(width) >= THUMBNAIL_WIDTH:
+            return url
+    if image_variants:
+        return list(image_variants.values())[-1]
+    return image_url
+
+
+class MenuBundle:
+    """Все меню одним JSON-ответом для офлайн-работы.
+
+    Каждая категория несет хеш своего содержимого. Клиент присылает известные
+    ему хеши (?known=), и в ответ неизменившиеся категории приходят без блюд -
+    только {id, hash}. Полное тело заранее сжато gzip (и brotli, если установлен).
+    """
+
+    def __init__(self, version, categories):
+        self.version = version
+        self.categories = []
+        for category in categories:
+            category = dict(category)
+            category['hash'] = hashlib.sha256(_dump(category)).hexdigest()[:12]
+            self.categories.append(category)
+
+        self.body = _dump({'version': version, 'categories': self.categories})
+        self.encoded = {'gzip': gzip.compress(self.body, compresslevel=9)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(self.body)
+
+    def render(self, known=()):
+        """Тело ответа: полное или только с изменившимися категориями"""
+        known = set(known)
+        if not known:
+            return self.body
+        return _dump({
+            'version': self.version,
+            'categories': [
+                {'id': category['id'], 'hash': category['hash']} if category['hash'] in known else category
+                for category in self.categories
+            ],
+        })
+
+    def thumbnail_urls(self):
+        """Изображения категорий и блюд для предзагрузки service worker'ом"""
+        urls = []
+        for category in self.categories:
+            for item in (category, *category['dishes']):
+                url = _thumbnail_url(item.get('image_url'), item.get('image_variants') or {})
+                if url and url not in urls:
+                    urls.append(url)
+        return urls
+
+
+def parse_known(value):
+    """?known=hash1,hash2 -> список хешей"""
+    return [part for part in (value or '').split(',') if part][:MAX_KNOWN_HASHES]
+
@@ -0,0 +1,233 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .profiling import record_cache
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite (режим WAL), общий для всех процессов на сервере.
+
+    В отличие от LocMemCache, каждый WSGI-воркер видит одни и те же данные:
+    прогретое меню и сброс версии меню после правки доступны всем процессам.
+    Вытеснение - LRU по времени последнего обращения.
+
+    LOCATION - путь к файлу. OPTIONS, кроме стандартных MAX_ENTRIES и
+    CULL_FREQUENCY:
+        TOUCH_INTERVAL: как часто (сек) обновлять время обращения при чтении;
+            чтение чаще этого интервала не пишет в базу
+        BUSY_TIMEOUT: сколько ждать (сек), пока другой процесс держит запись
+        CULL_CHECK_INTERVAL: число записей процесса между проверками размера
+            (по умолчанию 1% MAX_ENTRIES) - между проверками кеш может
+            превысить MAX_ENTRIES на столько записей в каждом процессе
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = str(location)
+        self._touch_interval = float(options.get('TOUCH_INTERVAL', 60))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._cull_check_interval = int(options.get('CULL_CHECK_INTERVAL', max(1, self._max_entries // 100)))
+        # Записи с последней проверки размера; экземпляр кеша у каждого потока свой
+        self._writes_since_cull = 0
+        self._local = threading.local()
+
+    # ------------------------- соединение
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            # После fork соединение родителя использовать нельзя
+            connection = self._connect()
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _connect(self):
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self._path, timeout=self._busy_timeout, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, accessed REAL NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+        return connection
+
+    def close(self, **kwargs):
+        # Django закрывает кеши после каждого запроса; соединение с файлом
+        # дешевле держать открытым в потоке, чем заново настраивать
+        pass
+
+    # ------------------------- сериализация
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _loads(self, data):
+        return pickle.loads(data)
+
+    # ------------------------- API кеша
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        # Перезаписываем только истекшую запись - одна атомарная команда
+        cursor = self._connection.execute(
+            'INSERT INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires, '
+            'accessed = excluded.accessed WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, self._dumps(value), self.get_backend_timeout(timeout), now, now),
+        )
+        if cursor.rowcount:
+            self._cull(now, 1)
+        return bool(cursor.rowcount)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._get_many([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        return {key_map[key]: value for key, value in self._get_many(list(key_map)).items()}
+
+    def _get_many(self, keys):
+        if not keys:
+            return {}
+        started = time.perf_counter()
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._connection.execute(
+            f'SELECT key, value, expires, accessed FROM cache WHERE key IN ({placeholders})', keys
+        ).fetchall()
+
+        values, stale = {}, []
+        for key, data, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                continue
+            values[key] = self._loads(data)
+            if now - accessed >= self._touch_interval:
+                stale.append(key)
+        if stale:
+            # Время обращения для LRU обновляем не чаще TOUCH_INTERVAL
+            placeholders = ', '.join('?' * len(stale))
+            self._connection.execute(f'UPDATE cache SET accessed = ? WHERE key IN ({placeholders})', [now, *stale])
+        # Для Server-Timing (PerformanceMiddleware)
+        record_cache(time.perf_counter() - started, hits=len(values), misses=len(keys) - len(values))
+        return values
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._set_many([(key, value)], timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = [(self.make_and_validate_key(key, version=version), value) for key, value in data.items()]
+        self._set_many(items, timeout)
+        return []
+
+    def _set_many(self, items, timeout):
+        started = time.perf_counter()
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        rows = [(key, self._dumps(value), expires, now) for key, value in items]
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)', rows)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        self._cull(now, len(rows))
+        record_cache(time.perf_counter() - started)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self._connection.execute(
+            'UPDATE cache SET expires = ?, accessed = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        )
+        return bool(cursor.rowcount)
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+        return bool(cursor.rowcount)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            placeholders = ', '.join('?' * len(keys))
+            self._connection.execute(f'DELETE FROM cache WHERE key IN ({placeholders})', keys)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно для всех процессов: чтение и запись под блокировкой записи SQLite"""
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found." % key)
+            value = self._loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?', (self._dumps(value), time.time(), key)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return value
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache')
+
+    def _cull(self, now, writes):
+        """Удаляет истекшие записи, а при переполнении - давно не читанные (LRU).
+
+        COUNT(*) проходит всю таблицу, поэтому размер проверяется не после
+        каждой записи, а раз в CULL_CHECK_INTERVAL записей.
+        """
+        if self._max_entries <= 0:
+            return
+        self._writes_since_cull += writes
+        if self._writes_since_cull < self._cull_check_interval:
+            return
+        self._writes_since_cull = 0
+        connection = self._connection
+        (count,) = connection.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count <= self._max_entries:
+            return
+        connection.execute('DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (now,))
+        (count,) = connection.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (max(count // self._cull_frequency, count - self._max_entries),),
+        )
@@ -0,0 +1,125 @@
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+CART_COOKIE_NAME = getattr(settings, 'CART_COOKIE_NAME', 'cart')
+CART_COOKIE_AGE = getattr(settings, 'CART_COOKIE_AGE', 60 * 60 * 3)
+CART_SIGNING_SALT = 'menu.cart'
+
+
+class BaseCartBackend:
+    """Хранилище корзины одного запроса.
+
+    Views работают только с load()/save(); запись cookie (если нужна)
+    выполняет CartMiddleware через finalize().
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self._cart = None
+        self.modified = False
+
+    def load(self):
+        """Содержимое корзины: {dish_id: данные позиции}"""
+        if self._cart is None:
+            self._cart = self.read()
+        return self._cart
+
+    def save(self, cart):
+        self._cart = cart
+        self.modified = True
+        self.write(cart)
+
+    def read(self):
+        raise NotImplementedError
+
+    def write(self, cart):
+        raise NotImplementedError
+
+    def finalize(self, response):
+        """Дописывает в ответ состояние корзины (cookie), если она изменилась"""
+
+    def _set_cookie(self, response, value):
+        response.set_cookie(
+            CART_COOKIE_NAME, value,
+            max_age=CART_COOKIE_AGE,
+            httponly=True,
+            samesite=settings.SESSION_COOKIE_SAMESITE,
+            secure=settings.SESSION_COOKIE_SECURE,
+        )
+
+
+class SessionCartBackend(BaseCartBackend):
+    """Корзина в сессии Django (при SESSION_ENGINE=db - в таблице django_session)"""
+
+    def read(self):
+        return self.request.session.get('cart', {})
+
+    def write(self, cart):
+        self.request.session['cart'] = cart
+        self.request.session.modified = True
+
+
+class SignedCookieCartBackend(BaseCartBackend):
+    """Корзина целиком в подписанной cookie: сервер ничего не хранит"""
+
+    def read(self):
+        value = self.request.COOKIES.get(CART_COOKIE_NAME)
+        if not value:
+            return {}
+        try:
+            return signing.loads(value, salt=CART_SIGNING_SALT, max_age=CART_COOKIE_AGE)
+        except signing.BadSignature:
+            return {}
+
+    def write(self, cart):
+        pass
+
+    def finalize(self, response):
+        if not self.modified:
+            return
+        if self._cart:
+            self._set_cookie(response, signing.dumps(self._cart, salt=CART_SIGNING_SALT, compress=True))
+        else:
+            response.delete_cookie(CART_COOKIE_NAME, samesite=settings.SESSION_COOKIE_SAMESITE)
+
+
+class CacheCartBackend(BaseCartBackend):
+    """Корзина в кеше, в cookie - только подписанный идентификатор"""
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.cart_id = None
+        self.new_id = False
+        value = request.COOKIES.get(CART_COOKIE_NAME)
+        if value:
+            try:
+                self.cart_id = signing.loads(value, salt=CART_SIGNING_SALT)
+            except signing.BadSignature:
+                pass
+
+    def _key(self):
+        return f'cart:{self.cart_id}'
+
+    def read(self):
+        if not self.cart_id:
+            return {}
+        return cache.get(self._key(), {})
+
+    def write(self, cart):
+        if not self.cart_id:
+            self.cart_id = uuid.uuid4().hex
+            self.new_id = True
+        cache.set(self._key(), cart, CART_COOKIE_AGE)
+
+    def finalize(self, response):
+        if self.modified:
+            # Продлеваем срок cookie вместе со сроком записи в кеше
+            self._set_cookie(response, signing.dumps(self.cart_id, salt=CART_SIGNING_SALT))
+
+
+def get_cart_backend_class():
+    return import_string(getattr(settings, 'CART_BACKEND', 'menu.cart.SignedCookieCartBackend'))
@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Category, Dish, MenuRevisionCounter, Restaurant, Tombstone
+from .serializers import CategorySerializer, DishSerializer, RestaurantSerializer
+
+# Сколько дней хранить записи об удаленных объектах
+TOMBSTONE_RETENTION_DAYS = getattr(settings, 'MENU_TOMBSTONE_RETENTION_DAYS', 30)
+
+# Модели выгрузки: ключ ответа -> (модель, сериализатор)
+TRACKED_MODELS = {
+    'restaurants': (Restaurant, RestaurantSerializer),
+    'categories': (Category, CategorySerializer),
+    'dishes': (Dish, DishSerializer),
+}
+
+
+def record_tombstone(instance):
+    """Запоминает удаление объекта меню (вызывается в транзакции удаления)"""
+    Tombstone.objects.create(
+        model_label=instance._meta.model_name,
+        object_id=instance.pk,
+        revision=MenuRevisionCounter.next_value(),
+    )
+
+
+def prune_tombstones(retention_days=None):
+    """Удаляет старые надгробия; клиенты с более старой ревизией получат полную выгрузку
+
+    Returns:
+        int: сколько записей удалено
+    """
+    if retention_days is None:
+        retention_days = TOMBSTONE_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    with transaction.atomic():
+        expired = Tombstone.objects.filter(deleted_at__lt=cutoff)
+        last_revision = max(expired.values_list('revision', flat=True), default=None)
+        if last_revision is None:
+            return 0
+        deleted, _ = Tombstone.objects.filter(revision__lte=last_revision).delete()
+        MenuRevisionCounter.objects.filter(pk=1, pruned_through__lt=last_revision).update(
+            pruned_through=last_revision
+        )
+    return deleted
+
+
+def get_changes(since=None):
+    """Изменения меню после ревизии since.
+
+    Возвращает только записи с большей ревизией и id удаленных объектов.
+    Без since, если надгробия после since уже удалены или since больше
+    текущей ревизии (клиент видел данные другой базы), выгрузка полная
+    ('full': True) - клиент заменяет свои данные целиком.
+    """
+    # Все чтения - из одного снимка базы
+    with transaction.atomic():
+        revision, pruned_through = MenuRevisionCounter.current()
+        full = since is None or since < pruned_through or since > revision
+        result = {'revision': revision, 'full': full}
+        for key, (model, serializer_class) in TRACKED_MODELS.items():
+            queryset = model.objects.order_by('revision')
+            if not full:
+                queryset = queryset.filter(revision__gt=since, revision__lte=revision)
+            if model is Dish:
+                queryset = queryset.select_related('category')
+            result[key] = serializer_class(queryset, many=True).data
+
+        deleted = {key: [] for key in TRACKED_MODELS}
+        if not full:
+            labels = {model._meta.model_name: key for key, (model, _) in TRACKED_MODELS.items()}
+            tombstones = Tombstone.objects.filter(revision__gt=since, revision__lte=revision).order_by('revision')
+            for model_label, object_id in tombstones.values_list('model_label', 'object_id'):
+                if model_label in labels:
+                    deleted[labels[model_label]].append(object_id)
+        result['deleted'] = deleted
+    return result
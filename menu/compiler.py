@@ -0,0 +1,167 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from .bundle import MenuBundle
+from .models import Category, Dish
+from .pagination import paginate_sorted
+from .revision import MENU_CACHE_TIMEOUT, aget_menu_revision, get_menu_version, menu_cache_key
+from .serializers import CategorySerializer, DishSerializer
+
+# Количество блюд на странице load_dishes
+DISHES_PER_PAGE = 15
+
+
+class CompiledMenu:
+    """Снимок меню, заранее сериализованный в готовые к отдаче UTF-8 JSON байты"""
+
+    def __init__(self, version, category_pages, category_dishes, bulk, bundle=None):
+        self.version = version
+        # {category_id: [bytes страницы 1, bytes страницы 2, ...]}
+        self.category_pages = category_pages
+        # {category_id: ([(display_order, id), ...], [данные блюда, ...])} для курсорной пагинации
+        self.category_dishes = category_dishes
+        # Тело ответа BulkDataAPIView
+        self.bulk = bulk
+        # Все меню одним ответом для офлайн-режима (menu/bundle.py)
+        self.bundle = bundle
+
+    def get_page(self, category_id, page_number):
+        """Страница блюд категории (None, если категории нет).
+
+        Номер вне диапазона дает последнюю страницу, как Paginator.get_page.
+        """
+        pages = self.category_pages.get(category_id)
+        if pages is None:
+            return None
+        if page_number < 1 or page_number > len(pages):
+            page_number = len(pages)
+        return pages[page_number - 1]
+
+    def get_cursor_page(self, category_id, cursor, page_size=DISHES_PER_PAGE):
+        """Страница блюд категории по курсору (None, если категории нет).
+
+        Raises:
+            ValueError: курсор поврежден
+        """
+        dishes = self.category_dishes.get(category_id)
+        if dishes is None:
+            return None
+        keys, dish_data = dishes
+        page = paginate_sorted(dish_data, keys, cursor, page_size)
+        return _dump({
+            'dishes': page.items,
+            'has_next': page.has_next(),
+            'has_previous': page.has_previous(),
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+        })
+
+
+def _dump(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _dish_data(dish):
+    return {
+        'id': dish.id,
+        'name': dish.name,
+        'description': dish.description or '',
+        'price': str(dish.price),
+        'image_url': dish.image.url if dish.image else None,
+        'image_variants': dish.image_urls,
+        'image_srcset': dish.image_srcset,
+        'is_available': dish.is_available,
+    }
+
+
+def _compile_pages(dish_data):
+    """Разбивка списка блюд категории на сериализованные страницы"""
+    total_pages = max(1, -(-len(dish_data) // DISHES_PER_PAGE))
+    pages = []
+    for number in range(1, total_pages + 1):
+        start = (number - 1) * DISHES_PER_PAGE
+        pages.append(_dump({
+            'dishes': dish_data[start:start + DISHES_PER_PAGE],
+            'has_next': number < total_pages,
+            'has_previous': number > 1,
+            'total_pages': total_pages,
+            'current_page': number,
+        }))
+    return pages
+
+
+def compile_menu(version):
+    """Собирает весь снимок меню двумя запросами к БД"""
+    categories = list(Category.objects.order_by('display_order', 'id'))
+    dishes = list(Dish.objects.select_related('category').order_by('display_order', 'id'))
+
+    available = {category.id: ([], []) for category in categories}
+    for dish in dishes:
+        if dish.is_available:
+            keys, dish_data = available[dish.category_id]
+            keys.append((dish.display_order, dish.id))
+            dish_data.append(_dish_data(dish))
+
+    category_pages = {category_id: _compile_pages(data) for category_id, (keys, data) in available.items()}
+
+    bulk = JSONRenderer().render({
+        'categories': CategorySerializer(categories, many=True).data,
+        'dishes': DishSerializer(dishes, many=True).data,
+    })
+    bundle = MenuBundle(version, [
+        {
+            'id': category.id,
+            'name': category.name,
+            'image_url': category.image.url if category.image else None,
+            'image_variants': category.image_urls,
+            'image_srcset': category.image_srcset,
+            'dishes': available[category.id][1],
+        }
+        for category in categories
+    ])
+    return CompiledMenu(version, category_pages, available, bulk, bundle)
+
+
+# Снимок, уже загруженный в этот процесс: при совпадении версии
+# запрос обходится без десериализации из кеша
+_local_menu = None
+
+
+def get_compiled_menu():
+    """Актуальный снимок меню.
+
+    Компилируется лениво - один раз на версию меню, затем отдается
+    из памяти процесса или из общего кеша.
+    """
+    global _local_menu
+
+    version = get_menu_version()
+    compiled = _local_menu
+    if compiled is not None and compiled.version == version:
+        return compiled
+
+    cache_key = menu_cache_key('compiled', version=version)
+    compiled = cache.get(cache_key)
+    if compiled is None:
+        compiled = compile_menu(version)
+        cache.set(cache_key, compiled, MENU_CACHE_TIMEOUT)
+
+    _local_menu = compiled
+    return compiled
+
+
+async def aget_compiled_menu(version=None):
+    """То же для async view: снимок из памяти процесса отдается без перехода в поток.
+
+    version - уже известная запросу версия меню (экономит обращение к кешу).
+    """
+    if version is None:
+        version = (await aget_menu_revision())[0]
+    compiled = _local_menu
+    if compiled is not None and compiled.version == version:
+        return compiled
+    # Загрузка из кеша или компиляция - синхронный ORM
+    return await sync_to_async(get_compiled_menu)()
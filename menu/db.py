@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .profiling import query_timer
+
+# Настройки SQLite для одновременных чтений меню и записей корзин/сессий.
+# WAL: читатели не блокируются писателем; остальное - меньше fsync и больше кеша.
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -20000,  # в КБ (отрицательное значение), т.е. ~20 МБ
+    'temp_store': 'MEMORY',
+}
+
+
+def get_sqlite_pragmas():
+    return {**DEFAULT_SQLITE_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+
+
+def apply_pragmas(cursor, pragmas):
+    """Выполняет PRAGMA для открытого соединения SQLite"""
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Настраивает каждое новое соединение SQLite (с CONN_MAX_AGE - раз на соединение)"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, get_sqlite_pragmas())
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    """Замер SQL для PerformanceMiddleware на каждом соединении.
+
+    Под ASGI запросы к БД выполняются в потоках sync_to_async, а не в потоке
+    middleware, поэтому обертка ставится на соединение, а не на время запроса.
+    Без активного замера query_timer просто вызывает execute.
+    """
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
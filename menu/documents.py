@@ -0,0 +1,246 @@
+import os
+import re
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Предсжатые копии рядом с файлом: menu.pdf.br, menu.pdf.gz
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+CHUNK_SIZE = 64 * 1024
+# Порция асинхронного чтения: каждая - переход в поток, поэтому крупнее
+ASYNC_CHUNK_SIZE = 256 * 1024
+
+
+def choose_encoding(request, available):
+    """Лучшая из доступных кодировок (br, gzip), которую принимает клиент"""
+    accepted = {
+        part.split(';', 1)[0].strip()
+        for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')
+        if not part.strip().endswith(';q=0')
+    }
+    for encoding, _ in PRECOMPRESSED:
+        if encoding in available and encoding in accepted:
+            return encoding
+    return None
+
+
+class DocumentStat:
+    __slots__ = ('size', 'mtime', 'etag', 'variants')
+
+    def __init__(self, size, mtime, etag, variants):
+        self.size = size
+        self.mtime = mtime
+        self.etag = etag
+        # {кодировка: (путь, размер, etag)}
+        self.variants = variants
+
+
+class StaticDocument:
+    """Отдача одного статического файла (PDF меню) с учетом HTTP-кеширования.
+
+    - 304 по If-None-Match / If-Modified-Since;
+    - Range-запросы (206) для постепенной загрузки во вьюерах PDF;
+    - предсжатые копии (.br/.gz) для полных ответов;
+    - режим sendfile: файл отдает фронт-сервер (X-Sendfile или X-Accel-Redirect);
+    - метаданные файла кешируются на stat_ttl секунд, повторные запросы не
+      обращаются к файловой системе до открытия файла.
+    """
+
+    def __init__(self, path, content_type, filename=None, max_age=3600, stat_ttl=2.0,
+                 sendfile=None, accel_prefix=None):
+        self.path = str(path)
+        self.content_type = content_type
+        self.filename = filename or os.path.basename(self.path)
+        self.max_age = max_age
+        self.stat_ttl = stat_ttl
+        self.sendfile = sendfile
+        self.accel_prefix = accel_prefix
+        self._stat = None
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def stat(self):
+        """Метаданные файла (None, если файла нет), не чаще раза в stat_ttl секунд"""
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < self.stat_ttl:
+            return self._stat
+        with self._lock:
+            self._stat = self._read_stat()
+            self._checked = now
+        return self._stat
+
+    def invalidate(self):
+        """Сбрасывает метаданные после замены файла"""
+        with self._lock:
+            self._checked = None
+
+    def _read_stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        etag = f'{st.st_mtime_ns:x}-{st.st_size:x}'
+        variants = {}
+        for encoding, suffix in PRECOMPRESSED:
+            try:
+                variant_st = os.stat(self.path + suffix)
+            except OSError:
+                continue
+            # Сжатая копия, созданная раньше файла, устарела
+            if variant_st.st_mtime_ns >= st.st_mtime_ns:
+                variants[encoding] = (self.path + suffix, variant_st.st_size, f'{etag}-{encoding}')
+        return DocumentStat(st.st_size, int(st.st_mtime), etag, variants)
+
+    def serve(self, request):
+        return self._respond(request, asynchronous=False)
+
+    async def aserve(self, request):
+        """То же для ASGI: файл читается порциями в пуле потоков по мере отправки.
+
+        Медленный клиент не занимает поток, и файл не читается в память целиком
+        (так Django под ASGI отдает синхронный FileResponse).
+        """
+        # stat() обращается к файловой системе не чаще раза в stat_ttl секунд
+        return self._respond(request, asynchronous=True)
+
+    def _respond(self, request, asynchronous):
+        stat = self.stat()
+        if stat is None:
+            raise Http404("Файл не найден")
+
+        range_header = request.META.get('HTTP_RANGE', '')
+        # В режиме sendfile сжатие - дело фронт-сервера (gzip_static в nginx):
+        # иначе он отдал бы сжатую копию без Content-Encoding
+        encoding = None if range_header or self.sendfile else choose_encoding(request, stat.variants)
+        path, size, etag = stat.variants[encoding] if encoding else (self.path, stat.size, stat.etag)
+
+        headers = HttpResponse()
+        headers['ETag'] = quote_etag(etag)
+        headers['Last-Modified'] = http_date(stat.mtime)
+        headers['Cache-Control'] = f'public, max-age={self.max_age}'
+        if stat.variants and not self.sendfile:
+            headers['Vary'] = 'Accept-Encoding'
+        conditional = get_conditional_response(request, etag=headers['ETag'], last_modified=stat.mtime,
+                                               response=headers)
+        if conditional is not headers:
+            return conditional
+
+        byte_range = None
+        if range_header and self._if_range_passes(request, stat):
+            byte_range = self._parse_range(range_header, size)
+            if byte_range == 'unsatisfiable':
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        if self.sendfile:
+            # Range и отдачу файла выполнит фронт-сервер
+            response = HttpResponse(content_type=self.content_type)
+            if self.sendfile == 'x-accel-redirect':
+                response['X-Accel-Redirect'] = self.accel_prefix.rstrip('/') + '/' + os.path.basename(path)
+            else:
+                response['X-Sendfile'] = path
+        elif byte_range is None and not asynchronous:
+            f = open(path, 'rb')
+            response = FileResponse(f, content_type=self.content_type)
+            # Размер открытого файла: за stat_ttl файл могли пересобрать
+            response['Content-Length'] = str(os.fstat(f.fileno()).st_size)
+        else:
+            start, end = byte_range or (0, size - 1)
+            reader = _aread_range if asynchronous else _read_range
+            response = StreamingHttpResponse(reader(path, start, end), content_type=self.content_type)
+            response['Content-Length'] = str(end - start + 1)
+            if byte_range is not None:
+                response.status_code = 206
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+        for header in ('ETag', 'Last-Modified', 'Cache-Control', 'Vary'):
+            if header in headers:
+                response[header] = headers[header]
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Accept-Ranges'] = 'bytes'
+        response['Content-Disposition'] = f'inline; filename="{self.filename}"'
+        return response
+
+    def _if_range_passes(self, request, stat):
+        """If-Range: диапазон отдаем, только если файл не менялся"""
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range:
+            return True
+        if if_range.startswith(('"', 'W/')):
+            return if_range == quote_etag(stat.etag)
+        return parse_http_date_safe(if_range) == stat.mtime
+
+    def _parse_range(self, header, size):
+        """Один диапазон 'bytes=a-b' -> (start, end); None - отдать файл целиком"""
+        match = RANGE_RE.match(header.strip())
+        if match is None:
+            # Несколько диапазонов или другой формат - полный ответ (допускается RFC 9110)
+            return None
+        start, end = match.groups()
+        if not start:
+            if not end:
+                return None
+            # bytes=-500: последние 500 байт
+            length = int(end)
+            if length == 0:
+                return 'unsatisfiable'
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+        if start >= size or start > end:
+            return 'unsatisfiable'
+        return start, end
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _open_at(path, start):
+    f = open(path, 'rb')
+    f.seek(start)
+    return f
+
+
+async def _aread_range(path, start, end):
+    """Асинхронный _read_range: открытие и каждое чтение - в пуле потоков, не в цикле событий"""
+    f = await sync_to_async(_open_at, thread_sensitive=False)(path, start)
+    try:
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await sync_to_async(f.read, thread_sensitive=False)(min(ASYNC_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+MENU_PDF_PATH = os.path.join(settings.BASE_DIR, 'static', 'menu', 'menu.pdf')
+
+menu_pdf = StaticDocument(
+    MENU_PDF_PATH,
+    content_type='application/pdf',
+    max_age=getattr(settings, 'MENU_PDF_MAX_AGE', 3600),
+    sendfile=getattr(settings, 'MENU_PDF_SENDFILE', None),
+    accel_prefix=getattr(settings, 'MENU_PDF_ACCEL_PREFIX', '/protected/menu/'),
+)
@@ -0,0 +1,152 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .metrics import registry
+from .models import ImageJob, process_image_variants, revision_fields, variant_name
+from .pdf import schedule_menu_pdf
+from .profiling import timed
+from .revision import bump_menu_version
+from .storage import content_storage, release_image_files
+
+logger = logging.getLogger(__name__)
+
+# Ширины уменьшенных копий для srcset
+IMAGE_VARIANT_WIDTHS = tuple(getattr(settings, 'IMAGE_VARIANT_WIDTHS', (160, 320, 640, 1024)))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Пул фоновых потоков обработки (создается при первой задаче)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_PROCESSING_WORKERS', 2),
+                thread_name_prefix='image-pipeline',
+            )
+    return _executor
+
+
+def enqueue_image_job(instance, quality=85, max_size=(1024, 1024)):
+    """Ставит загруженное изображение объекта в очередь на обработку"""
+    job = ImageJob.objects.create(
+        model_label=instance._meta.label_lower,
+        object_id=instance.pk,
+        source=instance.image.name,
+        quality=quality,
+        max_width=max_size[0],
+        max_height=max_size[1],
+    )
+    instance.__class__.objects.filter(pk=instance.pk).update(image_original=instance.image.name)
+    instance.image_original = instance.image.name
+
+    if getattr(settings, 'IMAGE_PROCESSING_ASYNC', True):
+        # Запускаем после коммита, чтобы поток увидел сохраненный объект
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job.id))
+    else:
+        run_image_job(job.id)
+        instance.refresh_from_db(fields=['image', 'image_status', 'image_variants'])
+    return job
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        run_image_job(job_id)
+    except Exception:
+        logger.exception("Ошибка фоновой обработки изображения (задача %s)", job_id)
+    finally:
+        close_old_connections()
+
+
+def run_image_job(job_id):
+    """Выполняет задачу обработки.
+
+    Returns:
+        bool: задача была взята в работу этим вызовом
+    """
+    # Забираем задачу атомарно: одну задачу не обработают два воркера
+    claimed = ImageJob.objects.filter(id=job_id, status=ImageJob.STATUS_PENDING).update(
+        status=ImageJob.STATUS_PROCESSING, started_at=timezone.now()
+    )
+    if not claimed:
+        return False
+
+    job = ImageJob.objects.get(id=job_id)
+    model = apps.get_model(job.model_label)
+    field = model._meta.get_field('image')
+    try:
+        instance = model.objects.only('image').get(pk=job.object_id)
+        if instance.image.name != job.source:
+            # Пока задача ждала, загрузили другое изображение
+            _finish(job, ImageJob.STATUS_DONE, error="Изображение заменено до обработки")
+            return True
+
+        # Раздел image в Server-Timing - только при IMAGE_PROCESSING_ASYNC=False: фоновая
+        # обработка идет после ответа и видна лишь в menu_image_processing_seconds
+        with field.storage.open(job.source) as source, timed('image'):
+            new_name, new_file, variant_files = process_image_variants(
+                source, quality=job.quality, max_size=(job.max_width, job.max_height),
+                widths=IMAGE_VARIANT_WIDTHS,
+            )
+        new_name, variants = store_processed_image(new_name, new_file, variant_files)
+
+        # Переключаем поле, только если за время обработки файл не сменился
+        with transaction.atomic():
+            updated = model.objects.filter(pk=job.object_id, image=job.source).update(
+                image=new_name, image_status=model.IMAGE_STATUS_READY, image_variants=variants,
+                **revision_fields(),
+            )
+        if not updated:
+            release_image_files(new_name, variants)
+            _finish(job, ImageJob.STATUS_DONE, error="Изображение заменено во время обработки")
+            return True
+
+        # update() не отправляет post_save - ревизию записи (выше), кеш меню и PDF обновляем сами
+        bump_menu_version()
+        transaction.on_commit(schedule_menu_pdf)
+        _finish(job, ImageJob.STATUS_DONE, result=new_name)
+    except Exception as e:
+        # Как и save(), любое изменение записи получает новую ревизию
+        model.objects.filter(pk=job.object_id, image=job.source).update(
+            image_status=model.IMAGE_STATUS_FAILED, **revision_fields(),
+        )
+        _finish(job, ImageJob.STATUS_FAILED, error=str(e))
+        logger.warning("Не удалось обработать изображение %s: %s", job.source, e)
+    return True
+
+
+def store_processed_image(name, content, variant_files):
+    """Сохраняет результат process_image_variants в хранилище по хешу содержимого.
+
+    Returns:
+        tuple: (имя основного файла, {"ширина": имя файла} для поля image_variants)
+    """
+    with Image.open(content) as processed:
+        main_width = processed.width
+    content.seek(0)
+    # Обработанные файлы именуются по хешу содержимого и не меняются
+    name = content_storage.save(name, content)
+    variants = {str(main_width): name}
+    for width, variant in variant_files.items():
+        variants[str(width)] = content_storage.save_derived(variant_name(name, width), variant)
+    return name, variants
+
+
+def _finish(job, status, result='', error=''):
+    finished_at = timezone.now()
+    ImageJob.objects.filter(id=job.id).update(
+        status=status, result=result, error=error, finished_at=finished_at
+    )
+    if job.started_at is not None:
+        registry.observe('menu_image_processing_seconds', (finished_at - job.started_at).total_seconds(),
+                         (('status', status),))
@@ -0,0 +1,64 @@
+import json
+import subprocess
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from menu.benchmarks import SUITES, get_suite
+
+LATENCY_COLUMNS = {'name', 'iterations', 'mean_us', 'p50_us', 'p95_us', 'p99_us'}
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Запускает набор нагрузочных замеров и печатает задержки (p50/p95/p99, мкс). "
+        "Наборы http и asgi выполняются в одном процессе, без сети"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite', choices=sorted(SUITES), help="Набор замеров")
+        parser.add_argument('--iterations', type=int, default=2000, help="Число замеров на операцию")
+        parser.add_argument('--readers', type=int, help="Число потоков-читателей (набор sqlite)")
+        parser.add_argument('--writers', type=int, help="Число потоков-писателей (набор sqlite)")
+        parser.add_argument('--clients', type=int, help="Число параллельных клиентов (наборы http и asgi)")
+        parser.add_argument('--json', action='store_true', help="Вывести результаты в JSON")
+        parser.add_argument('--output', help="Сохранить результаты с коммитом и параметрами в JSON-файл "
+                                             "(для сравнения между коммитами)")
+
+    def handle(self, *args, **options):
+        results = get_suite(options['suite']).run(options)
+
+        if options['output']:
+            report = {
+                'suite': options['suite'],
+                'commit': current_commit(),
+                'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'options': {key: options[key] for key in ('iterations', 'readers', 'writers', 'clients')},
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(f"{'операция':<28}{'среднее':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for result in results:
+            # Дополнительные показатели набора выводим после задержек
+            extra = '  '.join(f'{key}={value}' for key, value in result.items() if key not in LATENCY_COLUMNS)
+            self.stdout.write(
+                f"{result['name']:<28}{result['mean_us']:>10}{result['p50_us']:>10}"
+                f"{result['p95_us']:>10}{result['p99_us']:>10}  {extra}".rstrip()
+            )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from menu.pdf import build_menu_pdf
+
+
+class Command(BaseCommand):
+    help = (
+        "Собирает PDF меню (static/menu/menu.pdf) из базы. "
+        "Заново верстаются только категории, которые изменились с прошлой сборки."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Перерисовать все страницы")
+        parser.add_argument('--output', help="Путь к файлу (по умолчанию - файл, который отдается по /)")
+
+    def handle(self, *args, **options):
+        stats = build_menu_pdf(output=options['output'], force=options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Страниц: {stats['pages']}, перерисовано разделов: {stats['rendered']}, "
+            f"из кеша: {stats['reused']}, за {stats['seconds']} сек"
+        ))
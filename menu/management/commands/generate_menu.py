@@ -0,0 +1,114 @@
+import io
+import random
+import time
+
+from PIL import Image, ImageDraw
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from menu.image_pipeline import IMAGE_VARIANT_WIDTHS, store_processed_image
+from menu.models import Category, Dish, MenuRevisionCounter, Restaurant, process_image_variants
+from menu.revision import bump_menu_version
+
+WORDS = (
+    'плов', 'шашлык', 'лагман', 'манты', 'самса', 'шурпа', 'чучвара', 'нарын', 'долма', 'казан-кабоб',
+    'говядина', 'баранина', 'курица', 'овощи', 'зелень', 'томаты', 'лук', 'морковь', 'рис', 'тесто',
+    'сыр', 'грибы', 'острый', 'домашний', 'фирменный', 'тандыр', 'соус', 'лепешка', 'нут', 'зира',
+)
+
+
+def synthetic_image(rng, size=(1600, 1200)):
+    """JPEG-фото с градиентом и фигурами: сжимается как настоящее, а не как заливка"""
+    image = Image.new('RGB', size)
+    draw = ImageDraw.Draw(image)
+    top, bottom = [rng.randrange(256) for _ in range(3)], [rng.randrange(256) for _ in range(3)]
+    for y in range(size[1]):
+        mix = y / size[1]
+        draw.line([(0, y), (size[0], y)], fill=tuple(int(a + (b - a) * mix) for a, b in zip(top, bottom)))
+    for _ in range(12):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        radius = rng.randrange(40, 300)
+        draw.ellipse([x - radius, y - radius, x + radius, y + radius],
+                     fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу синтетическим меню для нагрузочных замеров: N категорий, M блюд "
+        "и изображения, прошедшие обычную обработку (WebP и уменьшенные копии)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=20, help="Число категорий")
+        parser.add_argument('--dishes', type=int, default=1000, help="Число блюд")
+        parser.add_argument('--images', type=int, default=50,
+                            help="Число разных изображений (раздаются блюдам по кругу), 0 - без изображений")
+        parser.add_argument('--unavailable', type=float, default=0.05, help="Доля недоступных блюд")
+        parser.add_argument('--seed', type=int, default=1, help="Зерно генератора: одинаковое меню при повторе")
+        parser.add_argument('--clear', action='store_true', help="Удалить существующие категории и блюда")
+
+    def handle(self, *args, **options):
+        if options['categories'] < 1:
+            raise CommandError("Нужна хотя бы одна категория")
+        if options['dishes'] < 0:
+            raise CommandError("Число блюд не может быть отрицательным")
+        if not options['clear'] and Category.objects.exists():
+            raise CommandError("В базе уже есть меню: добавьте --clear, чтобы заменить его")
+
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+
+        images = []
+        for index in range(options['images']):
+            name, content, variant_files = process_image_variants(
+                ContentFile(synthetic_image(rng), name=f'synthetic_{index}.jpg'),
+                quality=Dish.IMAGE_QUALITY, max_size=Dish.IMAGE_MAX_SIZE, widths=IMAGE_VARIANT_WIDTHS,
+            )
+            images.append(store_processed_image(name, content, variant_files))
+        images_seconds = time.perf_counter() - started
+
+        def image_fields(index):
+            if not images:
+                return {'image': ''}
+            name, variants = images[index % len(images)]
+            return {'image': name, 'image_variants': variants}
+
+        with transaction.atomic():
+            if options['clear']:
+                Dish.objects.all().delete()
+                Category.objects.all().delete()
+            if not Restaurant.objects.exists():
+                Restaurant.objects.create(name='Synthetic')
+
+            # Одна ревизия на всю загрузку: клиенты api/changes/ увидят меню целиком
+            revision = MenuRevisionCounter.next_value()
+            categories = Category.objects.bulk_create([
+                Category(name=f'{WORDS[i % len(WORDS)].capitalize()} {i + 1}', display_order=i,
+                         revision=revision, **image_fields(i))
+                for i in range(options['categories'])
+            ])
+            Dish.objects.bulk_create([
+                Dish(
+                    category=categories[i % len(categories)],
+                    name=f'{" ".join(rng.sample(WORDS, 2)).capitalize()} №{i + 1}',
+                    description=', '.join(rng.sample(WORDS, 5)),
+                    price=rng.randrange(50, 1500) * 100,
+                    is_available=rng.random() >= options['unavailable'],
+                    display_order=i // len(categories),
+                    revision=revision,
+                    **image_fields(i),
+                )
+                for i in range(options['dishes'])
+            ], batch_size=500)
+            # bulk_create не отправляет post_save - сбрасываем кеш меню сами
+            transaction.on_commit(bump_menu_version)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Категорий: {options['categories']}, блюд: {options['dishes']}, "
+            f"изображений: {len(images)} (обработка {images_seconds:.1f} сек), "
+            f"всего {time.perf_counter() - started:.1f} сек"
+        ))
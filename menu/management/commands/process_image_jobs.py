@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from menu.image_pipeline import run_image_job
+from menu.models import ImageJob
+
+
+class Command(BaseCommand):
+    help = "Обрабатывает задачи ImageJob, оставшиеся в очереди (например, после перезапуска сервера)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-minutes', type=int, default=10,
+            help="Вернуть в очередь задачи, которые обрабатываются дольше N минут",
+        )
+
+    def handle(self, *args, **options):
+        stale_before = timezone.now() - timedelta(minutes=options['stale_minutes'])
+        requeued = ImageJob.objects.filter(
+            status=ImageJob.STATUS_PROCESSING, started_at__lt=stale_before
+        ).update(status=ImageJob.STATUS_PENDING)
+        if requeued:
+            self.stdout.write(f"Возвращено в очередь зависших задач: {requeued}")
+
+        processed = 0
+        for job_id in ImageJob.objects.filter(status=ImageJob.STATUS_PENDING).order_by('id').values_list('id', flat=True):
+            if run_image_job(job_id):
+                processed += 1
+
+        failed = ImageJob.objects.filter(status=ImageJob.STATUS_FAILED).count()
+        self.stdout.write(self.style.SUCCESS(f"Обработано задач: {processed}, с ошибкой всего: {failed}"))
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from PIL import Image
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from menu.image_pipeline import IMAGE_VARIANT_WIDTHS
+from menu.models import process_image_variants, revision_fields, variant_name
+from menu.revision import bump_menu_version
+from menu.storage import DEFAULT_IMAGE_PATH, content_storage, image_models, release_image_files
+
+
+def _init_worker():
+    # При запуске процессов через spawn Django в дочернем процессе не настроен
+    if not apps.ready:
+        django.setup()
+
+
+def _fingerprint(source_hash, quality, max_size, widths):
+    """Отпечаток результата: исходный файл + параметры обработки"""
+    params = f'{quality}:{max_size[0]}x{max_size[1]}:{",".join(map(str, widths))}'
+    return f'{source_hash}:{params}'
+
+
+def reprocess_one(task):
+    """Перекодирование одного изображения в дочернем процессе (без доступа к БД).
+
+    Returns:
+        dict: результат; skipped=True, если отпечаток совпал с сохраненным
+    """
+    with open(task['path'], 'rb') as f:
+        data = f.read()
+    fingerprint = _fingerprint(hashlib.sha256(data).hexdigest(), task['quality'], task['max_size'], task['widths'])
+    result = {'key': task['key'], 'fingerprint': fingerprint}
+    if fingerprint == task['previous']:
+        result['skipped'] = True
+        return result
+
+    source = ContentFile(data, name=os.path.basename(task['path']))
+    name, main, variants = process_image_variants(
+        source, quality=task['quality'], max_size=task['max_size'], widths=task['widths']
+    )
+    with Image.open(main) as processed:
+        main_width = processed.width
+    main.seek(0)
+    result.update({
+        'skipped': False,
+        'name': name,
+        'width': main_width,
+        'main': main.read(),
+        'variants': {width: content.read() for width, content in variants.items()},
+    })
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Перекодирует все изображения Category, Dish и Restaurant в пуле процессов. "
+        "Неизменившиеся изображения пропускаются по хешу, прогресс сохраняется между запусками."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Число процессов")
+        parser.add_argument('--quality', type=int, help="Качество WebP для всех моделей (по умолчанию - из модели)")
+        parser.add_argument('--models', default='', help="Модели через запятую, например: dish,category")
+        parser.add_argument('--dry-run', action='store_true', help="Только посчитать, ничего не записывать")
+        parser.add_argument('--force', action='store_true', help="Игнорировать сохраненный прогресс")
+        parser.add_argument(
+            '--state', default=os.path.join(settings.BASE_DIR, '.reprocess_state.json'),
+            help="Файл прогресса для возобновления",
+        )
+
+    def handle(self, *args, **options):
+        models = image_models()
+        if options['models']:
+            wanted = {name.strip().lower() for name in options['models'].split(',')}
+            models = [model for model in models if model._meta.model_name in wanted]
+            if not models:
+                raise CommandError("Не найдено ни одной модели из --models")
+
+        state = {} if options['force'] else self._load_state(options['state'])
+        tasks, objects = self._collect_tasks(models, state, options['quality'])
+        self.stdout.write(f"Изображений к проверке: {len(tasks)}, процессов: {options['workers']}")
+
+        stats = {'processed': 0, 'skipped': 0, 'failed': 0, 'bytes_before': 0, 'bytes_after': 0}
+        started = time.monotonic()
+        try:
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as executor:
+                futures = {executor.submit(reprocess_one, task): task for task in tasks}
+                for future in as_completed(futures):
+                    task = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        stats['failed'] += 1
+                        self.stderr.write(f"{task['key']}: {e}")
+                        continue
+
+                    if result['skipped']:
+                        stats['skipped'] += 1
+                        continue
+
+                    stats['processed'] += 1
+                    self._apply(objects[task['key']], result, stats, options['dry_run'])
+                    if not options['dry_run']:
+                        state[task['key']] = result['fingerprint']
+                        if stats['processed'] % 20 == 0:
+                            self._save_state(options['state'], state)
+        finally:
+            if not options['dry_run']:
+                self._save_state(options['state'], state)
+
+        elapsed = time.monotonic() - started
+        if stats['processed'] and not options['dry_run']:
+            bump_menu_version()
+
+        saved = stats['bytes_before'] - stats['bytes_after']
+        rate = (stats['processed'] + stats['skipped']) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{'[dry-run] ' if options['dry_run'] else ''}"
+            f"Перекодировано: {stats['processed']}, пропущено: {stats['skipped']}, ошибок: {stats['failed']}. "
+            f"Сэкономлено: {saved / 1024:.1f} KB "
+            f"({stats['bytes_before'] / 1024:.1f} KB -> {stats['bytes_after'] / 1024:.1f} KB). "
+            f"Скорость: {rate:.1f} изобр./сек за {elapsed:.1f} сек"
+        ))
+
+    def _collect_tasks(self, models, state, quality):
+        tasks, objects = [], {}
+        for model in models:
+            queryset = model.objects.exclude(image='').exclude(image=DEFAULT_IMAGE_PATH).only(
+                'image', 'image_original', 'image_variants'
+            )
+            for obj in queryset:
+                source = obj.image_original if obj.image_original and content_storage.exists(obj.image_original) \
+                    else obj.image.name
+                if not content_storage.exists(source):
+                    self.stderr.write(f"{model._meta.label_lower}#{obj.pk}: файл {source} не найден")
+                    continue
+
+                key = f'{model._meta.label_lower}:{obj.pk}'
+                objects[key] = (model, obj, source)
+                tasks.append({
+                    'key': key,
+                    'path': content_storage.path(source),
+                    'quality': quality or model.IMAGE_QUALITY,
+                    'max_size': tuple(model.IMAGE_MAX_SIZE),
+                    'widths': IMAGE_VARIANT_WIDTHS,
+                    'previous': state.get(key),
+                })
+        return tasks, objects
+
+    def _apply(self, target, result, stats, dry_run):
+        """Записывает результат и переключает объект на новые файлы"""
+        model, obj, source = target
+        old_names = {obj.image.name, *obj.image_variants.values()}
+        stats['bytes_before'] += sum(content_storage.size(name) for name in old_names if content_storage.exists(name))
+        stats['bytes_after'] += len(result['main']) + sum(len(data) for data in result['variants'].values())
+        if dry_run:
+            return
+
+        main_name = content_storage.save(result['name'], ContentFile(result['main']))
+        variants = {str(result['width']): main_name}
+        for width, data in result['variants'].items():
+            variants[str(width)] = content_storage.save_derived(variant_name(main_name, width), ContentFile(data))
+
+        # Исходник сохраняем: без него следующее перекодирование шло бы из сжатого файла
+        with transaction.atomic():
+            updated = model.objects.filter(pk=obj.pk, image=obj.image.name).update(
+                image=main_name, image_variants=variants, image_original=source,
+                image_status=model.IMAGE_STATUS_READY, **revision_fields(),
+            )
+        if updated and obj.image.name not in (main_name, source):
+            old_variants = {width: name for width, name in obj.image_variants.items() if name not in variants.values()}
+            release_image_files(obj.image.name, old_variants)
+
+    def _load_state(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, path, state):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,274 @@
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+# Границы корзин гистограмм задержки (секунды)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Квантили, которые считаются из гистограмм прямо в ответе /metrics/
+QUANTILES = (0.5, 0.95, 0.99)
+# Окно квантилей делится на столько интервалов (старые выбрасываются целиком)
+WINDOW_SLOTS = 10
+
+# Метод запроса задает клиент: прочие значения сводятся к 'other'
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+METRIC_HELP = {
+    'menu_requests_total': ('counter', "Число запросов по маршрутам"),
+    'menu_request_duration_seconds': ('histogram', "Время обработки запроса"),
+    'menu_db_queries_total': ('counter', "Число запросов к БД"),
+    'menu_cache_hits_total': ('counter', "Попадания в кеш"),
+    'menu_cache_misses_total': ('counter', "Промахи кеша"),
+    'menu_image_processing_seconds': ('histogram', "Время обработки загруженного изображения"),
+}
+
+
+class MetricsRegistry:
+    """Счетчики и гистограммы процесса с выгрузкой в общий каталог.
+
+    Запись - обновление словаря под короткой блокировкой. Раз в
+    flush_interval секунд процесс сохраняет свой срез в отдельный файл
+    (<pid>-<id>.json) в directory; /metrics/ суммирует файлы всех воркеров.
+    Файлы, не обновлявшиеся shard_ttl секунд (остановленные процессы), удаляются.
+    Кроме накопленных гистограмм хранятся гистограммы за последние window
+    секунд: по ним считаются квантили.
+    """
+
+    def __init__(self, directory=None, flush_interval=5.0, shard_ttl=24 * 3600, window=300):
+        self.directory = str(directory) if directory else None
+        self.flush_interval = flush_interval
+        self.shard_ttl = shard_ttl
+        self.slot_seconds = window / WINDOW_SLOTS
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._shard = f'{self._pid}-{uuid.uuid4().hex[:8]}.json'
+        # {(имя, метки): значение} и {(имя, метки): [корзины..., +Inf, сумма]}
+        self._counters = {}
+        self._histograms = {}
+        # {(имя, метки): {номер интервала: [корзины..., +Inf]}}; номер - по часам,
+        # общим для всех процессов
+        self._windows = {}
+        self._flushed = time.monotonic()
+
+    def _check_fork(self):
+        # После fork данные родителя не должны учитываться второй раз
+        if os.getpid() != self._pid:
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._reset()
+
+    # ------------------------- запись
+
+    def inc(self, name, labels=(), value=1):
+        self._check_fork()
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._maybe_flush()
+
+    def observe(self, name, seconds, labels=()):
+        self._check_fork()
+        key = (name, labels)
+        index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        slot = self._slot()
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            histogram[index] += 1
+            histogram[-1] += seconds
+            slots = self._windows.setdefault(key, {})
+            window = slots.get(slot)
+            if window is None:
+                # Новый интервал: вышедшие из окна удаляются
+                for old in [old for old in slots if old <= slot - WINDOW_SLOTS]:
+                    del slots[old]
+                window = slots[slot] = [0] * (len(LATENCY_BUCKETS) + 1)
+            window[index] += 1
+        self._maybe_flush()
+
+    def _slot(self):
+        return int(time.time() // self.slot_seconds)
+
+    # ------------------------- выгрузка и сбор
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [
+                    [name, list(labels), list(values)] for (name, labels), values in self._histograms.items()
+                ],
+                'windows': [
+                    [name, list(labels), slot, list(values)]
+                    for (name, labels), slots in self._windows.items() for slot, values in slots.items()
+                ],
+            }
+
+    def _maybe_flush(self):
+        if self.directory and time.monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Сохраняет срез процесса в его файл (атомарно)"""
+        self._flushed = time.monotonic()
+        if not self.directory or not (self._counters or self._histograms):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, self._shard)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """Сумма срезов всех процессов (текущий процесс - без задержки)"""
+        shards = [self.snapshot()]
+        if self.directory:
+            self.flush()
+            own = os.path.join(self.directory, self._shard)
+            now = time.time()
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                if path == own:
+                    continue
+                try:
+                    if now - os.path.getmtime(path) > self.shard_ttl:
+                        os.remove(path)
+                        continue
+                    with open(path, encoding='utf-8') as f:
+                        shards.append(json.load(f))
+                except (OSError, ValueError):
+                    # Файл удален или перезаписывается другим процессом
+                    continue
+
+        counters, histograms, windows = {}, {}, {}
+        oldest_slot = self._slot() - WINDOW_SLOTS + 1
+        for shard in shards:
+            for name, labels, value in shard['counters']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in shard['histograms']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                merged = histograms.get(key)
+                histograms[key] = list(values) if merged is None else [a + b for a, b in zip(merged, values)]
+            for name, labels, slot, values in shard.get('windows', ()):
+                if slot < oldest_slot:
+                    continue
+                key = (name, tuple(tuple(pair) for pair in labels))
+                merged = windows.get(key)
+                windows[key] = list(values) if merged is None else [a + b for a, b in zip(merged, values)]
+        return counters, histograms, windows
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        counters, histograms, windows = self.collect()
+        lines = []
+        by_name = {}
+        for (name, labels), value in counters.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), values in histograms.items():
+            by_name.setdefault(name, []).append((labels, values))
+
+        for name in sorted(by_name):
+            kind, help_text = METRIC_HELP.get(name, ('untyped', name))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(by_name[name]):
+                if kind != 'histogram':
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip((*LATENCY_BUCKETS, '+Inf'), value[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", str(bound)),))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(value[-1])}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+
+        # Квантили и доля попаданий в кеш - чтобы видеть p95/p99 без Prometheus
+        window = round(self.slot_seconds * WINDOW_SLOTS)
+        lines.append(f'# HELP menu_request_duration_quantile_seconds Квантили времени запроса '
+                     f'за последние {window} с (оценка по гистограмме)')
+        lines.append('# TYPE menu_request_duration_quantile_seconds gauge')
+        for (name, labels), values in sorted(windows.items()):
+            if name == 'menu_request_duration_seconds':
+                for quantile in QUANTILES:
+                    estimate = histogram_quantile(quantile, values)
+                    lines.append(f'menu_request_duration_quantile_seconds'
+                                 f'{_labels(labels + (("quantile", str(quantile)),))} {_number(estimate)}')
+
+        lines.append('# HELP menu_cache_hit_ratio Доля попаданий в кеш')
+        lines.append('# TYPE menu_cache_hit_ratio gauge')
+        for (name, labels), hits in sorted(counters.items()):
+            if name == 'menu_cache_hits_total':
+                misses = counters.get(('menu_cache_misses_total', labels), 0)
+                ratio = hits / (hits + misses) if hits + misses else 0.0
+                lines.append(f'menu_cache_hit_ratio{_labels(labels)} {_number(ratio)}')
+        return '\n'.join(lines) + '\n'
+
+
+def histogram_quantile(quantile, counts):
+    """Квантиль по корзинам гистограммы с линейной интерполяцией (как в Prometheus)"""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = quantile * total
+    cumulative = 0
+    for index, count in enumerate(counts):
+        if cumulative + count >= rank and count:
+            if index >= len(LATENCY_BUCKETS):
+                # Корзина +Inf: известна только нижняя граница
+                return LATENCY_BUCKETS[-1]
+            lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+            return lower + (LATENCY_BUCKETS[index] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return LATENCY_BUCKETS[-1]
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _number(value):
+    return f'{value:.6g}' if isinstance(value, float) else str(value)
+
+
+def record_request(request, status_code, seconds, request_metrics=None):
+    """Учитывает запрос: маршрут - имя URL (ограниченный набор меток)"""
+    match = getattr(request, 'resolver_match', None)
+    route = (match.view_name if match is not None else None) or 'unmatched'
+    labels = (('route', route),)
+    method = request.method if request.method in METHODS else 'other'
+    registry.inc('menu_requests_total', labels + (('method', method), ('status', str(status_code))))
+    registry.observe('menu_request_duration_seconds', seconds, labels)
+    if request_metrics is not None:
+        if request_metrics.counts.get('db'):
+            registry.inc('menu_db_queries_total', labels, request_metrics.counts['db'])
+        if request_metrics.cache_hits:
+            registry.inc('menu_cache_hits_total', labels, request_metrics.cache_hits)
+        if request_metrics.cache_misses:
+            registry.inc('menu_cache_misses_total', labels, request_metrics.cache_misses)
+
+
+registry = MetricsRegistry(
+    directory=getattr(settings, 'METRICS_DIR', None),
+    flush_interval=getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0),
+    window=getattr(settings, 'METRICS_QUANTILE_WINDOW', 300),
+)
+# Последние данные процесса не теряются при штатной остановке воркера
+atexit.register(registry.flush)
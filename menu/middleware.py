@@ -1,35 +1,224 @@
+import json
+import logging
+import math
+import os
+import random
+from logging.handlers import RotatingFileHandler
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.http import JsonResponse
-from django_ratelimit.decorators import ratelimit
 
-# middleware.py
-class SaveUserIdMiddleware:
+from .cart import get_cart_backend_class
+from .metrics import record_request
+from .profiling import finish_request, start_request
+from .ratelimit import build_limiter
+
+
+class HybridMiddleware:
     """
-    Если в GET-параметрах присутствует user_id, сохраняем его в сессии.
+    Middleware для WSGI и ASGI. Под ASGI __call__ возвращает корутину __acall__,
+    и Django не переключает запрос в поток на границе этого middleware.
     """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        raise NotImplementedError
+
+    async def __acall__(self, request):
+        raise NotImplementedError
+
+
+# middleware.py
+class SaveUserIdMiddleware(HybridMiddleware):
+    """
+    Если в GET-параметрах присутствует user_id, сохраняем его в сессии.
+    Без user_id сессия не трогается: анонимные ответы остаются без cookie.
+    """
+    def save_user_id(self, request):
         user_id = request.GET.get('user_id')
-        if user_id:
+        if user_id and request.session.get('user_id') != user_id:
             request.session['user_id'] = user_id
-            request.session.modified = True
+
+    def handle(self, request):
+        self.save_user_id(request)
         return self.get_response(request)
 
+    async def __acall__(self, request):
+        if request.GET.get('user_id'):
+            # Загрузка сессии - синхронный ORM или кеш
+            await sync_to_async(self.save_user_id)(request)
+        return await self.get_response(request)
+
+
+class CartMiddleware(HybridMiddleware):
+    """
+    Подключает хранилище корзины (request.cart_store) по настройке CART_BACKEND.
+    Пока корзиной не пользуются, ничего не читается и не записывается.
+    """
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.backend_class = get_cart_backend_class()
+
+    def handle(self, request):
+        request.cart_store = self.backend_class(request)
+        response = self.get_response(request)
+        request.cart_store.finalize(response)
+        return response
+
+    async def __acall__(self, request):
+        # finalize() только пишет cookie в ответ - без обращения к хранилищу
+        request.cart_store = self.backend_class(request)
+        response = await self.get_response(request)
+        request.cart_store.finalize(response)
+        return response
+
+
+class RateLimitMiddleware(HybridMiddleware):
+    """
+    Ограничивает частоту запросов по правилам RATELIMIT_POLICIES.
+    Статика, медиа и PDF меню не ограничиваются; проверка идет в памяти процесса.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'RATELIMIT_ENABLED', True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.limiter = build_limiter()
+
+    def too_many_requests(self, retry_after):
+        if retry_after is None:
+            return None
+        response = JsonResponse(
+            {'error': 'Вы превысили лимит запросов. Пожалуйста, попробуйте позже.'},
+            status=429
+        )
+        response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def handle(self, request):
+        return self.too_many_requests(self.limiter.check(request)) or self.get_response(request)
 
+    async def __acall__(self, request):
+        # Корзина в памяти проверяется в цикле событий, в поток уходит только синхронизация с общим кешем
+        response = self.too_many_requests(await self.limiter.acheck(request))
+        return response or await self.get_response(request)
 
 
+def get_slow_request_logger():
+    """Логгер медленных запросов: по строке JSON в файл PERFORMANCE_SLOW_LOG с ротацией"""
+    logger = logging.getLogger('menu.performance.slow')
+    path = getattr(settings, 'PERFORMANCE_SLOW_LOG', None)
+    path = os.path.abspath(str(path)) if path else None
+    for handler in list(logger.handlers):
+        # Путь сменился (например, в тестах) - старый файл больше не пишем
+        if isinstance(handler, RotatingFileHandler) and handler.baseFilename != path:
+            logger.removeHandler(handler)
+            handler.close()
+    if path and not logger.handlers:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=getattr(settings, 'PERFORMANCE_SLOW_LOG_MAX_BYTES', 10 * 1024 * 1024),
+            backupCount=getattr(settings, 'PERFORMANCE_SLOW_LOG_BACKUP_COUNT', 5),
+            encoding='utf-8',
+            delay=True,
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
 
 
-class RateLimitMiddleware:
+class PerformanceMiddleware(HybridMiddleware):
+    """
+    Замеряет, на что ушло время запроса: БД (число и время запросов), кеш
+    (попадания и промахи), отрисовка шаблонов, обработка изображений.
+    Итог учитывается в /metrics/ и (PERFORMANCE_SERVER_TIMING) отдается в заголовке
+    Server-Timing непубличных ответов. Доля PERFORMANCE_SLOW_SAMPLE_RATE
+    запросов дополнительно собирает тексты SQL, и если такой запрос дольше
+    PERFORMANCE_SLOW_REQUEST_MS, он пишется в журнал медленных запросов.
+    """
     def __init__(self, get_response):
-        self.get_response = get_response
+        if not getattr(settings, 'PERFORMANCE_ENABLED', True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.server_timing = getattr(settings, 'PERFORMANCE_SERVER_TIMING', False)
+        self.sample_rate = getattr(settings, 'PERFORMANCE_SLOW_SAMPLE_RATE', 0.0)
+        self.slow_seconds = getattr(settings, 'PERFORMANCE_SLOW_REQUEST_MS', 500) / 1000
+        self.slow_logger = get_slow_request_logger()
+        self.collect_metrics = getattr(settings, 'METRICS_ENABLED', True)
 
-    def __call__(self, request):
-        if not ratelimit(request, key='ip', rate='5/m', method='ALL'):
-            return JsonResponse(
-                {'error': 'Вы превысили лимит запросов. Пожалуйста, попробуйте позже.'},
-                status=429
+    def handle(self, request):
+        # SQL замеряет query_timer, подключенный к каждому соединению (menu/db.py)
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        metrics, token = start_request(capture_queries=sampled)
+        try:
+            response = self.get_response(request)
+        finally:
+            finish_request(token)
+        return self.finish(request, response, metrics, sampled)
+
+    async def __acall__(self, request):
+        # Метрики запроса (ContextVar) видны и в потоках sync_to_async
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        metrics, token = start_request(capture_queries=sampled)
+        try:
+            response = await self.get_response(request)
+        finally:
+            finish_request(token)
+        return self.finish(request, response, metrics, sampled)
+
+    def finish(self, request, response, metrics, sampled):
+        total = metrics.elapsed()
+        # Из общего кеша (CDN) время одного запроса получили бы все посетители
+        if self.server_timing and 'public' not in response.get('Cache-Control', ''):
+            response['Server-Timing'] = self.format_server_timing(metrics, total)
+        if sampled and total >= self.slow_seconds:
+            self.log_slow_request(request, response, metrics, total)
+        if self.collect_metrics:
+            record_request(request, response.status_code, total, metrics)
+        return response
+
+    def format_server_timing(self, metrics, total):
+        durations, counts = metrics.durations, metrics.counts
+        parts = []
+        if 'db' in durations:
+            parts.append(f'db;dur={durations["db"] * 1000:.1f};desc="{counts["db"]} queries"')
+        if 'cache' in durations:
+            parts.append(
+                f'cache;dur={durations["cache"] * 1000:.1f};'
+                f'desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"'
             )
+        for name in ('template', 'image'):
+            if name in durations:
+                parts.append(f'{name};dur={durations[name] * 1000:.1f}')
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
 
-        return self.get_response(request)
\ No newline at end of file
+    def log_slow_request(self, request, response, metrics, total):
+        self.slow_logger.info(json.dumps({
+            'method': request.method,
+            # Без query string: в ней бывает ключ режима редактирования (?edit=)
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'durations_ms': {name: round(value * 1000, 1) for name, value in metrics.durations.items()},
+            'counts': metrics.counts,
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            'queries': metrics.queries,
+        }, ensure_ascii=False))
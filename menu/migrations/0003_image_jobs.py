@@ -0,0 +1,66 @@
+# Generated by Django 4.2.17 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0002_restaurant_address_restaurant_description_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=100, verbose_name='Модель')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='ID объекта')),
+                ('source', models.CharField(max_length=255, verbose_name='Исходный файл')),
+                ('quality', models.PositiveSmallIntegerField(default=85, verbose_name='Качество WebP')),
+                ('max_width', models.PositiveIntegerField(default=1024, verbose_name='Макс. ширина')),
+                ('max_height', models.PositiveIntegerField(default=1024, verbose_name='Макс. высота')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('processing', 'Обрабатывается'), ('done', 'Готово'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=10, verbose_name='Статус')),
+                ('result', models.CharField(blank=True, max_length=255, verbose_name='Обработанный файл')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начата')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+            ],
+            options={
+                'verbose_name': 'Обработка изображения',
+                'verbose_name_plural': 'Обработка изображений',
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='image_original',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Исходный файл изображения'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Готово'), ('pending', 'Обрабатывается'), ('failed', 'Ошибка обработки')], default='ready', editable=False, max_length=10, verbose_name='Статус изображения'),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='image_original',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Исходный файл изображения'),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Готово'), ('pending', 'Обрабатывается'), ('failed', 'Ошибка обработки')], default='ready', editable=False, max_length=10, verbose_name='Статус изображения'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='image_original',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Исходный файл изображения'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Готово'), ('pending', 'Обрабатывается'), ('failed', 'Ошибка обработки')], default='ready', editable=False, max_length=10, verbose_name='Статус изображения'),
+        ),
+    ]
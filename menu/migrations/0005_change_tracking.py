@@ -0,0 +1,74 @@
+# Generated by Django 4.2.17 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+def create_counter(apps, schema_editor):
+    apps.get_model('menu', 'MenuRevisionCounter').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0004_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuRevisionCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Последняя ревизия')),
+                ('pruned_through', models.BigIntegerField(default=0, verbose_name='Надгробия удалены до ревизии')),
+            ],
+            options={
+                'verbose_name': 'Счетчик ревизий меню',
+                'verbose_name_plural': 'Счетчик ревизий меню',
+            },
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=100, verbose_name='Модель')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='ID объекта')),
+                ('revision', models.BigIntegerField(db_index=True, verbose_name='Ревизия')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='Удален')),
+            ],
+            options={
+                'verbose_name': 'Удаленный объект',
+                'verbose_name_plural': 'Удаленные объекты',
+            },
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='revision',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='Ревизия'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменено'),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='revision',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='Ревизия'),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменено'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='revision',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='Ревизия'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменено'),
+        ),
+        migrations.RunPython(create_counter, migrations.RunPython.noop),
+    ]
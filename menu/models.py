@@ -4,7 +4,8 @@ from io import BytesIO
 from PIL import Image
 from django.core.files.base import ContentFile
 from django.core.validators import FileExtensionValidator
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 
 
 def process_image(image, quality=85, max_size=(1024, 1024)):
@@ -19,6 +20,23 @@ def process_image(image, quality=85, max_size=(1024, 1024)):
     Returns:
         tuple: (новое_имя_файла, ContentFile)
     """
+    new_image_name, content, _ = process_image_variants(image, quality=quality, max_size=max_size)
+    return new_image_name, content
+
+
+def process_image_variants(image, quality=85, max_size=(1024, 1024), widths=()):
+    """
+    Обработка изображения с генерацией уменьшенных копий для srcset (одно декодирование).
+
+    Args:
+        image: Файл изображения
+        quality: Качество сжатия WebP (0-100)
+        max_size: Максимальные размеры основного изображения (ширина, высота)
+        widths: Ширины уменьшенных копий; копии не шире основного изображения не создаются
+
+    Returns:
+        tuple: (новое_имя_файла, ContentFile, {ширина: ContentFile})
+    """
     try:
         img = Image.open(image)
 
@@ -38,53 +56,192 @@ def process_image(image, quality=85, max_size=(1024, 1024)):
         if img.width > max_size[0] or img.height > max_size[1]:
             img.thumbnail(max_size, Image.LANCZOS)
 
-        # Сохранение с оптимизацией
-        output = BytesIO()
-        img.save(output, format='WEBP', quality=quality, optimize=True)
-        output.seek(0)
+        # Уменьшенные копии из уже ограниченного изображения
+        variants = {}
+        for width in sorted(set(widths)):
+            if width >= img.width:
+                continue
+            height = max(1, round(img.height * width / img.width))
+            variants[width] = _encode_webp(img.resize((width, height), Image.LANCZOS), quality)
 
         # Генерация нового имени файла
         new_image_name = os.path.splitext(os.path.basename(image.name))[0] + '.webp'
 
-        return new_image_name, ContentFile(output.read())
+        return new_image_name, _encode_webp(img, quality), variants
 
     except Exception as e:
         raise ValueError(f"Ошибка при обработке изображения: {e}")
 
 
+def _encode_webp(img, quality):
+    """Сохранение в WebP с оптимизацией"""
+    output = BytesIO()
+    img.save(output, format='WEBP', quality=quality, optimize=True)
+    return ContentFile(output.getvalue())
+
+
+def variant_name(name, width):
+    """Детерминированное имя уменьшенной копии: dish_images/plov.webp -> dish_images/plov_w320.webp"""
+    return f"{os.path.splitext(name)[0]}_w{width}.webp"
+
+
+class MenuRevisionCounter(models.Model):
+    """Счетчик ревизий меню (одна строка): каждое изменение получает следующий номер"""
+
+    value = models.BigIntegerField(default=0, verbose_name="Последняя ревизия")
+    # Надгробия с ревизией не больше этой удалены: клиентам со старой ревизией нужна полная выгрузка
+    pruned_through = models.BigIntegerField(default=0, verbose_name="Надгробия удалены до ревизии")
+
+    class Meta:
+        verbose_name = "Счетчик ревизий меню"
+        verbose_name_plural = "Счетчик ревизий меню"
+
+    @classmethod
+    def next_value(cls):
+        """Следующая ревизия.
+
+        Вызывается в транзакции изменения: строка счетчика заблокирована до
+        коммита, поэтому ревизии становятся видны клиентам строго по порядку.
+        """
+        with transaction.atomic():
+            if not cls.objects.filter(pk=1).update(value=models.F('value') + 1):
+                cls.objects.get_or_create(pk=1)
+                cls.objects.filter(pk=1).update(value=models.F('value') + 1)
+            return cls.objects.values_list('value', flat=True).get(pk=1)
+
+    @classmethod
+    def current(cls):
+        """(последняя ревизия, pruned_through)"""
+        return cls.objects.filter(pk=1).values_list('value', 'pruned_through').first() or (0, 0)
+
+
+def revision_fields():
+    """Поля ревизии для QuerySet.update(), который не вызывает save()"""
+    return {'revision': MenuRevisionCounter.next_value(), 'updated_at': timezone.now()}
+
+
+class ChangeTrackingMixin(models.Model):
+    """Ревизия и время последнего изменения записи для выгрузки изменений (api/changes/)"""
+
+    revision = models.BigIntegerField(default=0, db_index=True, editable=False, verbose_name="Ревизия")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Изменено")
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            self.revision = MenuRevisionCounter.next_value()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'revision', 'updated_at'}
+            super().save(*args, **kwargs)
+
+
+class Tombstone(models.Model):
+    """Запись об удалении объекта меню, чтобы клиенты выгрузки изменений удалили его у себя"""
+
+    model_label = models.CharField(max_length=100, verbose_name="Модель")
+    object_id = models.PositiveBigIntegerField(verbose_name="ID объекта")
+    revision = models.BigIntegerField(db_index=True, verbose_name="Ревизия")
+    deleted_at = models.DateTimeField(auto_now_add=True, verbose_name="Удален")
+
+    def __str__(self):
+        return f"{self.model_label}#{self.object_id} (ревизия {self.revision})"
+
+    class Meta:
+        verbose_name = "Удаленный объект"
+        verbose_name_plural = "Удаленные объекты"
+
+
 class ImageProcessingMixin(models.Model):
-    """Базовый класс для моделей с обработкой изображений"""
+    """Базовый класс для моделей с обработкой изображений.
+
+    Загруженный файл сохраняется как есть, а ресайз и конвертация в WebP
+    выполняются фоновой задачей ImageJob (см. image_pipeline). Когда задача
+    завершена, поле image переключается на обработанный файл.
+    """
+
+    IMAGE_STATUS_READY = 'ready'
+    IMAGE_STATUS_PENDING = 'pending'
+    IMAGE_STATUS_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = (
+        (IMAGE_STATUS_READY, 'Готово'),
+        (IMAGE_STATUS_PENDING, 'Обрабатывается'),
+        (IMAGE_STATUS_FAILED, 'Ошибка обработки'),
+    )
+
+    image_original = models.CharField(max_length=255, blank=True, editable=False,
+                                      verbose_name="Исходный файл изображения")
+    image_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, default=IMAGE_STATUS_READY,
+                                    editable=False, verbose_name="Статус изображения")
+    # {"ширина": "путь к файлу"} - уменьшенные копии для srcset
+    image_variants = models.JSONField(default=dict, blank=True, editable=False,
+                                      verbose_name="Уменьшенные копии изображения")
+
+    # Параметры обработки изображения (переопределяются в моделях)
+    IMAGE_QUALITY = 85
+    IMAGE_MAX_SIZE = (1024, 1024)
 
     class Meta:
         abstract = True
 
     def _process_and_save_image(self, quality=85, max_size=(1024, 1024)):
-        """Обработка и сохранение изображения с удалением старого"""
-        if not self.image:
+        """Подготовка к обработке нового изображения с удалением старого"""
+        # Обрабатываем только новый загруженный файл
+        if not self.image or getattr(self.image, '_committed', True):
             return
 
         # Проверяем, изменилось ли изображение
         try:
             # Если объект уже существует в БД
             if self.pk:
-                old_instance = self.__class__.objects.only('image').get(pk=self.pk)
-                # Если изображение не изменилось, пропускаем обработку
-                if old_instance.image == self.image:
-                    return
-
-                # Удаляем старое изображение (кроме дефолтного)
-                default_image_path = 'default_images/default_foto.png'
-                if old_instance.image and old_instance.image.name != default_image_path:
-                    old_instance.image.delete(save=False)
+                old_instance = self.__class__.objects.only('image', 'image_original', 'image_variants').get(pk=self.pk)
+
+                # Удаляем старое изображение (если оно больше ни у кого не используется),
+                # его копии и исходник. Дефолтное изображение не трогаем
+                from .storage import release_image_files
+
+                release_image_files(old_instance.image.name, old_instance.image_variants, exclude=self)
+                if old_instance.image_original and old_instance.image_original != old_instance.image.name:
+                    self.image.storage.delete(old_instance.image_original)
         except self.__class__.DoesNotExist:
             pass
 
-        # Обрабатываем новое изображение
-        new_name, new_file = process_image(self.image, quality=quality, max_size=max_size)
-        self.image.save(new_name, new_file, save=False)
+        # Сам файл сохраняется как есть при сохранении модели, обработка - после
+        self.image_status = self.IMAGE_STATUS_PENDING
+        self.image_variants = {}
+        self._pending_image = (quality, max_size)
+
+    @property
+    def image_urls(self):
+        """URL всех размеров изображения: {ширина: url}, по возрастанию ширины"""
+        if not self.image:
+            return {}
+        storage = self.image.storage
+        return {int(width): storage.url(name)
+                for width, name in sorted(self.image_variants.items(), key=lambda item: int(item[0]))}
+
+    @property
+    def image_srcset(self):
+        """Значение атрибута srcset (пустая строка, если копий нет)"""
+        return ', '.join(f'{url} {width}w' for width, url in self.image_urls.items())
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        pending_image = self.__dict__.pop('_pending_image', None)
+        if pending_image:
+            from .image_pipeline import enqueue_image_job
+
+            quality, max_size = pending_image
+            enqueue_image_job(self, quality=quality, max_size=max_size)
 
 
-class Category(ImageProcessingMixin):
+class Category(ImageProcessingMixin, ChangeTrackingMixin):
+    IMAGE_QUALITY = 85
+    IMAGE_MAX_SIZE = (1024, 1024)
+
     name = models.CharField(max_length=100, unique=True, verbose_name="Название категории")
     description = models.TextField(blank=True, null=True, verbose_name="Описание")
     display_order = models.PositiveIntegerField(default=0, verbose_name="Порядок отображения", db_index=True)
@@ -97,7 +254,7 @@ class Category(ImageProcessingMixin):
     )
 
     def save(self, *args, **kwargs):
-        self._process_and_save_image(quality=85, max_size=(1024, 1024))
+        self._process_and_save_image(quality=self.IMAGE_QUALITY, max_size=self.IMAGE_MAX_SIZE)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -112,7 +269,10 @@ class Category(ImageProcessingMixin):
         ]
 
 
-class Dish(ImageProcessingMixin):
+class Dish(ImageProcessingMixin, ChangeTrackingMixin):
+    IMAGE_QUALITY = 80
+    IMAGE_MAX_SIZE = (1024, 1024)
+
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="dishes", verbose_name="Категория")
     name = models.CharField(max_length=100, verbose_name="Название блюда", db_index=True)
     description = models.TextField(blank=True, null=True, verbose_name="Описание")
@@ -128,7 +288,7 @@ class Dish(ImageProcessingMixin):
     display_order = models.PositiveIntegerField(default=0, verbose_name="Порядок отображения", db_index=True)
 
     def save(self, *args, **kwargs):
-        self._process_and_save_image(quality=80, max_size=(1024, 1024))
+        self._process_and_save_image(quality=self.IMAGE_QUALITY, max_size=self.IMAGE_MAX_SIZE)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -145,7 +305,10 @@ class Dish(ImageProcessingMixin):
         ]
 
 
-class Restaurant(ImageProcessingMixin):
+class Restaurant(ImageProcessingMixin, ChangeTrackingMixin):
+    IMAGE_QUALITY = 90
+    IMAGE_MAX_SIZE = (800, 800)
+
     name = models.CharField(max_length=100, verbose_name="Название ресторана", unique=True)
     image = models.ImageField(
         upload_to="restaurant_images/",
@@ -162,7 +325,7 @@ class Restaurant(ImageProcessingMixin):
     is_active = models.BooleanField(default=True, verbose_name="Активен")
 
     def save(self, *args, **kwargs):
-        self._process_and_save_image(quality=90, max_size=(800, 800))
+        self._process_and_save_image(quality=self.IMAGE_QUALITY, max_size=self.IMAGE_MAX_SIZE)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -171,3 +334,40 @@ class Restaurant(ImageProcessingMixin):
     class Meta:
         verbose_name = "Ресторан"
         verbose_name_plural = "Рестораны"
+
+
+class ImageJob(models.Model):
+    """Задача фоновой обработки загруженного изображения"""
+
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_PROCESSING, 'Обрабатывается'),
+        (STATUS_DONE, 'Готово'),
+        (STATUS_FAILED, 'Ошибка'),
+    )
+
+    model_label = models.CharField(max_length=100, verbose_name="Модель")
+    object_id = models.PositiveBigIntegerField(verbose_name="ID объекта")
+    source = models.CharField(max_length=255, verbose_name="Исходный файл")
+    quality = models.PositiveSmallIntegerField(default=85, verbose_name="Качество WebP")
+    max_width = models.PositiveIntegerField(default=1024, verbose_name="Макс. ширина")
+    max_height = models.PositiveIntegerField(default=1024, verbose_name="Макс. высота")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING,
+                              verbose_name="Статус", db_index=True)
+    result = models.CharField(max_length=255, blank=True, verbose_name="Обработанный файл")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name="Начата")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="Завершена")
+
+    def __str__(self):
+        return f"{self.model_label}#{self.object_id}: {self.source} ({self.status})"
+
+    class Meta:
+        ordering = ('-created_at',)
+        verbose_name = "Обработка изображения"
+        verbose_name_plural = "Обработка изображений"
@@ -0,0 +1,127 @@
+import base64
+import json
+from bisect import bisect_left, bisect_right
+
+from django.db.models import Q
+
+# Жесткий предел размера страницы для всех режимов пагинации
+MAX_PAGE_SIZE = 100
+
+# Направления курсора: после ключа (вперед) и до ключа (назад)
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def parse_page_size(value, default):
+    """Размер страницы из query string, ограниченный диапазоном 1..MAX_PAGE_SIZE"""
+    if value in (None, ''):
+        return default
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+
+def encode_cursor(direction, key):
+    """Непрозрачный курсор из направления и ключа (display_order, id)"""
+    raw = json.dumps([direction, key[0], key[1]], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Разбор курсора.
+
+    Returns:
+        tuple: (направление, (display_order, id)) или (None, None) для первой страницы
+
+    Raises:
+        ValueError: курсор поврежден
+    """
+    if not cursor:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, display_order, pk = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Неверный курсор: {e}")
+    if direction not in (NEXT, PREVIOUS) or not isinstance(display_order, int) or not isinstance(pk, int):
+        raise ValueError("Неверный курсор")
+    return direction, (display_order, pk)
+
+
+class KeysetPage:
+    """Страница keyset-пагинации с курсорами на соседние страницы"""
+
+    def __init__(self, items, next_cursor, previous_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def _build_page(items, keys, direction, has_more, page_size):
+    """Общая логика курсоров для выборки из БД и из списка"""
+    items, keys = items[:page_size], keys[:page_size]
+    if direction == PREVIOUS:
+        # Выборка назад шла в обратном порядке
+        items, keys = items[::-1], keys[::-1]
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, direction is not None
+
+    next_cursor = encode_cursor(NEXT, keys[-1]) if has_next and keys else None
+    previous_cursor = encode_cursor(PREVIOUS, keys[0]) if has_previous and keys else None
+    return KeysetPage(items, next_cursor, previous_cursor)
+
+
+def _keyset_queryset(queryset, direction, key):
+    if direction == NEXT:
+        display_order, pk = key
+        queryset = queryset.filter(
+            Q(display_order__gt=display_order) | Q(display_order=display_order, id__gt=pk)
+        ).order_by('display_order', 'id')
+    elif direction == PREVIOUS:
+        display_order, pk = key
+        queryset = queryset.filter(
+            Q(display_order__lt=display_order) | Q(display_order=display_order, id__lt=pk)
+        ).order_by('-display_order', '-id')
+    else:
+        queryset = queryset.order_by('display_order', 'id')
+    return queryset
+
+
+def paginate_queryset(queryset, cursor, page_size):
+    """Keyset-пагинация queryset по (display_order, id).
+
+    Стоимость любой страницы одинакова: вместо OFFSET используется
+    условие по ключу, которое обслуживает индекс dish_filtering_idx.
+    """
+    direction, key = decode_cursor(cursor)
+    items = list(_keyset_queryset(queryset, direction, key)[:page_size + 1])
+    keys = [(item.display_order, item.id) for item in items]
+    return _build_page(items, keys, direction, len(items) > page_size, page_size)
+
+
+async def apaginate_queryset(queryset, cursor, page_size):
+    """То же для async view (асинхронный ORM)"""
+    direction, key = decode_cursor(cursor)
+    items = [item async for item in _keyset_queryset(queryset, direction, key)[:page_size + 1]]
+    keys = [(item.display_order, item.id) for item in items]
+    return _build_page(items, keys, direction, len(items) > page_size, page_size)
+
+
+def paginate_sorted(items, keys, cursor, page_size):
+    """Keyset-пагинация заранее отсортированного списка (бинарный поиск по ключам)"""
+    direction, key = decode_cursor(cursor)
+    if direction == NEXT:
+        start = bisect_right(keys, tuple(key))
+        chunk, chunk_keys = items[start:start + page_size + 1], keys[start:start + page_size + 1]
+    elif direction == PREVIOUS:
+        end = bisect_left(keys, tuple(key))
+        start = max(0, end - page_size - 1)
+        chunk, chunk_keys = items[start:end][::-1], keys[start:end][::-1]
+    else:
+        chunk, chunk_keys = items[:page_size + 1], keys[:page_size + 1]
+    return _build_page(chunk, chunk_keys, direction, len(chunk) > page_size, page_size)
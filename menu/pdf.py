@@ -0,0 +1,483 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from PIL import Image
+from django.conf import settings
+from django.db import close_old_connections
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from .documents import MENU_PDF_PATH, menu_pdf
+from .models import Category, Dish, Restaurant
+from .storage import DEFAULT_IMAGE_PATH
+
+try:
+    import fcntl
+except ImportError:  # Windows: сборки в разных процессах не сериализуются
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Меняется при изменении верстки: все закешированные страницы перерисуются
+LAYOUT_VERSION = 2
+
+# Текст и линии - векторные; растром в PDF попадают только фотографии
+IMAGE_DPI = getattr(settings, 'MENU_PDF_IMAGE_DPI', 200)
+JPEG_QUALITY = 85
+
+# Шрифты с кириллицей: первый найденный
+FONT_CANDIDATES = (
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/Library/Fonts/Arial Unicode.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+)
+
+# Размеры - в пунктах (1/72 дюйма)
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 0.6 * 72
+THUMB_SIZE = 1.1 * 72
+DESCRIPTION_LINES = 3
+
+TEXT_COLOR = (33, 33, 33)
+MUTED_COLOR = (110, 110, 110)
+ACCENT_COLOR = (183, 28, 28)
+RULE_COLOR = (220, 220, 220)
+
+FONT_SIZES = {'title': 26, 'heading': 18, 'name': 12, 'text': 9, 'price': 12}
+
+
+def _pixels(points):
+    """Размер изображения в пунктах -> пиксели при IMAGE_DPI"""
+    return round(points * IMAGE_DPI / 72)
+
+
+class Fonts:
+    def __init__(self):
+        path = getattr(settings, 'MENU_PDF_FONT', '') or next(
+            (candidate for candidate in FONT_CANDIDATES if os.path.exists(candidate)), ''
+        )
+        self.path = path
+        if path:
+            # В PDF встраиваются только использованные символы шрифта
+            pdfmetrics.registerFont(TTFont('MenuSans', path))
+            self.name = 'MenuSans'
+        else:
+            logger.warning("Шрифт с кириллицей не найден (MENU_PDF_FONT), используется Helvetica")
+            self.name = 'Helvetica'
+
+    def ascent(self, role):
+        return pdfmetrics.getAscentDescent(self.name, FONT_SIZES[role])[0]
+
+    def line_height(self, role):
+        ascent, descent = pdfmetrics.getAscentDescent(self.name, FONT_SIZES[role])
+        return ascent - descent + 2
+
+    def width(self, role, text):
+        return _text_width(self.name, FONT_SIZES[role], text)
+
+
+_fonts = None
+
+
+def get_fonts():
+    global _fonts
+    if _fonts is None:
+        _fonts = Fonts()
+    return _fonts
+
+
+@lru_cache(maxsize=20000)
+def _text_width(font_name, size, text):
+    # Слова в описаниях блюд часто повторяются
+    return pdfmetrics.stringWidth(text, font_name, size)
+
+
+# ------------------------- данные и отпечатки
+
+
+def _fingerprint(*parts):
+    fonts = get_fonts()
+    payload = json.dumps([LAYOUT_VERSION, IMAGE_DPI, fonts.path, *parts], ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:24]
+
+
+def _image_name(obj, width):
+    """Готовая уменьшенная копия изображения не уже width (или основной файл)"""
+    if not obj.image or obj.image.name == DEFAULT_IMAGE_PATH:
+        return ''
+    for variant_width, name in sorted(obj.image_variants.items(), key=lambda item: int(item[0])):
+        if int(variant_width) >= width:
+            return name
+    return obj.image.name
+
+
+def _load_menu():
+    """Разделы PDF: [(ключ, отпечаток, функция отрисовки)] в порядке страниц"""
+    restaurant = Restaurant.objects.filter(is_active=True).first()
+    categories = list(Category.objects.order_by('display_order', 'id'))
+    dishes_by_category = {}
+    for dish in Dish.objects.filter(is_available=True).order_by('display_order', 'id'):
+        dishes_by_category.setdefault(dish.category_id, []).append(dish)
+
+    sections = []
+    if restaurant is not None:
+        logo = _image_name(restaurant, _pixels(THUMB_SIZE * 2))
+        cover = [restaurant.name, restaurant.description, restaurant.address, restaurant.phone, logo]
+        sections.append(('cover', _fingerprint(cover), lambda: render_cover(restaurant, logo)))
+
+    for category in categories:
+        dishes = dishes_by_category.get(category.id)
+        if not dishes:
+            continue
+        rows = [
+            (dish.name, dish.description or '', dish.price, _image_name(dish, _pixels(THUMB_SIZE)))
+            for dish in dishes
+        ]
+        fingerprint = _fingerprint(category.name, category.description, rows)
+        sections.append((
+            f'category-{category.id}', fingerprint,
+            lambda category=category, rows=rows: render_category(category, rows),
+        ))
+    return sections
+
+
+# ------------------------- верстка
+
+
+class Section:
+    """Сверстанный раздел: операции рисования по страницам и фотографии (JPEG).
+
+    Операции - списки, пригодные для JSON: раздел кешируется на диске и при
+    следующей сборке выводится в PDF без повторной верстки и обработки фото.
+    Координаты - в пунктах от левого нижнего угла страницы, как в PDF.
+    """
+
+    def __init__(self):
+        self.pages = []
+        self.images = []
+
+    def new_page(self):
+        self.pages.append([])
+
+    def text(self, role, x, top, text, color, align='left'):
+        """Строка текста; top - верх строки, отсчитанный от верха страницы"""
+        baseline = PAGE_HEIGHT - top - get_fonts().ascent(role)
+        self.pages[-1].append(['text', role, list(color), x, baseline, align, text])
+
+    def line(self, x1, y, x2, color, width=0.5):
+        self.pages[-1].append(['line', list(color), width, x1, PAGE_HEIGHT - y, x2, PAGE_HEIGHT - y])
+
+    def image(self, jpeg, x, top, size):
+        # Одинаковые фото (одно изображение у нескольких блюд) хранятся один раз
+        if jpeg in self.images:
+            index = self.images.index(jpeg)
+        else:
+            self.images.append(jpeg)
+            index = len(self.images) - 1
+        self.pages[-1].append(['image', index, x, PAGE_HEIGHT - top - size, size])
+
+
+def _wrap(text, role, width, max_lines):
+    """Перенос по словам; ширина строки - сумма ширин слов"""
+    fonts = get_fonts()
+    space = fonts.width(role, ' ')
+    words = text.split()
+    lines, line, line_width = [], [], 0.0
+    for word in words:
+        word_width = fonts.width(role, word)
+        if line and line_width + space + word_width > width:
+            lines.append(' '.join(line))
+            if len(lines) == max_lines:
+                break
+            line, line_width = [], 0.0
+        line_width += word_width + (space if line else 0)
+        line.append(word)
+    else:
+        if line:
+            lines.append(' '.join(line))
+    if len(lines) == max_lines and sum(len(l.split()) for l in lines) < len(words):
+        lines[-1] = lines[-1].rstrip('.,') + '…'
+    return lines
+
+
+def _thumbnail(name, size):
+    """Квадратная копия фотографии size x size пунктов (JPEG при IMAGE_DPI) или None"""
+    if not name:
+        return None
+    pixels = _pixels(size)
+    try:
+        with Dish._meta.get_field('image').storage.open(name) as f, Image.open(f) as img:
+            img = img.convert('RGB')
+            # Квадрат по центру, как на карточках сайта
+            side = min(img.size)
+            left, top = (img.width - side) // 2, (img.height - side) // 2
+            img = img.crop((left, top, left + side, top + side)).resize(
+                (pixels, pixels), Image.LANCZOS, reducing_gap=2.0
+            )
+    except (OSError, ValueError) as e:
+        logger.warning("PDF меню: не удалось открыть изображение %s: %s", name, e)
+        return None
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def _format_price(price):
+    return f'{int(price):,}'.replace(',', ' ') + ' Sum'
+
+
+def render_cover(restaurant, logo):
+    fonts = get_fonts()
+    section = Section()
+    section.new_page()
+    y = PAGE_HEIGHT / 4
+    image = _thumbnail(logo, THUMB_SIZE * 2)
+    if image is not None:
+        section.image(image, (PAGE_WIDTH - THUMB_SIZE * 2) / 2, y, THUMB_SIZE * 2)
+        y += THUMB_SIZE * 2 + MARGIN / 2
+
+    section.text('title', PAGE_WIDTH / 2, y, restaurant.name, TEXT_COLOR, 'center')
+    y += fonts.line_height('title') + MARGIN / 2
+    for text in (restaurant.description, restaurant.address, restaurant.phone):
+        for line in _wrap(text or '', 'name', PAGE_WIDTH - 2 * MARGIN, 4):
+            section.text('name', PAGE_WIDTH / 2, y, line, MUTED_COLOR, 'center')
+            y += fonts.line_height('name')
+    return section
+
+
+def render_category(category, rows):
+    """Страницы категории: заголовок и строки блюд, перенос на новую страницу"""
+    fonts = get_fonts()
+    section = Section()
+    text_left = MARGIN + THUMB_SIZE + MARGIN / 2
+    text_width = PAGE_WIDTH - MARGIN - text_left
+    price_width = fonts.width('price', '999 999 999 Sum')
+
+    def start_page(continued):
+        section.new_page()
+        title = f'{category.name} (продолжение)' if continued else category.name
+        section.text('heading', MARGIN, MARGIN, title, ACCENT_COLOR)
+        y = MARGIN + fonts.line_height('heading') + 6
+        section.line(MARGIN, y, PAGE_WIDTH - MARGIN, ACCENT_COLOR, width=1)
+        return y + 10
+
+    y = start_page(False)
+    for name, description, price, image_name in rows:
+        name_lines = _wrap(name, 'name', text_width - price_width, 2)
+        description_lines = _wrap(description, 'text', text_width, DESCRIPTION_LINES)
+        text_height = len(name_lines) * fonts.line_height('name') + len(description_lines) * fonts.line_height('text')
+        row_height = max(THUMB_SIZE if image_name else 0, text_height) + 12
+        if y + row_height > PAGE_HEIGHT - MARGIN:
+            y = start_page(True)
+
+        thumbnail = _thumbnail(image_name, THUMB_SIZE)
+        if thumbnail is not None:
+            section.image(thumbnail, MARGIN, y, THUMB_SIZE)
+        left = text_left if image_name else MARGIN
+        section.text('price', PAGE_WIDTH - MARGIN, y, _format_price(price), ACCENT_COLOR, 'right')
+        line_y = y
+        for line in name_lines:
+            section.text('name', left, line_y, line, TEXT_COLOR)
+            line_y += fonts.line_height('name')
+        for line in description_lines:
+            section.text('text', left, line_y, line, MUTED_COLOR)
+            line_y += fonts.line_height('text')
+
+        y += row_height
+        section.line(MARGIN, y - 6, PAGE_WIDTH - MARGIN, RULE_COLOR)
+    return section
+
+
+# ------------------------- сборка PDF
+
+
+def write_pdf(pages, output):
+    """Выводит сверстанные страницы в PDF (reportlab).
+
+    Args:
+        pages: [(операции страницы, пути к фотографиям раздела)]
+        output: открытый на запись бинарный файл
+    """
+    fonts = get_fonts()
+    # invariant - без даты создания: одинаковое меню дает одинаковый файл (и ETag)
+    pdf = canvas.Canvas(output, pagesize=A4, pageCompression=1, invariant=1)
+    pdf.setTitle('Меню')
+    for ops, images in pages:
+        for op in ops:
+            kind = op[0]
+            if kind == 'text':
+                _, role, color, x, y, align, text = op
+                pdf.setFont(fonts.name, FONT_SIZES[role])
+                pdf.setFillColorRGB(*(c / 255 for c in color))
+                draw = {'left': pdf.drawString, 'right': pdf.drawRightString, 'center': pdf.drawCentredString}[align]
+                draw(x, y, text)
+            elif kind == 'line':
+                _, color, width, x1, y1, x2, y2 = op
+                pdf.setStrokeColorRGB(*(c / 255 for c in color))
+                pdf.setLineWidth(width)
+                pdf.line(x1, y1, x2, y2)
+            elif kind == 'image':
+                # JPEG встраивается как есть; повтор одного файла - одна копия в PDF
+                _, index, x, y, size = op
+                pdf.drawImage(images[index], x, y, size, size)
+        pdf.showPage()
+    if not pages:
+        # Пустое меню: одна чистая страница, чтобы PDF оставался корректным
+        pdf.showPage()
+    pdf.save()
+
+
+def get_cache_dir():
+    """Каталог сверстанных разделов и манифеста с их отпечатками"""
+    return str(getattr(settings, 'MENU_PDF_CACHE_DIR', os.path.join(settings.BASE_DIR, '.menu_pdf_cache')))
+
+
+class _BuildLock:
+    """Файловая блокировка: одновременно PDF собирает один процесс"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __enter__(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.file = open(os.path.join(self.directory, '.lock'), 'w')
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+
+def build_menu_pdf(output=None, force=False):
+    """Собирает PDF меню из базы и атомарно заменяет файл.
+
+    Заново верстаются (и обрабатывают фото) только разделы (обложка,
+    категории), данные которых изменились; остальные берутся из кеша.
+
+    Returns:
+        dict: pages - всего страниц, rendered/reused - перерисовано/из кеша разделов, seconds
+    """
+    output = str(output or MENU_PDF_PATH)
+    cache_dir = get_cache_dir()
+    started = time.monotonic()
+    with _BuildLock(cache_dir):
+        manifest_path = os.path.join(cache_dir, 'manifest.json')
+        manifest = {} if force else _load_manifest(manifest_path)
+        new_manifest, pages, rendered = {}, [], 0
+
+        for key, fingerprint, render in _load_menu():
+            cached = manifest.get(key)
+            if cached and cached['fingerprint'] == fingerprint and all(
+                os.path.exists(os.path.join(cache_dir, name)) for name in cached['files']
+            ):
+                entry = cached
+            else:
+                rendered += 1
+                entry = _save_section(cache_dir, f'{key}-{fingerprint}', render())
+                entry['fingerprint'] = fingerprint
+            new_manifest[key] = entry
+            with open(os.path.join(cache_dir, entry['files'][0]), encoding='utf-8') as f:
+                section = json.load(f)
+            images = [os.path.join(cache_dir, name) for name in entry['files'][1:]]
+            pages.extend((ops, images) for ops in section['pages'])
+
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        tmp_path = f'{output}.tmp'
+        with open(tmp_path, 'wb') as f:
+            write_pdf(pages, f)
+        # Читатели видят либо старый, либо новый файл целиком
+        os.replace(tmp_path, output)
+        menu_pdf.invalidate()
+
+        _save_manifest(manifest_path, new_manifest)
+        _remove_unused_files(cache_dir, new_manifest)
+
+    return {
+        'pages': max(len(pages), 1),
+        'rendered': rendered,
+        'reused': len(new_manifest) - rendered,
+        'seconds': round(time.monotonic() - started, 2),
+    }
+
+
+def _save_section(cache_dir, name, section):
+    """Сохраняет раздел в кеш: {name}.json с операциями и {name}-N.jpg с фото"""
+    files = [f'{name}.json']
+    for number, jpeg in enumerate(section.images):
+        files.append(f'{name}-{number}.jpg')
+        with open(os.path.join(cache_dir, files[-1]), 'wb') as f:
+            f.write(jpeg)
+    with open(os.path.join(cache_dir, files[0]), 'w', encoding='utf-8') as f:
+        json.dump({'pages': section.pages}, f, ensure_ascii=False)
+    return {'files': files}
+
+
+def _load_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(path, manifest):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _remove_unused_files(cache_dir, manifest):
+    used = {name for entry in manifest.values() for name in entry['files']}
+    for name in os.listdir(cache_dir):
+        if name.endswith(('.jpg', '.json')) and name != 'manifest.json' and name not in used:
+            os.remove(os.path.join(cache_dir, name))
+
+
+# ------------------------- фоновая пересборка
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='menu-pdf')
+_scheduled = False
+_schedule_lock = threading.Lock()
+
+
+def schedule_menu_pdf():
+    """Ставит пересборку PDF в фоновый поток.
+
+    Вызовы, пришедшие, пока сборка ждет в очереди, объединяются в одну:
+    она все равно прочитает из базы последние данные.
+    """
+    global _scheduled
+    if not getattr(settings, 'MENU_PDF_AUTOBUILD', True):
+        return
+    with _schedule_lock:
+        if _scheduled:
+            return
+        _scheduled = True
+    _executor.submit(_run_scheduled)
+
+
+def _run_scheduled():
+    global _scheduled
+    with _schedule_lock:
+        _scheduled = False
+    close_old_connections()
+    try:
+        build_menu_pdf()
+    except Exception:
+        logger.exception("Ошибка пересборки PDF меню")
+    finally:
+        close_old_connections()
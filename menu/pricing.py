@@ -0,0 +1,105 @@
+import threading
+from decimal import Decimal
+
+from .models import Dish
+from .revision import get_menu_version
+
+
+class PriceEntry:
+    __slots__ = ('id', 'name', 'price', 'is_available')
+
+    def __init__(self, dish):
+        self.id = dish.id
+        self.name = dish.name
+        self.price = dish.price
+        self.is_available = dish.is_available
+
+
+class PriceIndex:
+    """Индекс цен блюд в памяти процесса: {dish_id: PriceEntry}.
+
+    Недостающие блюда подгружаются одним запросом in_bulk. Запись блюда
+    сбрасывается сигналом сохранения Dish, а смена версии меню (изменение в
+    другом процессе) очищает индекс целиком.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def lookup(self, dish_ids):
+        """Актуальные цены блюд: {dish_id: PriceEntry}; удаленных блюд в ответе нет"""
+        version = get_menu_version()
+        with self._lock:
+            if version != self._version:
+                self._entries = {}
+                self._version = version
+            entries = self._entries
+
+        missing = [dish_id for dish_id in dish_ids if dish_id not in entries]
+        if missing:
+            fetched = Dish.objects.only('id', 'name', 'price', 'is_available').in_bulk(missing)
+            with self._lock:
+                for dish in fetched.values():
+                    entries[dish.id] = PriceEntry(dish)
+
+        return {dish_id: entries[dish_id] for dish_id in dish_ids if dish_id in entries}
+
+    def invalidate(self, dish_id=None):
+        with self._lock:
+            if dish_id is None:
+                self._entries = {}
+            else:
+                self._entries.pop(dish_id, None)
+
+
+price_index = PriceIndex()
+
+
+def cart_quantities(cart):
+    """Корзина в виде {dish_id: количество}.
+
+    Понимает и старый формат сессии, где позиция хранила снимок имени и цены.
+    """
+    quantities = {}
+    for dish_id, item in cart.items():
+        quantity = item['quantity'] if isinstance(item, dict) else item
+        try:
+            quantities[int(dish_id)] = int(quantity)
+        except (TypeError, ValueError):
+            continue
+    return quantities
+
+
+class PricedCart:
+    """Корзина с актуальными ценами; суммы - точные Decimal"""
+
+    def __init__(self, cart):
+        quantities = cart_quantities(cart)
+        prices = price_index.lookup(list(quantities))
+
+        self.lines = []
+        self.total_price = Decimal('0')
+        for dish_id, quantity in quantities.items():
+            entry = prices.get(dish_id)
+            if entry is None or not entry.is_available:
+                # Блюдо удалено или снято с продажи
+                continue
+            line_total = entry.price * quantity
+            self.lines.append((entry, quantity, line_total))
+            self.total_price += line_total
+
+        self.total_quantity = sum(quantity for _, quantity, _ in self.lines)
+
+    def items(self):
+        """Позиции для шаблона и API: {dish_id: {name, price, quantity, line_total}}"""
+        return {
+            str(entry.id): {
+                'name': entry.name,
+                'price': str(entry.price),
+                'quantity': quantity,
+                'line_total': str(line_total),
+            }
+            for entry, quantity, line_total in self.lines
+        }
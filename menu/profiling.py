@@ -0,0 +1,105 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates
+
+# Метрики текущего запроса (None вне PerformanceMiddleware)
+_current = ContextVar('menu_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Время и счетчики одного запроса по разделам: db, cache, template, image"""
+
+    __slots__ = ('started', 'durations', 'counts', 'cache_hits', 'cache_misses', 'queries')
+
+    def __init__(self, capture_queries=False):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.counts = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Список запросов к БД собирается только для выборочных запросов
+        self.queries = [] if capture_queries else None
+
+    def add(self, name, seconds, count=1):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def start_request(capture_queries=False):
+    metrics = RequestMetrics(capture_queries)
+    return metrics, _current.set(metrics)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def current_metrics():
+    return _current.get()
+
+
+@contextmanager
+def timed(name):
+    """Добавляет время блока к разделу name метрик текущего запроса"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - started)
+
+
+def record_cache(seconds, hits=0, misses=0):
+    """Вызывается кеш-бэкендом после обращения"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add('cache', seconds)
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+def query_timer(execute, sql, params, many, context):
+    """Обертка выполнения SQL (connection.execute_wrapper): время и текст запросов"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        metrics.add('db', duration)
+        if metrics.queries is not None:
+            metrics.queries.append({'sql': sql, 'ms': round(duration * 1000, 3), 'many': many})
+
+
+class TimedTemplate:
+    """Шаблон, время отрисовки которого учитывается в метриках запроса"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return self.template.render(context, request)
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django с замером времени отрисовки (раздел template)"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
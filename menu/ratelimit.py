@@ -0,0 +1,218 @@
+import re
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+# Сколько корзин (клиент + правило) держим в памяти процесса
+MAX_BUCKETS = 10000
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600}
+
+
+def parse_rate(rate):
+    """'30/m' -> (30, 60): число запросов и период в секундах"""
+    count, _, period = rate.partition('/')
+    try:
+        return int(count), PERIODS[period]
+    except (KeyError, ValueError):
+        raise ValueError(f"Неверный формат лимита: {rate!r} (ожидается, например, '30/m')")
+
+
+class RatePolicy:
+    """Правило лимита для группы путей.
+
+    Корзина токенов: в среднем count запросов за период и до burst
+    запросов подряд сверх этого.
+    """
+
+    def __init__(self, name, pattern, rate, burst=None, methods=None):
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.count, self.period = parse_rate(rate)
+        self.burst = burst if burst is not None else self.count
+        self.methods = {method.upper() for method in methods} if methods else None
+        self.refill_per_second = self.count / self.period
+
+    def matches(self, path, method):
+        if self.methods is not None and method not in self.methods:
+            return False
+        return self.pattern.match(path) is not None
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated', 'pending', 'synced', 'blocked_until')
+
+    def __init__(self, capacity, now):
+        self.tokens = capacity
+        self.updated = now
+        # Для синхронизации через общий кеш
+        self.pending = 0
+        self.synced = now
+        self.blocked_until = 0.0
+
+
+class RateLimiter:
+    """Лимитер запросов на корзинах токенов в памяти процесса.
+
+    Проверка не обращается к кешу: ограничения считаются в каждом процессе.
+    При shared_sync=True израсходованные токены раз в sync_interval секунд
+    суммируются в общем кеше, и клиент, превысивший лимит суммарно по всем
+    процессам, блокируется до конца окна.
+    """
+
+    def __init__(self, policies, exempt=(), shared_sync=False, sync_interval=1.0, client_ip_header='REMOTE_ADDR',
+                 trusted_proxies=1):
+        self.policies = list(policies)
+        self.exempt = re.compile('|'.join(f'(?:{pattern})' for pattern in exempt)) if exempt else None
+        self.shared_sync = shared_sync
+        self.sync_interval = sync_interval
+        self.client_ip_header = client_ip_header
+        self.trusted_proxies = max(1, trusted_proxies)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def get_policy(self, request):
+        path = request.path_info
+        if self.exempt is not None and self.exempt.match(path):
+            return None
+        method = request.method
+        for policy in self.policies:
+            if policy.matches(path, method):
+                return policy
+        return None
+
+    def get_client(self, request):
+        value = request.META.get(self.client_ip_header) or request.META.get('REMOTE_ADDR', '')
+        # X-Forwarded-For: каждый прокси дописывает адрес справа, а все левее
+        # прислал сам клиент. Адрес клиента - первый справа, не добавленный
+        # нашими прокси (их trusted_proxies)
+        hops = [hop.strip() for hop in value.split(',') if hop.strip()]
+        if not hops:
+            return ''
+        return hops[-min(self.trusted_proxies, len(hops))]
+
+    def check(self, request):
+        """Проверяет запрос.
+
+        Returns:
+            float | None: через сколько секунд повторить запрос, или None, если запрос разрешен
+        """
+        policy = self.get_policy(request)
+        if policy is None:
+            return None
+        return self.consume(policy, self.get_client(request))
+
+    async def acheck(self, request):
+        """check для ASGI: корзина проверяется в цикле событий, в поток уходит
+        только синхронизация с общим кешем (не чаще sync_interval на клиента)"""
+        policy = self.get_policy(request)
+        if policy is None:
+            return None
+        now = time.monotonic()
+        client = self.get_client(request)
+        retry_after, pending = self._take(policy, client, now)
+        if pending is None:
+            return retry_after
+        return await sync_to_async(self._sync_bucket, thread_sensitive=False)(policy, client, pending, now)
+
+    def consume(self, policy, client):
+        now = time.monotonic()
+        retry_after, pending = self._take(policy, client, now)
+        if pending is None:
+            return retry_after
+        return self._sync_bucket(policy, client, pending, now)
+
+    def _take(self, policy, client, now):
+        """Берет токен из корзины в памяти.
+
+        Returns:
+            tuple: (retry_after, None) - ответ готов; (None, pending) - запрос
+            разрешен, но пора добавить pending токенов в общий счетчик (_sync_bucket)
+        """
+        key = (policy.name, client)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= MAX_BUCKETS:
+                    self._prune(now)
+                bucket = self._buckets[key] = TokenBucket(policy.burst, now)
+            else:
+                bucket.tokens = min(policy.burst, bucket.tokens + (now - bucket.updated) * policy.refill_per_second)
+                bucket.updated = now
+
+            if bucket.blocked_until > now:
+                return bucket.blocked_until - now, None
+            if bucket.tokens < 1:
+                return (1 - bucket.tokens) / policy.refill_per_second, None
+            bucket.tokens -= 1
+
+            if not self.shared_sync:
+                return None, None
+            bucket.pending += 1
+            if now - bucket.synced < self.sync_interval:
+                return None, None
+            pending, bucket.pending, bucket.synced = bucket.pending, 0, now
+        return None, pending
+
+    def _sync_bucket(self, policy, client, pending, now):
+        # Обращение к кешу - вне блокировки и не чаще sync_interval на клиента
+        retry_after = self._sync(policy, client, pending)
+        if not retry_after:
+            return None
+        with self._lock:
+            bucket = self._buckets.get((policy.name, client))
+            if bucket is not None:
+                bucket.blocked_until = now + retry_after
+        return retry_after
+
+    def _sync(self, policy, client, pending):
+        """Добавляет израсходованные токены в общий счетчик окна.
+
+        Returns:
+            float: сколько секунд клиент должен ждать, если суммарный лимит превышен
+        """
+        wall_now = time.time()
+        window = int(wall_now // policy.period)
+        key = f'ratelimit:{policy.name}:{client}:{window}'
+        cache.add(key, 0, timeout=policy.period * 2)
+        try:
+            total = cache.incr(key, pending)
+        except ValueError:
+            return 0
+        if total > policy.count + policy.burst:
+            return (window + 1) * policy.period - wall_now
+        return 0
+
+    def _prune(self, now):
+        """Удаляет корзины, которые уже полностью восполнились (клиент давно не заходил)"""
+        policies = {policy.name: policy for policy in self.policies}
+        for key, bucket in list(self._buckets.items()):
+            policy = policies.get(key[0])
+            if policy is None or (now - bucket.updated) * policy.refill_per_second + bucket.tokens >= policy.burst:
+                del self._buckets[key]
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+def build_limiter():
+    """Лимитер по настройкам RATELIMIT_*"""
+    policies = [
+        RatePolicy(
+            name, options['path'], options['rate'],
+            burst=options.get('burst'), methods=options.get('methods'),
+        )
+        for name, options in getattr(settings, 'RATELIMIT_POLICIES', {}).items()
+    ]
+    return RateLimiter(
+        policies,
+        exempt=getattr(settings, 'RATELIMIT_EXEMPT_PATHS', ()),
+        shared_sync=getattr(settings, 'RATELIMIT_SHARED_SYNC', False),
+        sync_interval=getattr(settings, 'RATELIMIT_SYNC_INTERVAL', 1.0),
+        client_ip_header=getattr(settings, 'RATELIMIT_CLIENT_IP_HEADER', 'REMOTE_ADDR'),
+        trusted_proxies=getattr(settings, 'RATELIMIT_TRUSTED_PROXIES', 1),
+    )
@@ -0,0 +1,75 @@
+import time
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+# Ключ счетчика версии меню. Хранится без срока жизни.
+MENU_VERSION_KEY = 'menu:version'
+# Время последнего изменения меню (unix timestamp)
+MENU_MODIFIED_KEY = 'menu:modified'
+
+# Время жизни кеша данных меню. Ключи содержат версию меню,
+# поэтому устаревшие данные никогда не отдаются и TTL может быть большим.
+MENU_CACHE_TIMEOUT = getattr(settings, 'MENU_CACHE_TIMEOUT', 60 * 60 * 6)
+
+
+def get_menu_version():
+    """Текущая версия меню (инициализируется при первом обращении)"""
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        # Начинаем с текущего времени в микросекундах, чтобы после вытеснения
+        # ключа не переиспользовать номера версий, под которыми уже лежат данные
+        cache.add(MENU_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version():
+    """Увеличивает версию меню: все ранее закешированные данные становятся недействительными"""
+    cache.set(MENU_MODIFIED_KEY, int(time.time()), timeout=None)
+    try:
+        return cache.incr(MENU_VERSION_KEY)
+    except ValueError:
+        # Ключа нет (первый запуск или вытеснение) - инициализируем заново
+        get_menu_version()
+        return cache.incr(MENU_VERSION_KEY)
+
+
+def get_menu_revision():
+    """Версия и время последнего изменения меню одним обращением к кешу.
+
+    Returns:
+        tuple: (версия, datetime последнего изменения в UTC)
+    """
+    values = cache.get_many([MENU_VERSION_KEY, MENU_MODIFIED_KEY])
+    version = values.get(MENU_VERSION_KEY)
+    modified = values.get(MENU_MODIFIED_KEY)
+    if version is None:
+        version = get_menu_version()
+    if modified is None:
+        # Время изменения неизвестно - считаем меню измененным сейчас
+        modified = int(time.time())
+        cache.add(MENU_MODIFIED_KEY, modified, timeout=None)
+    return version, datetime.fromtimestamp(modified, tz=timezone.utc)
+
+
+async def aget_menu_revision():
+    """То же для async view: одно асинхронное обращение к кешу.
+
+    Инициализация ключей (первый запрос после очистки кеша) выполняется sync-версией.
+    """
+    values = await cache.aget_many([MENU_VERSION_KEY, MENU_MODIFIED_KEY])
+    version = values.get(MENU_VERSION_KEY)
+    modified = values.get(MENU_MODIFIED_KEY)
+    if version is None or modified is None:
+        return await sync_to_async(get_menu_revision)()
+    return version, datetime.fromtimestamp(modified, tz=timezone.utc)
+
+
+def menu_cache_key(*parts, version=None):
+    """Ключ кеша, привязанный к текущей (или переданной) версии меню"""
+    if version is None:
+        version = get_menu_version()
+    return ':'.join(['menu', str(version)] + [str(part) for part in parts])
@@ -0,0 +1,302 @@
+import heapq
+import re
+import threading
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Q
+
+from .compiler import _dish_data
+from .models import Category, Dish, MenuRevisionCounter, Tombstone
+from .revision import get_menu_version
+
+# Вес поля, в котором найдено слово
+NAME_WEIGHT = 3.0
+CATEGORY_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Вес типа совпадения: слово целиком, начало слова, слово с опечаткой
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.8
+FUZZY_MATCH = 0.5
+
+# Минимальное сходство по триграммам для слова с опечаткой
+FUZZY_THRESHOLD = 0.35
+# Короче этого слова с опечатками не ищутся: у них слишком мало триграмм
+FUZZY_MIN_LENGTH = 3
+
+# Узбекская кириллица и ё сводятся к базовым буквам, апострофы
+# узбекской латиницы (oʻ, gʻ) убираются
+FOLD_TABLE = str.maketrans({
+    'ё': 'е', 'ў': 'у', 'қ': 'к', 'ғ': 'г', 'ҳ': 'х',
+    'ʻ': None, 'ʼ': None, "'": None, '‘': None, '’': None, '`': None,
+})
+
+WORD_RE = re.compile(r'\w+')
+
+
+def fold(text):
+    """Приводит текст к форме для поиска: регистр, диакритика, узбекские буквы"""
+    # Диакритика убирается (й -> и): индекс и запрос сводятся одинаково
+    text = unicodedata.normalize('NFKD', text.casefold().translate(FOLD_TABLE))
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    return WORD_RE.findall(fold(text or ''))
+
+
+def trigrams(word):
+    padded = f'^{word}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrieNode:
+    __slots__ = ('children', 'terminal')
+
+    def __init__(self):
+        self.children = {}
+        # Узел - конец слова из словаря индекса
+        self.terminal = False
+
+
+class SearchDocument:
+    __slots__ = ('id', 'name', 'words', 'is_available', 'data')
+
+    def __init__(self, dish):
+        self.id = dish.id
+        self.is_available = dish.is_available
+        # Название в форме для поиска подстроки (админка)
+        self.name = fold(dish.name)
+        # {слово: вес лучшего поля, где оно встречается}
+        self.words = {}
+        for text, weight in ((dish.description, DESCRIPTION_WEIGHT), (dish.category.name, CATEGORY_WEIGHT),
+                             (dish.name, NAME_WEIGHT)):
+            for word in tokenize(text):
+                self.words[word] = max(weight, self.words.get(word, 0))
+        self.data = {**_dish_data(dish), 'category_id': dish.category_id, 'category_name': dish.category.name}
+
+
+class SearchIndex:
+    """Поисковый индекс блюд в памяти процесса.
+
+    Словарь слов названий, описаний и категорий хранится в префиксном дереве
+    (trie), для каждого слова - {id блюда: вес поля}. Слова с опечатками
+    ищутся по триграммам словаря. Индекс обновляется по ревизиям меню
+    (как api/changes/): после правки перечитываются только измененные блюда.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._root = TrieNode()
+        self._docs = {}
+        # {слово: {id блюда: вес}} и {триграмма: слова}
+        self._postings = {}
+        self._trigram_words = {}
+        # id недоступных блюд: в выдачу не попадают
+        self._unavailable = set()
+        self._revision = None
+        self._version = None
+
+    # ------------------------- обновление
+
+    def ensure_current(self):
+        """Догоняет изменения меню, если его версия сменилась (одно обращение к кешу)"""
+        version = get_menu_version()
+        if version != self._version:
+            self.sync()
+            self._version = version
+
+    def sync(self):
+        """Применяет изменения после последней прочитанной ревизии (при первом вызове - строит индекс)"""
+        with self._lock, transaction.atomic():
+            revision, pruned_through = MenuRevisionCounter.current()
+            since = self._revision
+            if since is None or since < pruned_through:
+                self._clear()
+                dishes = Dish.objects.select_related('category')
+                removed = []
+            else:
+                if revision == since:
+                    return
+                changed_categories = Category.objects.filter(revision__gt=since).values('id')
+                # Переименование категории меняет документы всех ее блюд
+                dishes = Dish.objects.select_related('category').filter(
+                    Q(revision__gt=since) | Q(category_id__in=changed_categories)
+                )
+                removed = Tombstone.objects.filter(
+                    revision__gt=since, model_label=Dish._meta.model_name
+                ).values_list('object_id', flat=True)
+
+            for dish_id in removed:
+                self.remove(dish_id)
+            for dish in dishes:
+                self.add(dish)
+            self._revision = revision
+
+    def refresh(self):
+        """Обновление после правки меню - только если индекс уже построен в этом процессе"""
+        if self._revision is not None:
+            self.sync()
+
+    def add(self, dish):
+        with self._lock:
+            self.remove(dish.id)
+            document = SearchDocument(dish)
+            self._docs[dish.id] = document
+            if not document.is_available:
+                self._unavailable.add(dish.id)
+            for word, weight in document.words.items():
+                postings = self._postings.get(word)
+                if postings is None:
+                    postings = self._postings[word] = {}
+                    self._add_word(word)
+                postings[dish.id] = weight
+
+    def remove(self, dish_id):
+        with self._lock:
+            document = self._docs.pop(dish_id, None)
+            if document is None:
+                return
+            self._unavailable.discard(dish_id)
+            for word in document.words:
+                postings = self._postings[word]
+                del postings[dish_id]
+                if not postings:
+                    del self._postings[word]
+                    self._remove_word(word)
+
+    def _add_word(self, word):
+        node = self._root
+        for char in word:
+            node = node.children.setdefault(char, TrieNode())
+        node.terminal = True
+        for gram in trigrams(word):
+            self._trigram_words.setdefault(gram, set()).add(word)
+
+    def _remove_word(self, word):
+        path = [self._root]
+        for char in word:
+            path.append(path[-1].children[char])
+        path[-1].terminal = False
+        # Удаляем опустевшие узлы снизу вверх
+        for char, parent, node in zip(reversed(word), reversed(path[:-1]), reversed(path[1:])):
+            if node.terminal or node.children:
+                break
+            del parent.children[char]
+        for gram in trigrams(word):
+            words = self._trigram_words[gram]
+            words.discard(word)
+            if not words:
+                del self._trigram_words[gram]
+
+    def _clear(self):
+        self._root = TrieNode()
+        self._docs = {}
+        self._postings = {}
+        self._trigram_words = {}
+        self._unavailable = set()
+
+    # ------------------------- поиск
+
+    def search(self, query, limit=20, include_unavailable=False):
+        """Блюда по запросу, лучшие первыми.
+
+        Каждое слово запроса должно совпасть с началом какого-либо слова блюда
+        (или, если таких нет, со словом, похожим по триграммам). Индекс перед
+        поиском актуализируется вызывающим кодом (ensure_current).
+
+        Returns:
+            list: данные блюд (как в load_dishes) с category_id и category_name
+        """
+        words = set(tokenize(query))
+        if not words:
+            return []
+
+        with self._lock:
+            # Для каждого слова запроса - {id блюда: лучший вес совпадения}
+            word_scores = []
+            for word in words:
+                scores = self._match(word)
+                if not scores:
+                    return []
+                word_scores.append(scores)
+            word_scores.sort(key=len)
+
+            totals = {}
+            rest = word_scores[1:]
+            for dish_id, score in word_scores[0].items():
+                for scores in rest:
+                    other = scores.get(dish_id)
+                    if other is None:
+                        break
+                    score += other
+                else:
+                    totals[dish_id] = score
+
+            if self._unavailable and not include_unavailable:
+                totals = {dish_id: score for dish_id, score in totals.items() if dish_id not in self._unavailable}
+            # При равном весе порядок - как в индексе (nlargest устойчив)
+            best = heapq.nlargest(limit or len(totals), totals, key=totals.__getitem__)
+            return [self._docs[dish_id].data for dish_id in best]
+
+    def name_contains(self, query):
+        """id блюд (и недоступных), в названии которых есть подстрока query - без учета регистра"""
+        needle = fold(query.strip())
+        with self._lock:
+            return [document.id for document in self._docs.values() if needle in document.name]
+
+    def _match(self, word):
+        """Блюда со словом, начинающимся с word (или похожим на него): {id блюда: вес}"""
+        matches = [(other, EXACT_MATCH if other == word else PREFIX_MATCH) for other in self._words_with_prefix(word)]
+        if not matches:
+            matches = [(other, FUZZY_MATCH * similarity) for other, similarity in self._similar_words(word).items()]
+
+        scores = {}
+        for other, match in matches:
+            postings = self._postings[other]
+            if not scores:
+                scores = {dish_id: weight * match for dish_id, weight in postings.items()}
+                continue
+            for dish_id, weight in postings.items():
+                score = weight * match
+                if score > scores.get(dish_id, 0):
+                    scores[dish_id] = score
+        return scores
+
+    def _words_with_prefix(self, prefix):
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        words = []
+        stack = [(node, prefix)]
+        while stack:
+            node, word = stack.pop()
+            if node.terminal:
+                words.append(word)
+            stack.extend((child, word + char) for char, child in node.children.items())
+        return words
+
+    def _similar_words(self, word):
+        """Слова словаря, похожие на word по триграммам: {слово: сходство}"""
+        if len(word) < FUZZY_MIN_LENGTH:
+            return {}
+        grams = trigrams(word)
+        shared = {}
+        for gram in grams:
+            for other in self._trigram_words.get(gram, ()):
+                shared[other] = shared.get(other, 0) + 1
+        similar = {}
+        for other, count in shared.items():
+            similarity = count / (len(grams) + len(other) - count)
+            if similarity >= FUZZY_THRESHOLD:
+                similar[other] = similarity
+        return similar
+
+    def __len__(self):
+        return len(self._docs)
+
+
+search_index = SearchIndex()
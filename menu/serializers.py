@@ -2,13 +2,19 @@ from rest_framework import serializers
 from .models import Category, Dish, Restaurant
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class ImageVariantsMixin(serializers.Serializer):
+    """URL уменьшенных копий изображения для srcset"""
+    image_variants = serializers.DictField(source='image_urls', child=serializers.CharField(), read_only=True)
+    image_srcset = serializers.CharField(read_only=True)
+
+
+class CategorySerializer(ImageVariantsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ['id', 'name', 'description', 'display_order', 'image']
+        fields = ['id', 'name', 'description', 'display_order', 'image', 'image_variants', 'image_srcset']
 
 
-class DishSerializer(serializers.ModelSerializer):
+class DishSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
 
     class Meta:
@@ -19,6 +25,8 @@ class DishSerializer(serializers.ModelSerializer):
             'description',
             'price',
             'image',
+            'image_variants',
+            'image_srcset',
             'category',
             'category_name',
             'display_order',
@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .changes import prune_tombstones, record_tombstone
+from .models import Category, Dish, Restaurant
+from .pdf import schedule_menu_pdf
+from .pricing import price_index
+from .revision import bump_menu_version
+from .search import search_index
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Dish)
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Dish)
+@receiver(post_delete, sender=Restaurant)
+def invalidate_menu_cache(sender, **kwargs):
+    """Любое изменение меню (views, админка, list_editable) сбрасывает кеш одной записью"""
+    # Версию увеличиваем после коммита: иначе параллельный запрос может
+    # закешировать старые данные под новой версией
+    transaction.on_commit(bump_menu_version)
+    # PDF меню пересобирается в фоне; неизменившиеся категории берутся из кеша страниц
+    transaction.on_commit(schedule_menu_pdf)
+    # Поисковый индекс процесса перечитывает только измененные блюда
+    transaction.on_commit(search_index.refresh)
+
+
+@receiver(post_save, sender=Dish)
+@receiver(post_delete, sender=Dish)
+def invalidate_dish_price(sender, instance, **kwargs):
+    """Цена блюда в индексе процесса сбрасывается сразу, не дожидаясь смены версии"""
+    price_index.invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Dish)
+@receiver(post_delete, sender=Restaurant)
+def remember_deletion(sender, instance, **kwargs):
+    """Надгробие для выгрузки изменений (api/changes/); удаления редки - тут же чистим старые"""
+    record_tombstone(instance)
+    transaction.on_commit(prune_tombstones)
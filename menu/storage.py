@@ -0,0 +1,93 @@
+import hashlib
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+# Каталог внутри MEDIA_ROOT для файлов, названных по хешу содержимого
+CONTENT_ADDRESSED_PREFIX = getattr(settings, 'CONTENT_ADDRESSED_MEDIA_PREFIX', 'images')
+
+DEFAULT_IMAGE_PATH = 'default_images/default_foto.png'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, называющее файлы по SHA-256 содержимого.
+
+    Одинаковые файлы (в том числе от разных моделей) хранятся один раз, а
+    содержимое по URL никогда не меняется - его можно кешировать навсегда.
+    """
+
+    prefix = CONTENT_ADDRESSED_PREFIX
+
+    def content_name(self, name, content):
+        """Имя файла по хешу: images/ab/ab12...ef.webp"""
+        sha = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            sha.update(chunk)
+        content.seek(0)
+        digest = sha.hexdigest()[:32]
+        extension = os.path.splitext(name or '')[1].lower()
+        return f'{self.prefix}/{digest[:2]}/{digest}{extension}'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        target = self.content_name(name, content)
+        if self.exists(target):
+            # Такой файл уже есть - дедупликация
+            return target
+
+        saved = super().save(target, content, max_length=max_length)
+        if saved != target:
+            # Параллельная запись того же содержимого успела раньше
+            self.delete(saved)
+        return target
+
+    def save_derived(self, name, content):
+        """Сохраняет файл, производный от content-addressed файла, под точным именем.
+
+        Имя уже однозначно определяется исходным хешем, поэтому существующий
+        файл не перезаписывается.
+        """
+        if self.exists(name):
+            return name
+        return super().save(name, content)
+
+    def is_immutable(self, name):
+        return name.startswith(self.prefix + '/')
+
+
+content_storage = ContentAddressedStorage()
+
+
+def image_models():
+    """Модели меню с обрабатываемыми изображениями"""
+    return [model for model in apps.get_app_config('menu').get_models() if hasattr(model, 'image_variants')]
+
+
+def is_image_referenced(name, exclude=None):
+    """Ссылается ли на файл какой-либо объект с изображением.
+
+    Args:
+        name: Имя файла в хранилище
+        exclude: Объект, ссылку которого не учитываем
+    """
+    for model in image_models():
+        queryset = model.objects.filter(image=name)
+        if exclude is not None and isinstance(exclude, model):
+            queryset = queryset.exclude(pk=exclude.pk)
+        if queryset.exists():
+            return True
+    return False
+
+
+def release_image_files(name, variants=None, exclude=None):
+    """Удаляет обработанное изображение и его копии, если они больше никому не нужны"""
+    if not name or name == DEFAULT_IMAGE_PATH:
+        return
+    if content_storage.is_immutable(name) and is_image_referenced(name, exclude=exclude):
+        return
+    for file_name in {name, *(variants or {}).values()}:
+        content_storage.delete(file_name)
@@ -0,0 +1,55 @@
+import hashlib
+
+from django import template
+from django.core.cache import cache
+
+from menu.revision import MENU_CACHE_TIMEOUT, get_menu_version, menu_cache_key
+
+register = template.Library()
+
+
+class MenuCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        # В режиме редактирования всегда рисуем заново
+        if context.get('is_edit_mode'):
+            return self.nodelist.render(context)
+
+        # Фрагменты menu.html рисуются и в наследующих его страницах (корзина) с другим
+        # контекстом - ключ включает шаблон страницы
+        template_name = context.template.name if context.template is not None else ''
+        parts = [template_name, str(self.name.resolve(context))]
+        parts += [str(var.resolve(context)) for var in self.vary_on]
+        digest = hashlib.md5(':'.join(parts).encode('utf-8'), usedforsecurity=False).hexdigest()
+        version = context.get('menu_version') or get_menu_version()
+        key = menu_cache_key('fragment', digest, version=version)
+
+        value = cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, MENU_CACHE_TIMEOUT)
+        return value
+
+
+@register.tag('menu_cache')
+def do_menu_cache(parser, token):
+    """Кеш фрагмента шаблона, привязанный к версии меню.
+
+    {% menu_cache 'header' [значения, от которых зависит фрагмент ...] %} ... {% endmenu_cache %}
+
+    Ключ - имя фрагмента, значения и шаблон страницы, которая его рисует.
+    Фрагмент сбрасывается вместе с остальным кешем меню при любой правке.
+    Версию берет из контекста (menu_version), если view ее уже знает.
+    """
+    nodelist = parser.parse(('endmenu_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' требует имя фрагмента")
+    return MenuCacheNode(
+        nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(bit) for bit in bits[2:]]
+    )
@@ -1,3 +1,1040 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import types
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from .cache_backends import SQLiteCache
+from .changes import prune_tombstones
+from .documents import StaticDocument
+from .image_pipeline import run_image_job
+from .metrics import LATENCY_BUCKETS, MetricsRegistry, histogram_quantile
+from .models import Category, Dish, ImageJob, Restaurant, revision_fields
+from .pagination import NEXT, encode_cursor
+from .pdf import build_menu_pdf
+from .pricing import PricedCart
+from .ratelimit import RateLimiter, RatePolicy
+from .revision import bump_menu_version, get_menu_version
+from .search import search_index
+from .urls import menu_urlpatterns
+from .views import serve_media
+
+
+def create_menu(dish_count, category_count=5):
+    """Наполняет БД без обработки изображений (bulk_create не вызывает save())"""
+    Restaurant.objects.bulk_create([Restaurant(name='Buxoro')])
+    Category.objects.bulk_create([
+        Category(name=f'Категория {i}', display_order=i) for i in range(category_count)
+    ])
+    categories = list(Category.objects.all())
+    Dish.objects.bulk_create([
+        Dish(
+            category=categories[i % category_count],
+            name=f'Блюдо {i}',
+            price=10000 + i,
+            display_order=i,
+        )
+        for i in range(dish_count)
+    ])
+    return categories
+
+
+def make_upload(name='dish.jpg', size=(2000, 1500)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 80, 40)).save(buffer, format='JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class MediaTestCase(TestCase):
+    """Тесты, записывающие файлы во временный MEDIA_ROOT"""
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.media_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.media_override.enable()
+
+    def tearDown(self):
+        self.media_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+
+class QueryCountTests(TestCase):
+    """Число запросов к БД не должно зависеть от размера меню"""
+
+    MENU_SIZES = (10, 100, 1000)
+
+    def setUp(self):
+        # Сбрасываем кеш меню и счетчики rate limit между прогонами
+        cache.clear()
+
+    def assertQueriesForSizes(self, expected, url_for):
+        for size in self.MENU_SIZES:
+            with self.subTest(dishes=size):
+                Dish.objects.all().delete()
+                Category.objects.all().delete()
+                Restaurant.objects.all().delete()
+                categories = create_menu(size)
+                cache.clear()
+
+                with self.assertNumQueries(expected):
+                    response = self.client.get(url_for(categories))
+                self.assertEqual(response.status_code, 200)
+
+    def test_load_dishes(self):
+        # Снимок меню компилируется двумя запросами
+        self.assertQueriesForSizes(2, lambda categories: reverse('load_dishes', args=[categories[0].id]))
+
+    def test_load_dishes_from_snapshot(self):
+        categories = create_menu(100)
+        url = reverse('load_dishes', args=[categories[0].id])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url + '?page=2')
+        self.assertEqual(response.status_code, 200)
+
+    def test_dish_list(self):
+        # COUNT + страница
+        self.assertQueriesForSizes(2, lambda categories: reverse('dish_list') + '?per_page=100')
+
+    def test_dish_list_by_category(self):
+        # Категория + COUNT + страница
+        self.assertQueriesForSizes(
+            3, lambda categories: reverse('dish_list_by_category', args=[categories[0].id]) + '?per_page=100'
+        )
+
+    def test_bulk_data(self):
+        self.assertQueriesForSizes(2, lambda categories: reverse('bulk_data'))
+
+    def test_category_list(self):
+        self.assertQueriesForSizes(1, lambda categories: reverse('category_list'))
+
+    def test_restaurant_list(self):
+        self.assertQueriesForSizes(1, lambda categories: reverse('restaurant_list'))
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.categories = create_menu(60, category_count=1)
+        # Одинаковые display_order проверяют, что id разрешает ничьи
+        Dish.objects.filter(id__in=Dish.objects.values('id')[:10]).update(display_order=0)
+
+    def walk(self, url):
+        """Проходит все страницы вперед, затем обратно до первой"""
+        forward, cursor, pages = [], '', []
+        while cursor is not None:
+            data = self.client.get(url, {'cursor': cursor, 'per_page': 7}).json()
+            forward.extend(dish['id'] for dish in data['dishes'])
+            pages.append([dish['id'] for dish in data['dishes']])
+            cursor = data['next_cursor']
+
+        backward, cursor = [], data['previous_cursor']
+        while cursor is not None:
+            data = self.client.get(url, {'cursor': cursor, 'per_page': 7}).json()
+            backward = [dish['id'] for dish in data['dishes']] + backward
+            cursor = data['previous_cursor']
+        return forward, backward, pages
+
+    def test_dish_list_cursor(self):
+        expected = list(Dish.objects.order_by('display_order', 'id').values_list('id', flat=True))
+        forward, backward, pages = self.walk(reverse('dish_list'))
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward + pages[-1], expected)
+
+    def test_load_dishes_cursor(self):
+        expected = list(Dish.objects.order_by('display_order', 'id').values_list('id', flat=True))
+        forward, backward, pages = self.walk(reverse('load_dishes', args=[self.categories[0].id]))
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward + pages[-1], expected)
+
+    def test_deep_page_has_no_count_query(self):
+        last = Dish.objects.order_by('display_order', 'id').last()
+        cursor = encode_cursor(NEXT, (last.display_order - 1, 0))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('dish_list'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+
+    def test_page_size_is_capped(self):
+        data = self.client.get(reverse('dish_list'), {'per_page': 100000}).json()
+        self.assertEqual(len(data['dishes']), 60)
+        self.assertEqual(self.client.get(reverse('dish_list'), {'cursor': 'мусор'}).status_code, 400)
+
+
+class ImagePipelineTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Category.objects.bulk_create([Category(name='Супы')])
+        self.category = Category.objects.get()
+
+    @override_settings(IMAGE_PROCESSING_ASYNC=True)
+    def test_upload_is_queued_without_processing(self):
+        dish = Dish(category=self.category, name='Шурпа', price=1, image=make_upload('shurpa.jpg'))
+        dish.save()
+
+        self.assertEqual(dish.image.name, 'dish_images/shurpa.jpg')
+        self.assertEqual(dish.image_status, Dish.IMAGE_STATUS_PENDING)
+        job = ImageJob.objects.get()
+        self.assertEqual((job.status, job.source), (ImageJob.STATUS_PENDING, 'dish_images/shurpa.jpg'))
+
+    @override_settings(IMAGE_PROCESSING_ASYNC=True)
+    def test_failed_processing_gets_new_revision(self):
+        dish = Dish(category=self.category, name='Шурпа', price=1,
+                    image=SimpleUploadedFile('broken.jpg', b'not an image', content_type='image/jpeg'))
+        dish.save()
+        revision = Dish.objects.get().revision
+        with self.assertLogs('menu.image_pipeline', 'WARNING'):
+            run_image_job(ImageJob.objects.get().id)
+
+        dish.refresh_from_db()
+        self.assertEqual(dish.image_status, Dish.IMAGE_STATUS_FAILED)
+        self.assertGreater(dish.revision, revision)
+
+    @override_settings(IMAGE_PROCESSING_ASYNC=False)
+    def test_processed_file_replaces_upload(self):
+        dish = Dish(category=self.category, name='Шурпа', price=1, image=make_upload('shurpa.jpg'))
+        dish.save()
+
+        dish.refresh_from_db()
+        self.assertRegex(dish.image.name, r'^images/[0-9a-f]{2}/[0-9a-f]{32}\.webp$')
+        self.assertEqual(dish.image_status, Dish.IMAGE_STATUS_READY)
+        self.assertEqual(dish.image_original, 'dish_images/shurpa.jpg')
+        self.assertEqual(ImageJob.objects.get().status, ImageJob.STATUS_DONE)
+        with Image.open(dish.image.path) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(image.size, (1024, 768))
+
+    @override_settings(IMAGE_PROCESSING_ASYNC=False)
+    def test_responsive_variants(self):
+        dish = Dish(category=self.category, name='Шурпа', price=1, image=make_upload('shurpa.jpg'))
+        dish.save()
+
+        base = dish.image.name[:-len('.webp')]
+        self.assertEqual(dish.image_variants, {
+            '160': f'{base}_w160.webp',
+            '320': f'{base}_w320.webp',
+            '640': f'{base}_w640.webp',
+            '1024': dish.image.name,
+        })
+        with Image.open(dish.image.storage.path(f'{base}_w320.webp')) as image:
+            self.assertEqual(image.size, (320, 240))
+
+        data = self.client.get(reverse('load_dishes', args=[self.category.id])).json()
+        self.assertEqual(data['dishes'][0]['image_variants']['160'], f'/media/{base}_w160.webp')
+        self.assertIn(f'/media/{base}_w640.webp 640w', data['dishes'][0]['image_srcset'])
+
+    @override_settings(IMAGE_PROCESSING_ASYNC=False)
+    def test_identical_uploads_are_stored_once(self):
+        first = Dish(category=self.category, name='Шурпа', price=1, image=make_upload('a.jpg'))
+        first.save()
+        second = Dish(category=self.category, name='Лагман', price=1, image=make_upload('b.jpg'))
+        second.save()
+        self.assertEqual(first.image.name, second.image.name)
+
+        # Замена изображения у одного блюда не удаляет общий файл
+        second.image = make_upload('c.jpg', size=(500, 500))
+        second.save()
+        self.assertTrue(first.image.storage.exists(first.image.name))
+
+        response = serve_media(RequestFactory().get('/media/' + first.image.name), first.image.name)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+
+@override_settings(IMAGE_PROCESSING_ASYNC=False)
+class ReprocessImagesCommandTests(MediaTestCase):
+
+    def test_reprocess_and_resume(self):
+        Category.objects.bulk_create([Category(name='Супы')])
+        dish = Dish(category=Category.objects.get(), name='Шурпа', price=1, image=make_upload('shurpa.jpg'))
+        dish.save()
+        old_name = dish.image.name
+        state = f'{self.media_root}/state.json'
+
+        out = io.StringIO()
+        call_command('reprocess_images', '--workers=1', '--quality=50', f'--state={state}', stdout=out)
+        self.assertIn('Перекодировано: 1', out.getvalue())
+        dish.refresh_from_db()
+        self.assertNotEqual(dish.image.name, old_name)
+        self.assertFalse(dish.image.storage.exists(old_name))
+        self.assertEqual(dish.image_original, 'dish_images/shurpa.jpg')
+
+        out = io.StringIO()
+        call_command('reprocess_images', '--workers=1', '--quality=50', f'--state={state}', stdout=out)
+        self.assertIn('пропущено: 1', out.getvalue())
+
+
+class GenerateMenuCommandTests(MediaTestCase):
+
+    def test_generates_reproducible_menu(self):
+        call_command('generate_menu', '--categories=3', '--dishes=30', '--images=1', stdout=io.StringIO())
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(Dish.objects.count(), 30)
+        dish = Dish.objects.order_by('id').first()
+        self.assertTrue(dish.image.name.endswith('.webp'))
+        self.assertTrue(dish.image.storage.exists(dish.image.name))
+        names = list(Dish.objects.order_by('id').values_list('name', flat=True))
+
+        with self.assertRaises(CommandError):
+            call_command('generate_menu', '--images=0', stdout=io.StringIO())
+        with self.assertRaisesMessage(CommandError, "Число блюд"):
+            call_command('generate_menu', '--dishes=-1', '--clear', stdout=io.StringIO())
+        call_command('generate_menu', '--categories=3', '--dishes=30', '--images=1', '--clear', stdout=io.StringIO())
+        self.assertEqual(list(Dish.objects.order_by('id').values_list('name', flat=True)), names)
+
+
+class CartStorageTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.categories = create_menu(3, category_count=1)
+        self.dish = Dish.objects.first()
+
+    def add_and_count(self):
+        self.client.get(reverse('add_to_cart', args=[self.dish.id]))
+        return self.client.get(reverse('get_cart')).json()['total_quantity']
+
+    def test_signed_cookie_backend(self):
+        with self.assertNumQueries(1):  # только проверка блюда
+            self.client.get(reverse('add_to_cart', args=[self.dish.id]))
+        self.assertIn('cart', self.client.cookies)
+        self.assertEqual(self.client.get(reverse('get_cart')).json()['total_quantity'], 1)
+
+        # Подделанная cookie дает пустую корзину
+        self.client.cookies['cart'] = 'forged:value'
+        self.assertEqual(self.client.get(reverse('get_cart')).json()['total_quantity'], 0)
+
+    @override_settings(CART_BACKEND='menu.cart.CacheCartBackend')
+    def test_cache_backend(self):
+        self.assertEqual(self.add_and_count(), 1)
+
+    @override_settings(CART_BACKEND='menu.cart.SessionCartBackend')
+    def test_session_backend(self):
+        self.assertEqual(self.add_and_count(), 1)
+
+    def test_menu_browsing_does_not_write(self):
+        url = reverse('load_dishes', args=[self.categories[0].id])
+        self.client.get(url)
+        self.client.get(reverse('add_to_cart', args=[self.dish.id]))
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertNotIn('cart', response.cookies)
+        self.assertNotIn('sessionid', response.cookies)
+
+    def test_cart_prices_follow_dish_price(self):
+        self.client.get(reverse('add_to_cart', args=[self.dish.id]))
+        self.client.post(reverse('update_cart'), {'dish_id': self.dish.id, 'quantity': 3})
+
+        self.dish.price = Decimal('0.10')
+        self.dish.save()
+        response = self.client.get(reverse('view_cart'))
+        self.assertEqual(response.context['total_price'], Decimal('0.30'))
+        self.assertEqual(response.context['cart'][str(self.dish.id)]['line_total'], '0.30')
+
+    def test_badge_skips_unavailable_dishes(self):
+        other = Dish.objects.exclude(pk=self.dish.pk).first()
+        self.client.get(reverse('add_to_cart', args=[self.dish.id]))
+        self.client.get(reverse('add_to_cart', args=[other.id]))
+        other.is_available = False
+        other.save()
+        # Значок и страница корзины считают одни и те же позиции
+        self.assertEqual(self.client.get(reverse('get_cart')).json()['total_quantity'], 1)
+        self.assertEqual(list(self.client.get(reverse('view_cart')).context['cart']), [str(self.dish.id)])
+
+    def test_legacy_cart_format(self):
+        cart = {str(self.dish.id): {'name': 'старое имя', 'price': 1.0, 'quantity': 2}}
+        priced_cart = PricedCart(cart)
+        self.assertEqual(priced_cart.total_quantity, 2)
+        self.assertEqual(priced_cart.total_price, self.dish.price * 2)
+
+
+class SQLiteCacheTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = f'{directory}/cache.sqlite3'
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': {'TOUCH_INTERVAL': 0, **options}})
+
+    def test_shared_between_instances(self):
+        # Второй экземпляр - как другой воркер с тем же файлом
+        other = self.make_cache()
+        self.cache.set('menu:version', 10, timeout=None)
+        self.assertEqual(other.incr('menu:version'), 11)
+        self.assertEqual(self.cache.get('menu:version'), 11)
+        other.delete('menu:version')
+        self.assertIsNone(self.cache.get('menu:version'))
+
+    def test_add_and_expiry(self):
+        self.assertTrue(self.cache.add('key', 'first'))
+        self.assertFalse(self.cache.add('key', 'second'))
+        self.cache.set('expired', 'value', timeout=-1)
+        self.assertTrue(self.cache.add('expired', 'fresh'))
+        self.assertEqual(self.cache.get_many(['key', 'expired', 'missing']), {'key': 'first', 'expired': 'fresh'})
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction(self):
+        backend = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for key in ('a', 'b', 'c'):
+            backend.set(key, key)
+        backend.get('a')
+        backend.set('d', 'd')
+        self.assertEqual(sorted(backend.get_many(['a', 'b', 'c', 'd'])), ['a', 'c', 'd'])
+
+    def test_size_is_checked_once_per_interval(self):
+        backend = self.make_cache(MAX_ENTRIES=1000)
+        statements = []
+        backend._connection.set_trace_callback(statements.append)
+        for i in range(25):
+            backend.set(f'key{i}', i)
+        # По умолчанию - раз в 1% MAX_ENTRIES записей
+        self.assertEqual(sum('COUNT(*)' in statement for statement in statements), 2)
+
+    def test_tests_do_not_use_cache_file(self):
+        self.assertNotIsInstance(cache, SQLiteCache)
+
+
+class SQLiteTuningTests(TestCase):
+
+    def test_connection_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+class RateLimitTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.policies = [RatePolicy('cart', r'^/add-to-cart/', '60/m', burst=2), RatePolicy('pages', r'^/', '600/m')]
+
+    @override_settings(
+        RATELIMIT_POLICIES={'cart': {'path': r'^/add-to-cart/', 'rate': '1/m', 'burst': 1}},
+        RATELIMIT_EXEMPT_PATHS=[r'^/media/'],
+    )
+    def test_middleware_returns_429(self):
+        dish = create_menu(1, category_count=1)[0].dishes.first()
+        url = reverse('add_to_cart', args=[dish.id])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        # Другие пути под правило не попадают
+        self.assertEqual(self.client.get(reverse('get_cart')).status_code, 200)
+
+    def test_policies_and_exemptions(self):
+        limiter = RateLimiter(self.policies, exempt=[r'^/media/'])
+        image = self.factory.get('/media/images/ab/ab.webp')
+        for _ in range(50):
+            self.assertIsNone(limiter.check(image))
+
+        add = self.factory.get('/add-to-cart/1/')
+        self.assertIsNone(limiter.check(add))
+        self.assertIsNone(limiter.check(add))
+        self.assertAlmostEqual(limiter.check(add), 1, delta=0.1)
+        self.assertIsNone(limiter.check(self.factory.get('/add-to-cart/1/', REMOTE_ADDR='10.0.0.2')))
+        self.assertIsNone(limiter.check(self.factory.get('/cart/')))
+
+    def test_client_from_forwarded_for(self):
+        header = {'HTTP_X_FORWARDED_FOR': '1.1.1.1, 203.0.113.7, 198.51.100.2'}
+        request = self.factory.get('/', **header)
+        # Левый адрес клиент может подставить сам
+        nginx = RateLimiter(self.policies, client_ip_header='HTTP_X_FORWARDED_FOR')
+        self.assertEqual(nginx.get_client(request), '198.51.100.2')
+        cdn_and_nginx = RateLimiter(self.policies, client_ip_header='HTTP_X_FORWARDED_FOR', trusted_proxies=2)
+        self.assertEqual(cdn_and_nginx.get_client(request), '203.0.113.7')
+        self.assertEqual(cdn_and_nginx.get_client(self.factory.get('/', HTTP_X_FORWARDED_FOR='203.0.113.7')),
+                         '203.0.113.7')
+
+    def test_shared_sync_blocks_across_processes(self):
+        # Три лимитера - как три воркера с общим кешем
+        policies = [RatePolicy('cart', r'^/add-to-cart/', '2/m', burst=2)]
+        workers = [RateLimiter(policies, shared_sync=True, sync_interval=0) for _ in range(3)]
+        request = self.factory.get('/add-to-cart/1/')
+        allowed = sum(worker.check(request) is None for _ in range(2) for worker in workers)
+        # Без синхронизации каждый воркер пропустил бы по 2 запроса - всего 6
+        self.assertEqual(allowed, 4)
+
+    def test_async_check_without_due_sync_stays_on_event_loop(self):
+        limiter = RateLimiter(self.policies, shared_sync=True, sync_interval=60)
+        request = self.factory.get('/add-to-cart/1/')
+        # До истечения sync_interval в поток уходить незачем
+        with mock.patch('menu.ratelimit.sync_to_async', side_effect=AssertionError('sync_to_async')):
+            self.assertIsNone(async_to_sync(limiter.acheck)(request))
+            self.assertIsNone(async_to_sync(limiter.acheck)(request))
+            self.assertAlmostEqual(async_to_sync(limiter.acheck)(request), 1, delta=0.1)
+
+
+class StaticDocumentTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = f'{directory}/menu.pdf'
+        self.data = bytes(range(256)) * 4
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+        self.document = StaticDocument(self.path, 'application/pdf')
+        self.factory = RequestFactory()
+
+    def get(self, **headers):
+        return self.document.serve(self.factory.get('/', **headers))
+
+    def test_full_and_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_range(self):
+        response = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[10:20])
+
+        self.assertEqual(b''.join(self.get(HTTP_RANGE='bytes=-5').streaming_content), self.data[-5:])
+        self.assertEqual(self.get(HTTP_RANGE=f'bytes={len(self.data)}-').status_code, 416)
+        # Файл изменился с момента первой загрузки - If-Range дает полный ответ
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"').status_code, 200)
+
+    async def test_async_streaming(self):
+        response = await self.document.aserve(self.factory.get('/', HTTP_RANGE='bytes=10-19'))
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join([chunk async for chunk in response]), self.data[10:20])
+
+        response = await self.document.aserve(self.factory.get('/'))
+        self.assertEqual(response['Content-Length'], str(len(self.data)))
+        self.assertEqual(b''.join([chunk async for chunk in response]), self.data)
+
+    def test_precompressed_and_sendfile(self):
+        with open(self.path + '.gz', 'wb') as f:
+            f.write(b'gzipped')
+        self.document.invalidate()
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Length'], '7')
+        self.assertNotIn('Content-Encoding', self.get())
+
+        self.document.sendfile = 'x-accel-redirect'
+        self.document.accel_prefix = '/protected/menu/'
+        response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/menu/menu.pdf')
+        self.assertEqual(response.content, b'')
+
+        # Сжатую копию выбирает nginx: Django не должен перенаправлять на .gz
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/menu/menu.pdf')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_length_of_opened_file(self):
+        self.document.stat()
+        # Файл пересобран в пределах stat_ttl
+        with open(self.path, 'ab') as f:
+            f.write(b'new')
+        response = self.get()
+        self.assertEqual(response['Content-Length'], str(len(self.data) + 3))
+        self.assertEqual(b''.join(response.streaming_content), self.data + b'new')
+
+
+class MenuPdfTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pdf_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.pdf_dir, ignore_errors=True)
+        pdf_override = override_settings(MENU_PDF_CACHE_DIR=f'{self.pdf_dir}/cache')
+        pdf_override.enable()
+        self.addCleanup(pdf_override.disable)
+        self.output = f'{self.pdf_dir}/menu.pdf'
+
+    def test_rebuilds_only_changed_categories(self):
+        create_menu(60, category_count=3)
+        stats = build_menu_pdf(output=self.output)
+        self.assertEqual((stats['rendered'], stats['reused']), (4, 0))  # обложка + 3 категории
+        with open(self.output, 'rb') as f:
+            data = f.read()
+        self.assertTrue(data.startswith(b'%PDF-'))
+        self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', data)), stats['pages'])
+        # Текст векторный со встроенным шрифтом, растровых страниц нет
+        self.assertIn(b'/FontFile2', data)
+        self.assertNotIn(b'/Subtype /Image', data)
+
+        dish = Dish.objects.first()
+        dish.price = 1
+        dish.save()
+        stats = build_menu_pdf(output=self.output)
+        self.assertEqual((stats['rendered'], stats['reused']), (1, 3))
+
+    def test_dish_photos_are_embedded_once(self):
+        create_menu(0, category_count=1)
+        category = Category.objects.get()
+        for name in ('Плов', 'Лагман'):
+            Dish.objects.create(category=category, name=name, price=1000, image=make_upload())
+        build_menu_pdf(output=self.output)
+        with open(self.output, 'rb') as f:
+            data = f.read()
+        # Одинаковые фото - один объект изображения
+        self.assertEqual(data.count(b'/Subtype /Image'), 1)
+        self.assertIn(b'/Width 220', data)
+
+
+class MenuPageCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.categories = create_menu(3, category_count=2)
+
+    def test_cached_page_without_queries(self):
+        url = reverse('menu')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Категория 1')
+        self.assertContains(response, '<title>Buxoro - Меню</title>', html=True)
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+
+    def test_cart_page_does_not_replace_menu_fragments(self):
+        # Корзина наследует menu.html, но без ресторана и категорий в контексте
+        self.client.get(reverse('view_cart'))
+        response = self.client.get(reverse('menu'))
+        self.assertContains(response, '<title>Buxoro - Меню</title>', html=True)
+        self.assertContains(response, 'Категория 1')
+
+    @override_settings(SITE_URL='https://menu.example/')
+    def test_og_image_does_not_depend_on_host(self):
+        Restaurant.objects.update(image='images/logo.webp')
+        bump_menu_version()
+        self.client.get(reverse('menu'), HTTP_HOST='evil.example')
+        response = self.client.get(reverse('menu'))
+        self.assertContains(response, '<meta property="og:image" content="https://menu.example/media/images/logo.webp">')
+        self.assertNotContains(response, 'evil.example')
+
+    def test_edit_mode_and_changes_bypass_cache(self):
+        url = reverse('menu')
+        self.client.get(url)
+        Category.objects.filter(pk=self.categories[0].pk).update(name='Супы')
+
+        response = self.client.get(url, {'edit': settings.EDIT_SECRET_KEY})
+        self.assertContains(response, 'Супы')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertNotContains(self.client.get(url), 'Супы')
+
+        bump_menu_version()
+        self.assertContains(self.client.get(url), 'Супы')
+
+
+class PublicCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.categories = create_menu(3, category_count=1)
+
+    def assertPublic(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=60', response['Cache-Control'])
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+        self.assertFalse(response.cookies)
+
+    def test_anonymous_menu_is_public(self):
+        self.assertPublic(self.client.get(reverse('menu')))
+        self.assertPublic(self.client.get(reverse('load_dishes', args=[self.categories[0].id])))
+        response = self.client.get(reverse('category_list'), HTTP_ACCEPT='application/json')
+        self.assertPublic(response)
+        self.assertIn('Accept', response['Vary'])
+        # Браузерный API DRF содержит CSRF-токен
+        response = self.client.get(reverse('category_list'), HTTP_ACCEPT='text/html')
+        self.assertNotIn('public', response['Cache-Control'])
+
+    def test_personal_responses_stay_private(self):
+        response = self.client.get(reverse('menu'), {'edit': settings.EDIT_SECRET_KEY})
+        self.assertIn('private', response['Cache-Control'])
+        response = self.client.get(reverse('menu'), {'user_id': '42'})
+        self.assertNotIn('public', response['Cache-Control'])
+        self.assertIn('sessionid', response.cookies)
+
+
+class MenuBundleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.categories = create_menu(6, category_count=2)
+
+    def test_bundle_contains_whole_menu(self):
+        response = self.client.get(reverse('menu_bundle'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        data = json.loads(response.content)
+        self.assertEqual([category['id'] for category in data['categories']],
+                         [category.id for category in self.categories])
+        self.assertEqual(sum(len(category['dishes']) for category in data['categories']), 6)
+
+    def test_known_categories_come_without_dishes(self):
+        data = json.loads(self.client.get(reverse('menu_bundle')).content)
+        first, second = data['categories']
+        Dish.objects.filter(category_id=second['id']).update(price=1)
+        bump_menu_version()
+
+        data = json.loads(self.client.get(reverse('menu_bundle'), {'known': f"{first['hash']},{second['hash']}"}).content)
+        self.assertEqual(data['categories'][0], {'id': first['id'], 'hash': first['hash']})
+        self.assertNotEqual(data['categories'][1]['hash'], second['hash'])
+        self.assertEqual(len(data['categories'][1]['dishes']), 3)
+
+    def test_gzip_and_not_modified(self):
+        response = self.client.get(reverse('menu_bundle'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['categories']), 2)
+
+        response = self.client.get(reverse('menu_bundle'), HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_service_worker_precaches_menu(self):
+        response = self.client.get(reverse('service_worker'))
+        self.assertEqual(response['Content-Type'], 'application/javascript')
+        self.assertEqual(response['Service-Worker-Allowed'], '/')
+        content = response.content.decode()
+        self.assertIn(reverse('menu_bundle'), content)
+        self.assertIn(f"menu-{get_menu_version()}", content)
+
+
+class ChangesAPITests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.categories = create_menu(4, category_count=2)
+
+    def get_changes(self, since=None):
+        params = {} if since is None else {'since': since}
+        response = self.client.get(reverse('menu_changes'), params, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_returns_only_changed_rows(self):
+        full = self.get_changes()
+        self.assertTrue(full['full'])
+        self.assertEqual(len(full['dishes']), 4)
+
+        dish = Dish.objects.first()
+        dish.price = 1
+        dish.save()
+        delta = self.get_changes(full['revision'])
+        self.assertFalse(delta['full'])
+        self.assertEqual([row['id'] for row in delta['dishes']], [dish.id])
+        self.assertEqual(delta['categories'], [])
+        self.assertEqual(self.get_changes(delta['revision'])['dishes'], [])
+
+    def test_deletes_are_reported(self):
+        revision = self.get_changes()['revision']
+        category = self.categories[0]
+        category_id = category.id
+        dish_ids = sorted(category.dishes.values_list('id', flat=True))
+        category.delete()
+        delta = self.get_changes(revision)
+        self.assertEqual(delta['deleted']['categories'], [category_id])
+        self.assertEqual(sorted(delta['deleted']['dishes']), dish_ids)
+
+    def test_pruned_tombstones_force_full_sync(self):
+        revision = self.get_changes()['revision']
+        Dish.objects.first().delete()
+        prune_tombstones(retention_days=-1)
+        self.assertTrue(self.get_changes(revision)['full'])
+
+    def test_revision_ahead_of_database_forces_full_sync(self):
+        revision = self.get_changes()['revision']
+        self.assertTrue(self.get_changes(revision + 100)['full'])
+
+    def test_etag_changes_when_tombstones_are_pruned(self):
+        revision = self.get_changes()['revision']
+        Dish.objects.first().delete()
+        bump_menu_version()
+        url = f"{reverse('menu_changes')}?since={revision}"
+        etag = self.client.get(url, HTTP_ACCEPT='application/json')['ETag']
+        # Версия меню в кеше не меняется, а ответ - да
+        prune_tombstones(retention_days=-1)
+        response = self.client.get(url, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['full'])
+
+    def test_invalid_since(self):
+        response = self.client.get(reverse('menu_changes'), {'since': 'x'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        search_index._revision = search_index._version = None
+        soups = Category.objects.create(name='Супы')
+        main = Category.objects.create(name='Горячие блюда')
+        self.shurpa = Dish.objects.create(category=soups, name='Шурпа', description='Баранина, овощи', price=30000)
+        self.plov = Dish.objects.create(category=main, name="Toshkent oshi (plov)", description='Рис, морковь',
+                                        price=45000)
+        self.lagman = Dish.objects.create(category=main, name='Лагман қовурма', price=35000)
+
+    def search(self, query):
+        response = self.client.get(reverse('search_dishes'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [dish['id'] for dish in response.json()['results']]
+
+    def test_prefix_and_field_weights(self):
+        self.assertEqual(self.search('шур'), [self.shurpa.id])
+        self.assertEqual(self.search('супы'), [self.shurpa.id])
+        # Совпадение в категории важнее совпадения в описании
+        self.assertEqual(self.search('б'), [self.plov.id, self.lagman.id, self.shurpa.id])
+
+    def test_folding_and_typos(self):
+        self.assertEqual(self.search('toshkent PLOV'), [self.plov.id])
+        self.assertEqual(self.search('коВурма'), [self.lagman.id])
+        self.assertEqual(self.search('лагмн'), [self.lagman.id])
+
+    def test_admin_search_matches_substring_of_name(self):
+        User.objects.create_superuser('admin', password='x')
+        self.client.login(username='admin', password='x')
+        response = self.client.get(reverse('admin:menu_dish_changelist'), {'q': 'УРП'})
+        self.assertEqual([dish.id for dish in response.context['cl'].result_list], [self.shurpa.id])
+        # Описание и категорию админка не ищет, опечатки - тоже
+        response = self.client.get(reverse('admin:menu_dish_changelist'), {'q': 'баранина'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
+    def test_index_follows_changes(self):
+        self.search('шурпа')
+        self.shurpa.name = 'Мастава'
+        self.shurpa.save()
+        self.lagman.delete()
+        # В TestCase коммита нет - версию меню сбрасываем сами
+        bump_menu_version()
+        self.assertEqual(self.search('мастава'), [self.shurpa.id])
+        self.assertEqual(self.search('шурпа'), [])
+        self.assertEqual(self.search('лагман'), [])
+
+        Dish.objects.filter(pk=self.plov.pk).update(is_available=False, **revision_fields())
+        bump_menu_version()
+        self.assertEqual(self.search('plov'), [])
+
+
+class PerformanceMiddlewareTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.categories = create_menu(3, category_count=1)
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir, ignore_errors=True)
+
+    @override_settings(PERFORMANCE_SERVER_TIMING=True)
+    def test_server_timing(self):
+        # Время обращений к кешу замеряет SQLiteCache
+        sqlite_cache = {'default': {'BACKEND': 'menu.cache_backends.SQLiteCache',
+                                    'LOCATION': f'{self.log_dir}/cache.sqlite3'}}
+        with override_settings(CACHES=sqlite_cache):
+            # Публичный ответ может попасть в CDN - без заголовка
+            self.assertNotIn('Server-Timing', self.client.get(reverse('menu')))
+            response = self.client.get(reverse('menu'), {'edit': settings.EDIT_SECRET_KEY})
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('template;dur=', timing)
+        self.assertIn('cache;dur=', timing)
+        self.assertRegex(timing, r'total;dur=[\d.]+$')
+
+    def test_slow_requests_are_logged_with_queries(self):
+        path = f'{self.log_dir}/slow.jsonl'
+        with override_settings(PERFORMANCE_SLOW_SAMPLE_RATE=1.0, PERFORMANCE_SLOW_REQUEST_MS=0,
+                               PERFORMANCE_SLOW_LOG=path):
+            self.client.get(reverse('load_dishes', args=[self.categories[0].id]), {'edit': 'secret'})
+        with open(path, encoding='utf-8') as f:
+            entry = json.loads(f.readline())
+        self.assertEqual(entry['status'], 200)
+        self.assertEqual(entry['path'], reverse('load_dishes', args=[self.categories[0].id]))
+        self.assertEqual(len(entry['queries']), entry['counts']['db'])
+        self.assertIn('SELECT', entry['queries'][0]['sql'])
+
+    @override_settings(PERFORMANCE_SLOW_SAMPLE_RATE=0, PERFORMANCE_SLOW_REQUEST_MS=0)
+    def test_unsampled_requests_are_not_logged(self):
+        with override_settings(PERFORMANCE_SLOW_LOG=f'{self.log_dir}/slow.jsonl'):
+            self.client.get(reverse('menu'))
+        self.assertFalse(os.path.exists(f'{self.log_dir}/slow.jsonl'))
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_shards_of_all_workers_are_merged(self):
+        workers = [MetricsRegistry(self.directory, flush_interval=0) for _ in range(2)]
+        for worker in workers:
+            worker.inc('menu_requests_total', (('route', 'menu'),))
+            worker.observe('menu_request_duration_seconds', 0.02, (('route', 'menu'),))
+        workers[1].observe('menu_request_duration_seconds', 3.0, (('route', 'menu'),))
+
+        text = MetricsRegistry(self.directory).render()
+        self.assertIn('menu_requests_total{route="menu"} 2', text)
+        self.assertIn('menu_request_duration_seconds_bucket{route="menu",le="0.025"} 2', text)
+        self.assertIn('menu_request_duration_seconds_count{route="menu"} 3', text)
+        self.assertIn('menu_request_duration_quantile_seconds{route="menu",quantile="0.99"} 4.925', text)
+
+    def test_quantiles_cover_recent_window(self):
+        worker = MetricsRegistry(self.directory, flush_interval=0, window=300)
+        worker.observe('menu_request_duration_seconds', 3.0, (('route', 'menu'),))
+        # Медленный запрос вышел из окна: в квантилях только новые
+        with mock.patch('menu.metrics.time.time', return_value=time.time() + 600):
+            worker.observe('menu_request_duration_seconds', 0.02, (('route', 'menu'),))
+            text = MetricsRegistry(self.directory, window=300).render()
+        self.assertIn('menu_request_duration_seconds_count{route="menu"} 2', text)
+        self.assertRegex(text, r'menu_request_duration_quantile_seconds\{route="menu",quantile="0.99"\} 0\.02\d*\n')
+
+    def test_histogram_quantile(self):
+        counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        counts[LATENCY_BUCKETS.index(0.1)] = 100
+        self.assertAlmostEqual(histogram_quantile(0.5, counts), 0.075)
+        counts[-1] = 100
+        self.assertEqual(histogram_quantile(0.99, counts), LATENCY_BUCKETS[-1])
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_requires_staff_or_token(self):
+        create_menu(2, category_count=1)
+        self.client.get(reverse('menu'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('menu_requests_total{route="menu",method="GET",status="200"}', response.content.decode())
+        self.client.generic('FOO', reverse('menu'))
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertIn('method="other"', response.content.decode())
+        self.assertNotIn('FOO', response.content.decode())
+
+        User.objects.create_user('admin', password='x', is_staff=True)
+        self.client.login(username='admin', password='x')
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+
+# Маршруты, как под ASGI: чтение меню обслуживают async-версии view
+async_urls = types.ModuleType('async_urls')
+async_urls.urlpatterns = menu_urlpatterns(async_read=True)
+
+
+@override_settings(ROOT_URLCONF=async_urls)
+class AsyncViewsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.categories = create_menu(30, category_count=2)
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir, ignore_errors=True)
+        # Каждый запрос пишется в журнал медленных запросов с разбивкой времени
+        self.slow_log = f'{log_dir}/slow.jsonl'
+        log_override = override_settings(PERFORMANCE_SLOW_SAMPLE_RATE=1.0, PERFORMANCE_SLOW_REQUEST_MS=0,
+                                         PERFORMANCE_SLOW_LOG=self.slow_log)
+        log_override.enable()
+        self.addCleanup(log_override.disable)
+
+    def last_logged(self):
+        with open(self.slow_log, encoding='utf-8') as f:
+            return json.loads(f.readlines()[-1])
+
+    def async_get(self, url, data=None, **headers):
+        async def get():
+            return await self.async_client.get(url, data, headers=headers)
+        return async_to_sync(get)()
+
+    def assertSameAsSync(self, name, *args, **params):
+        url = reverse(name, args=args)
+        with override_settings(ROOT_URLCONF='config.urls'):
+            expected = self.client.get(url, params, HTTP_ACCEPT='application/json')
+        response = self.async_get(url, params, accept='application/json')
+        self.assertEqual(response.status_code, expected.status_code, url)
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+        self.assertEqual(response.get('ETag'), expected.get('ETag'))
+        return response
+
+    def test_api_matches_sync_views(self):
+        category_id = self.categories[0].id
+        self.assertSameAsSync('restaurant_list')
+        self.assertSameAsSync('category_list')
+        self.assertSameAsSync('dish_list', page=2, per_page=4)
+        self.assertSameAsSync('dish_list_by_category', category_id, page=99, per_page=4)
+        self.assertSameAsSync('dish_list_by_category', category_id, cursor=encode_cursor(NEXT, (4, 0)), count=1)
+        self.assertSameAsSync('dish_list', per_page='x')
+        self.assertSameAsSync('dish_list_by_category', 0)
+        self.assertSameAsSync('load_dishes', category_id, page=2)
+        response = self.assertSameAsSync('bulk_data')
+
+        self.assertEqual(self.async_get(reverse('bulk_data'), if_none_match=response['ETag'],
+                                        accept='application/json').status_code, 304)
+
+    def test_queries_are_timed_in_worker_threads(self):
+        self.async_get(reverse('dish_list_by_category', args=[self.categories[0].id]))
+        entry = self.last_logged()
+        self.assertGreater(entry['counts']['db'], 0)
+        self.assertEqual(len(entry['queries']), entry['counts']['db'])
+
+    def test_menu_page_is_rendered_once_per_version(self):
+        url = reverse('menu')
+        self.assertContains(self.async_get(url), 'Категория 1')
+        response = self.async_get(url)
+        self.assertContains(response, 'Категория 1')
+        self.assertNotIn('template', self.last_logged()['durations_ms'])
+        self.assertIn('public', response['Cache-Control'])
+
+        Category.objects.filter(pk=self.categories[1].pk).update(name='Супы')
+        bump_menu_version()
+        self.assertContains(self.async_get(url), 'Супы')
+        self.assertContains(self.async_get(url, {'edit': settings.EDIT_SECRET_KEY}), 'csrfmiddlewaretoken')
+
+    def test_unknown_hosts_do_not_block_page_cache(self):
+        url = reverse('menu')
+        for i in range(10):
+            self.async_get(url, host=f'fake{i}.example')
+        self.async_get(url)
+        self.async_get(url)
+        self.assertNotIn('template', self.last_logged()['durations_ms'])
+
+    @override_settings(RATELIMIT_SHARED_SYNC=True, RATELIMIT_SYNC_INTERVAL=0)
+    def test_shared_ratelimit_sync_runs_off_event_loop(self):
+        on_loop = []
+
+        def sync(limiter, policy, client, pending):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(True)
+            except RuntimeError:
+                on_loop.append(False)
+            return 0
+
+        with mock.patch.object(RateLimiter, '_sync', autospec=True, side_effect=sync):
+            self.async_get(reverse('category_list'))
+        self.assertEqual(on_loop, [False])
@@ -1,25 +1,47 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
-from .views import RestaurantListView, CategoryListView, DishListView, CartView
-
-urlpatterns = [
-    path('v2/', views.menu_view, name='menu'),
-    path('', views.serve_menu_pdf, name='menu_pdf'),
-
-    path('load-dishes/<int:category_id>/', views.load_dishes, name='load_dishes'),
-    path('add-to-cart/<int:dish_id>/', views.add_to_cart, name='add_to_cart'),
-    path('cart/', views.view_cart, name='view_cart'),
-    path('remove-from-cart/<int:dish_id>/', views.remove_from_cart, name='remove_from_cart'),
-    path('update_cart/', views.update_cart, name='update_cart'),
-    path('get-cart/', views.get_cart, name='get_cart'),
-    path('update-dish/', views.update_dish, name='update_dish'),
-
-    # ----- API urls ---------
-    path('api/restaurants/', RestaurantListView.as_view(), name='restaurant_list'),
-    path('api/categories/', CategoryListView.as_view(), name='category_list'),
-    path('api/dishes/', DishListView.as_view(), name='dish_list'),
-    path('api/dishes/<int:category_id>/', DishListView.as_view(), name='dish_list_by_category'),
-    path('api/cart/', CartView.as_view(), name='cart'),
-
-]
+from . import async_views, views
+from .views import RestaurantListView, CategoryListView, DishListView, CartView, BulkDataAPIView, ChangesAPIView
+
+
+def menu_urlpatterns(async_read=False):
+    """Маршруты приложения.
+
+    async_read - чтение меню обслуживают async-версии view (menu/async_views.py, под ASGI)
+    """
+
+    def read(sync_view, async_view):
+        return async_view if async_read else sync_view
+
+    return [
+        path('v2/', read(views.menu_view, async_views.menu_view), name='menu'),
+        path('', read(views.serve_menu_pdf, async_views.serve_menu_pdf), name='menu_pdf'),
+        path('sw.js', views.service_worker, name='service_worker'),
+        path('metrics/', views.metrics_view, name='metrics'),
+
+        path('load-dishes/<int:category_id>/', read(views.load_dishes, async_views.load_dishes), name='load_dishes'),
+        path('add-to-cart/<int:dish_id>/', views.add_to_cart, name='add_to_cart'),
+        path('cart/', views.view_cart, name='view_cart'),
+        path('remove-from-cart/<int:dish_id>/', views.remove_from_cart, name='remove_from_cart'),
+        path('update_cart/', views.update_cart, name='update_cart'),
+        path('get-cart/', views.get_cart, name='get_cart'),
+        path('update-dish/', views.update_dish, name='update_dish'),
+
+        # ----- API urls ---------
+        path('api/restaurants/', read(RestaurantListView.as_view(), async_views.restaurant_list),
+             name='restaurant_list'),
+        path('api/categories/', read(CategoryListView.as_view(), async_views.category_list), name='category_list'),
+        path('api/dishes/', read(DishListView.as_view(), async_views.dish_list), name='dish_list'),
+        path('api/dishes/<int:category_id>/', read(DishListView.as_view(), async_views.dish_list),
+             name='dish_list_by_category'),
+        path('api/cart/', CartView.as_view(), name='cart'),
+        path('api/bulk/', read(BulkDataAPIView.as_view(), async_views.bulk_data), name='bulk_data'),
+        path('api/bundle/', views.menu_bundle, name='menu_bundle'),
+        path('api/changes/', ChangesAPIView.as_view(), name='menu_changes'),
+        path('api/search/', views.search_dishes, name='search_dishes'),
+
+    ]
+
+
+urlpatterns = menu_urlpatterns(async_read=getattr(settings, 'MENU_ASYNC_VIEWS', False))
@@ -1,50 +1,156 @@
 from django.conf import settings
-from django.core.cache import cache
+from django.contrib.auth.views import redirect_to_login
 from django.core.paginator import Paginator
-from django.http import JsonResponse, FileResponse, Http404
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.views.decorators.cache import cache_page
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.utils.functional import SimpleLazyObject
 from django.views.decorators.http import condition
-import os
-import time
+from django.views.static import serve as static_serve
+from functools import wraps
+import gzip
+import hashlib
+import json
+import zlib
 
-from .models import Category, Dish, Restaurant
+from .bundle import parse_known
+from .changes import get_changes
+from .compiler import DISHES_PER_PAGE, get_compiled_menu
+from .documents import choose_encoding, menu_pdf
+from .metrics import registry
+from .models import Category, Dish, MenuRevisionCounter, Restaurant
+from .pagination import paginate_queryset, parse_page_size
+from .pricing import PricedCart, price_index
+from .revision import get_menu_revision
+from .search import search_index
+from .storage import content_storage
 
 
-def serve_menu_pdf(request):
-    """Отдача PDF меню с долгосрочным кешированием в браузере"""
-    # Путь к PDF файлу
-    pdf_path = os.path.join(settings.BASE_DIR, 'static', 'menu', 'menu.pdf')
+# Сколько секунд общий кеш (CDN, reverse proxy) может отдавать меню без Django
+PUBLIC_CACHE_SECONDS = getattr(settings, 'MENU_PUBLIC_CACHE_SECONDS', 60)
 
-    # Проверяем существование файла
-    if not os.path.exists(pdf_path):
-        raise Http404("PDF меню не найдено")
 
-    # Открываем файл и создаем ответ
-    response = FileResponse(open(pdf_path, 'rb'), content_type='application/pdf')
+def _menu_revision(request):
+    """Ревизия меню, запомненная на время запроса"""
+    if not hasattr(request, '_menu_revision'):
+        request._menu_revision = get_menu_revision()
+    return request._menu_revision
 
-    # Устанавливаем заголовки для долгосрочного кеширования
-    # Cache-Control: кешировать на 30 дней (2592000 секунд)
-    response['Cache-Control'] = 'public, max-age=2592000, immutable'
 
-    # ETag для проверки изменений файла (используем время модификации)
-    file_mtime = os.path.getmtime(pdf_path)
-    etag = f'"{int(file_mtime)}"'
-    response['ETag'] = etag
+def _accept_tag(request):
+    # DRF отдает разные представления по Accept, поэтому он входит в ETag
+    return f'{zlib.crc32(request.META.get("HTTP_ACCEPT", "").encode()):x}'
+
+
+def _menu_etag(request, *args, **kwargs):
+    return f'{_menu_revision(request)[0]}-{_accept_tag(request)}'
+
+
+def _changes_etag(request, *args, **kwargs):
+    # Ответ зависит от ревизии в базе и от удаленных надгробий (prune_tombstones
+    # меняет его без смены версии меню в кеше)
+    revision, pruned_through = MenuRevisionCounter.current()
+    return f'r{revision}-{pruned_through}-{_accept_tag(request)}'
+
+
+def _menu_last_modified(request, *args, **kwargs):
+    return _menu_revision(request)[1]
+
+
+def _cache_publicly(request, response):
+    """Разрешает CDN/reverse proxy хранить ответ, если он одинаков для всех посетителей.
+
+    Браузер перепроверяет ответ каждый раз (max-age=0), общий кеш отдает его
+    сам MENU_PUBLIC_CACHE_SECONDS секунд. Ответы, читавшие сессию или ставящие
+    cookie, и браузерный API DRF (в нем CSRF-токен) остаются приватными.
+
+    Returns:
+        bool: ответ помечен как публичный
+    """
+    # В DRF view выбранный рендерер известен запросу раньше, чем ответу
+    renderer = getattr(response, 'accepted_renderer', None) or getattr(request, 'accepted_renderer', None)
+    session = getattr(request, 'session', None)
+    if (not PUBLIC_CACHE_SECONDS or request.method not in ('GET', 'HEAD')
+            or response.status_code not in (200, 304) or response.cookies
+            or (session is not None and session.accessed)
+            or getattr(renderer, 'format', None) == 'api'):
+        return False
+    patch_cache_control(response, public=True, max_age=0, s_maxage=PUBLIC_CACHE_SECONDS)
+    return True
+
+
+def menu_conditional(view_func):
+    """ETag/Last-Modified по ревизии меню: без изменений клиент получает 304 без выполнения view"""
+    conditional_view = condition(etag_func=_menu_etag, last_modified_func=_menu_last_modified)(view_func)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        return _finish_menu_response(request, conditional_view(request, *args, **kwargs))
+
+    return wrapper
+
+
+def changes_conditional(view_func):
+    """ETag выгрузки изменений (api/changes/) по ревизии базы: без изменений - 304"""
+    conditional_view = condition(etag_func=_changes_etag)(view_func)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        return _finish_menu_response(request, conditional_view(request, *args, **kwargs))
+
+    return wrapper
+
+
+def _finish_menu_response(request, response):
+    # Представление (и ETag) зависит от Accept
+    patch_vary_headers(response, ('Accept',))
+    if not _cache_publicly(request, response):
+        # Браузер хранит ответ, но перепроверяет его при каждом запросе
+        patch_cache_control(response, no_cache=True)
+    return response
 
-    # Expires заголовок (дополнительно для старых браузеров)
-    expires_time = time.time() + 2592000  # 30 дней
-    response['Expires'] = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(expires_time))
 
-    # Content-Disposition: открыть в браузере (не скачивать)
-    response['Content-Disposition'] = 'inline; filename="menu.pdf"'
+def serve_menu_pdf(request):
+    """Отдача PDF меню: 304, Range-запросы, sendfile (см. menu/documents.py)"""
+    return menu_pdf.serve(request)
+
+
+def metrics_view(request):
+    """Метрики всех воркеров в формате Prometheus.
+
+    Доступ - сотрудникам (вход через админку) или по заголовку
+    Authorization: Bearer <METRICS_TOKEN> для сборщика метрик.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorized = request.user.is_active and request.user.is_staff
+    if token and not authorized:
+        authorized = constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}')
+    if not authorized:
+        return redirect_to_login(request.get_full_path(), reverse('admin:login'))
+
+    response = HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    patch_cache_control(response, private=True, no_store=True)
+    return response
 
+
+def serve_media(request, path):
+    """Отдача медиафайлов (в DEBUG) с вечным кешированием content-addressed файлов"""
+    response = static_serve(request, path, document_root=settings.MEDIA_ROOT)
+    if content_storage.is_immutable(path):
+        # Имя файла - хеш содержимого: по этому URL содержимое никогда не изменится
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
     return response
 
 
 def menu_view(request):
     """Главная страница меню с категориями и информацией о ресторане"""
-    restaurant = Restaurant.objects.filter(is_active=True).first()
+    # Запросы ленивые: если фрагменты страницы уже в кеше, база не используется
+    restaurant = SimpleLazyObject(lambda: Restaurant.objects.filter(is_active=True).first())
     categories = Category.objects.all().order_by('display_order')
 
     # Проверяем секретный ключ для режима редактирования
@@ -59,106 +165,143 @@ def menu_view(request):
         'categories': categories,
         'restaurant': restaurant,
         'is_edit_mode': is_edit_mode,
+        # Версия меню для ключей кеша фрагментов ({% menu_cache %})
+        'menu_version': _menu_revision(request)[0],
+        # Адрес для абсолютных ссылок (og:image): не из заголовка Host - страница одна для всех
+        'site_url': settings.SITE_URL.rstrip('/'),
     }
-    return render(request, 'menu.html', context)
+    response = render(request, 'menu.html', context)
+    if is_edit_mode:
+        # Страница редактирования содержит CSRF-токен - только для этого браузера
+        patch_cache_control(response, private=True, no_store=True)
+    elif not _cache_publicly(request, response):
+        patch_cache_control(response, no_cache=True)
+    return response
 
 
-def load_dishes(request, category_id):
-    """Загрузка блюд по категории с пагинацией и кешированием"""
+def _dishes_page_response(request, compiled, category_id):
+    """Ответ load_dishes по снимку меню (общий для sync и async версий)"""
     try:
-        # Проверяем существование категории
-        category = get_object_or_404(Category, id=category_id)
-
-        # Параметры пагинации
-        page_number = int(request.GET.get('page', 1))
-        items_per_page = 15
+        if 'cursor' in request.GET:
+            page_size = parse_page_size(request.GET.get('per_page'), DISHES_PER_PAGE)
+            page = compiled.get_cursor_page(category_id, request.GET['cursor'], page_size)
+        else:
+            # Готовые JSON байты: ни запросов к БД, ни сериализации
+            page = compiled.get_page(category_id, int(request.GET.get('page', 1)))
+    except ValueError:
+        return JsonResponse({'error': 'Неверный формат параметров'}, status=400)
 
-        # Генерируем ключ для кеша
-        cache_key = f'dishes_cat_{category_id}_page_{page_number}'
+    if page is None:
+        return JsonResponse({'error': 'Категория не найдена'}, status=404)
 
-        # Пробуем получить из кеша
-        cached_response = cache.get(cache_key)
-        if cached_response:
-            return JsonResponse(cached_response)
+    return HttpResponse(page, content_type='application/json')
 
-        # Если нет в кеше, делаем запрос к БД с оптимизацией
-        dishes = Dish.objects.filter(
-            category=category,
-            is_available=True
-        ).only('id', 'name', 'description', 'price', 'image').order_by('display_order')
 
-        # Создаем пагинатор
-        paginator = Paginator(dishes, items_per_page)
-        page_obj = paginator.get_page(page_number)
+@menu_conditional
+def load_dishes(request, category_id):
+    """Загрузка блюд по категории из заранее скомпилированного снимка меню.
 
-        # Формируем данные
-        dish_data = [
-            {
-                'id': dish.id,
-                'name': dish.name,
-                'description': dish.description or '',
-                'price': str(dish.price),
-                'image_url': dish.image.url if dish.image else None,
-                'is_available': dish.is_available,
-            }
-            for dish in page_obj
-        ]
+    Параметр cursor включает keyset-пагинацию (пустой курсор - первая страница).
+    """
+    return _dishes_page_response(request, get_compiled_menu(), category_id)
 
-        # Формируем ответ
-        response_data = {
-            'dishes': dish_data,
-            'has_next': page_obj.has_next(),
-            'has_previous': page_obj.has_previous(),
-            'total_pages': paginator.num_pages,
-            'current_page': page_obj.number,
-        }
 
-        # Кешируем на 5 минут
-        cache.set(cache_key, response_data, 60 * 5)
+# Максимум результатов поиска за один запрос
+SEARCH_MAX_LIMIT = 50
 
-        return JsonResponse(response_data)
 
-    except Category.DoesNotExist:
-        return JsonResponse({'error': 'Категория не найдена'}, status=404)
+@menu_conditional
+def search_dishes(request):
+    """Поиск блюд по названию, описанию и категории (?q=, ?limit=) с учетом опечаток"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), SEARCH_MAX_LIMIT)
     except ValueError:
         return JsonResponse({'error': 'Неверный формат параметров'}, status=400)
 
+    search_index.ensure_current()
+    results = search_index.search(query, limit=limit) if query else []
+    return JsonResponse({'query': query, 'results': results})
 
-def add_to_cart(request, dish_id):
-    try:
-        dish = Dish.objects.get(id=dish_id, is_available=True)
-        cart = request.session.get('cart', {})
 
-        if str(dish_id) not in cart:
-            cart[str(dish_id)] = {
-                'name': dish.name,
-                'price': str(dish.price),
-                'quantity': 1
-            }
-            message = f"'{dish.name}' добавлено в корзину!"
+def menu_bundle(request):
+    """Все меню одним ответом для офлайн-режима.
+
+    ?known=hash1,hash2 - хеши категорий, уже сохраненных у клиента: такие
+    категории приходят без блюд. Полный ответ отдается заранее сжатым.
+    """
+    bundle = get_compiled_menu().bundle
+    known = parse_known(request.GET.get('known'))
+    # Разница сжимается на лету только gzip, полное тело - заранее всеми кодировками
+    encoding = choose_encoding(request, ('gzip',) if known else bundle.encoded)
+
+    known_digest = hashlib.md5(','.join(sorted(known)).encode()).hexdigest()[:8] if known else 'all'
+    etag = f'"{bundle.version}-{known_digest}-{encoding or "identity"}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if not known:
+            body = bundle.encoded[encoding] if encoding else bundle.body
         else:
-            message = f"{dish.name} уже в корзине!"
+            body = bundle.render(known)
+            if encoding:
+                body = gzip.compress(body)
+        response = HttpResponse(body, content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if not _cache_publicly(request, response):
+        patch_cache_control(response, no_cache=True)
+    return response
 
-        request.session['cart'] = cart
-        request.session.modified = True  # Добавляем эту строку
 
-        total_quantity = sum(item['quantity'] for item in cart.values())
-        return JsonResponse({'success': True, 'message': message, 'total_quantity': total_quantity})
+def service_worker(request):
+    """Service worker с манифестом предзагрузки для текущей версии меню"""
+    bundle = get_compiled_menu().bundle
+    precache = [
+        reverse('menu'),
+        reverse('menu_bundle'),
+        static('css/style.css'),
+        static('js/main.js'),
+        static('images/no-image.png'),
+        *bundle.thumbnail_urls(),
+    ]
+    response = render(request, 'sw.js', {
+        'version': bundle.version,
+        'precache': json.dumps(precache, ensure_ascii=False),
+    }, content_type='application/javascript')
+    # Браузер должен проверять обновление воркера при каждой загрузке
+    patch_cache_control(response, no_cache=True)
+    response['Service-Worker-Allowed'] = '/'
+    return response
 
-    except Dish.DoesNotExist:
+
+def add_to_cart(request, dish_id):
+    # Корзина хранит только id и количество; цена берется из индекса цен
+    dish = price_index.lookup([dish_id]).get(dish_id)
+    if dish is None or not dish.is_available:
         return JsonResponse({'error': 'Блюдо не найдено или недоступно'}, status=404)
 
+    cart = request.cart_store.load()
 
-def view_cart(request):
-    cart = request.session.get('cart', {})
+    if str(dish_id) not in cart:
+        cart[str(dish_id)] = 1
+        request.cart_store.save(cart)
+        message = f"'{dish.name}' добавлено в корзину!"
+    else:
+        message = f"{dish.name} уже в корзине!"
+
+    # Как в корзине: удаленные и снятые с продажи блюда не считаются
+    total_quantity = PricedCart(cart).total_quantity
+    return JsonResponse({'success': True, 'message': message, 'total_quantity': total_quantity})
 
-    total_price = 0
-    for item in cart.values():
-        total_price += float(item['price']) * item['quantity']
+
+def view_cart(request):
+    priced_cart = PricedCart(request.cart_store.load())
 
     context = {
-        'cart': cart,
-        'total_price': total_price,
+        'cart': priced_cart.items(),
+        'total_price': priced_cart.total_price,
     }
 
     return render(request, 'view_cart.html', context)
@@ -179,38 +322,37 @@ def update_cart(request):
         if quantity > 99:
             return JsonResponse({'success': False, 'message': 'Максимальное количество - 99'}, status=400)
 
-        cart = request.session.get('cart', {})
+        cart = request.cart_store.load()
 
         if dish_id in cart:
-            cart[dish_id]['quantity'] = quantity
-            request.session['cart'] = cart
-            request.session.modified = True
+            cart[dish_id] = quantity
+            request.cart_store.save(cart)
         else:
             return JsonResponse({'success': False, 'message': f'Блюдо с id {dish_id} не найдено в корзине.'}, status=404)
 
-        total_price = sum(float(item['price']) * item['quantity'] for item in cart.values())
+        total_price = PricedCart(cart).total_price
 
-        return JsonResponse({'success': True, 'total_price': total_price})
+        return JsonResponse({'success': True, 'total_price': str(total_price)})
     except (ValueError, TypeError):
         return JsonResponse({'error': 'Неверный формат данных'}, status=400)
     except Exception as e:
         return JsonResponse({'error': 'Ошибка сервера'}, status=500)
 
 def remove_from_cart(request, dish_id):
-    cart = request.session.get('cart', {})
+    cart = request.cart_store.load()
 
     if str(dish_id) in cart:
         del cart[str(dish_id)]
-        request.session['cart'] = cart
+        request.cart_store.save(cart)
         return redirect('view_cart')
     else:
         return JsonResponse({'error': 'Товар не найден в корзине'}, status=404)
 
 
 def get_cart(request):
-    cart = request.session.get('cart', {})
+    cart = request.cart_store.load()
 
-    total_quantity = sum(item['quantity'] for item in cart.values())
+    total_quantity = PricedCart(cart).total_quantity
 
     return JsonResponse({'total_quantity': total_quantity})
 
@@ -224,7 +366,17 @@ from rest_framework import status
 from .serializers import CategorySerializer, DishSerializer, RestaurantSerializer
 
 
-class RestaurantListView(APIView):
+class PublicMenuAPIView(APIView):
+    """Данные меню, общие для всех посетителей.
+
+    Без аутентификации сессия не читается: в ответе нет Vary: Cookie,
+    и его можно хранить в общем кеше.
+    """
+    authentication_classes = ()
+
+
+@method_decorator(menu_conditional, name='get')
+class RestaurantListView(PublicMenuAPIView):
 
     def get(self, request):
         restaurants = Restaurant.objects.all()
@@ -232,7 +384,8 @@ class RestaurantListView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class CategoryListView(APIView):
+@method_decorator(menu_conditional, name='get')
+class CategoryListView(PublicMenuAPIView):
 
     def get(self, request):
         categories = Category.objects.all().order_by('display_order')
@@ -240,17 +393,44 @@ class CategoryListView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class DishListView(APIView):
+@method_decorator(menu_conditional, name='get')
+class DishListView(PublicMenuAPIView):
 
     def get(self, request, category_id=None):
-        items_per_page = int(request.GET.get('per_page', 20))  # Кол-во блюд на страницу
-        page_number = int(request.GET.get('page', 1))  # Текущая страница
+        """Блюда с пагинацией.
+
+        По умолчанию - номера страниц (page, per_page). Параметр cursor включает
+        keyset-пагинацию по (display_order, id) без COUNT и OFFSET; общее
+        количество считается только при count=1.
+        """
+        try:
+            items_per_page = parse_page_size(request.GET.get('per_page'), 20)  # Кол-во блюд на страницу
+            page_number = int(request.GET.get('page', 1))  # Текущая страница
+        except ValueError:
+            return Response({'error': 'Неверный формат параметров'}, status=status.HTTP_400_BAD_REQUEST)
 
+        # select_related: category_name сериализуется без запроса на каждое блюдо
+        dishes = Dish.objects.select_related('category').filter(is_available=True).order_by('display_order', 'id')
         if category_id:
             category = get_object_or_404(Category, id=category_id)
-            dishes = Dish.objects.filter(category=category, is_available=True).order_by('display_order')
-        else:
-            dishes = Dish.objects.filter(is_available=True).order_by('display_order')
+            dishes = dishes.filter(category=category)
+
+        if 'cursor' in request.GET:
+            try:
+                page = paginate_queryset(dishes, request.GET['cursor'], items_per_page)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            data = {
+                'dishes': DishSerializer(page.items, many=True).data,
+                'has_next': page.has_next(),
+                'has_previous': page.has_previous(),
+                'next_cursor': page.next_cursor,
+                'previous_cursor': page.previous_cursor,
+            }
+            if request.GET.get('count') == '1':
+                data['count'] = dishes.count()
+            return Response(data, status=status.HTTP_200_OK)
 
         # Пагинация
         paginator = Paginator(dishes, items_per_page)
@@ -269,50 +449,47 @@ class DishListView(APIView):
 class CartView(APIView):
 
     def get(self, request):
-        cart = request.session.get('cart', {})
-        total_price = sum(float(item['price']) * item['quantity'] for item in cart.values())
+        priced_cart = PricedCart(request.cart_store.load())
         return Response({
-            'cart': cart,
-            'total_price': total_price,
-            'message': 'Корзина пуста.' if not cart else 'Корзина содержит товары.'
+            'cart': priced_cart.items(),
+            'total_price': str(priced_cart.total_price),
+            'message': 'Корзина пуста.' if not priced_cart.lines else 'Корзина содержит товары.'
         }, status=status.HTTP_200_OK)
 
     def post(self, request):
-        dish_id = request.data.get('dish_id')
         try:
-            dish = Dish.objects.get(id=dish_id, is_available=True)
-            cart = request.session.get('cart', {})
-
-            if str(dish_id) not in cart:
-                cart[str(dish_id)] = {
-                    'name': dish.name,
-                    'price': str(dish.price),
-                    'quantity': 1
-                }
-                message = f"'{dish.name}' добавлено в корзину!"
-            else:
-                message = f"'{dish.name}' уже в корзине!"
-
-            request.session['cart'] = cart
-            request.session.modified = True
+            dish_id = int(request.data.get('dish_id'))
+        except (TypeError, ValueError):
+            return Response({'error': 'Неверный формат данных'}, status=status.HTTP_400_BAD_REQUEST)
 
-            total_quantity = sum(item['quantity'] for item in cart.values())
-            return Response({'message': message, 'total_quantity': total_quantity}, status=status.HTTP_200_OK)
-        except Dish.DoesNotExist:
+        dish = price_index.lookup([dish_id]).get(dish_id)
+        if dish is None or not dish.is_available:
             return Response({'error': 'Блюдо не найдено или недоступно'}, status=status.HTTP_404_NOT_FOUND)
 
+        cart = request.cart_store.load()
+
+        if str(dish_id) not in cart:
+            cart[str(dish_id)] = 1
+            request.cart_store.save(cart)
+            message = f"'{dish.name}' добавлено в корзину!"
+        else:
+            message = f"'{dish.name}' уже в корзине!"
+
+        total_quantity = PricedCart(cart).total_quantity
+        return Response({'message': message, 'total_quantity': total_quantity}, status=status.HTTP_200_OK)
+
     def put(self, request):
         dish_id = request.data.get('dish_id')
         quantity = request.data.get('quantity', 1)
 
         try:
-            cart = request.session.get('cart', {})
+            cart = request.cart_store.load()
 
             if str(dish_id) in cart:
-                cart[str(dish_id)]['quantity'] = int(quantity)
-                request.session['cart'] = cart
-                total_price = sum(float(item['price']) * item['quantity'] for item in cart.values())
-                return Response({'message': 'Количество обновлено', 'total_price': total_price},
+                cart[str(dish_id)] = int(quantity)
+                request.cart_store.save(cart)
+                total_price = PricedCart(cart).total_price
+                return Response({'message': 'Количество обновлено', 'total_price': str(total_price)},
                                 status=status.HTTP_200_OK)
             else:
                 return Response({'error': 'Товар не найден в корзине'}, status=status.HTTP_404_NOT_FOUND)
@@ -323,13 +500,13 @@ class CartView(APIView):
         dish_id = request.data.get('dish_id')
 
         try:
-            cart = request.session.get('cart', {})
+            cart = request.cart_store.load()
 
             if str(dish_id) in cart:
                 del cart[str(dish_id)]
-                request.session['cart'] = cart
-                total_price = sum(float(item['price']) * item['quantity'] for item in cart.values())
-                return Response({'message': 'Блюдо удалено из корзины', 'total_price': total_price},
+                request.cart_store.save(cart)
+                total_price = PricedCart(cart).total_price
+                return Response({'message': 'Блюдо удалено из корзины', 'total_price': str(total_price)},
                                 status=status.HTTP_200_OK)
             else:
                 return Response({'error': 'Товар не найден в корзине'}, status=status.HTTP_404_NOT_FOUND)
@@ -337,17 +514,29 @@ class CartView(APIView):
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class BulkDataAPIView(APIView):
+@method_decorator(menu_conditional, name='get')
+class BulkDataAPIView(PublicMenuAPIView):
 
     def get(self, request):
-        categories = Category.objects.all()
-        dishes = Dish.objects.all()
+        # Тело ответа сериализуется один раз на версию меню
+        return HttpResponse(get_compiled_menu().bulk, content_type='application/json')
 
-        data = {
-            "categories": CategorySerializer(categories, many=True).data,
-            "dishes": DishSerializer(dishes, many=True).data,
-        }
-        return Response(data)
+
+@method_decorator(changes_conditional, name='get')
+class ChangesAPIView(PublicMenuAPIView):
+    """Изменения меню после ревизии ?since= (без параметра - полная выгрузка).
+
+    Клиент сохраняет поле revision ответа и передает его в следующем запросе:
+    объем ответа зависит от числа правок, а не от размера меню.
+    """
+
+    def get(self, request):
+        since = request.GET.get('since')
+        if since is not None:
+            if not since.isdigit():
+                return Response({'error': 'Неверный формат параметров'}, status=status.HTTP_400_BAD_REQUEST)
+            since = int(since)
+        return Response(get_changes(since), status=status.HTTP_200_OK)
 
 
 def update_dish(request):
@@ -374,15 +563,9 @@ def update_dish(request):
         if 'image' in request.FILES:
             dish.image = request.FILES['image']
 
+        # Кеш меню сбрасывается сигналом post_save
         dish.save()
 
-        # Очищаем кеш для категории этого блюда
-        category_id = dish.category.id
-        cache_pattern = f'dishes_cat_{category_id}_page_*'
-        # Удаляем все кеши для этой категории
-        for i in range(1, 100):  # Предполагаем максимум 100 страниц
-            cache.delete(f'dishes_cat_{category_id}_page_{i}')
-
         return JsonResponse({
             'success': True,
             'message': f'Блюдо "{dish.name}" успешно обновлено!',
@@ -21,6 +21,11 @@
                 messageHideDelay: 100
             },
 
+            // Все меню для офлайн-режима (api/bundle/): bundle - обновленное
+            // с сервера, storedBundle - сохраненное ранее (только без сети)
+            bundle: null,
+            storedBundle: null,
+
             /**
              * Инициализация приложения
              */
@@ -28,6 +33,11 @@
                 this.bindEvents();
                 this.loadCartCount();
                 this.setupHistoryManagement();
+                if (!isEditMode) {
+                    // В режиме редактирования данные всегда берутся с сервера
+                    this.loadBundle();
+                    this.registerServiceWorker();
+                }
                 console.log('✅ Приложение инициализировано');
             },
 
@@ -466,10 +476,91 @@
                 window.history.pushState({page: 'categories'}, '', window.location.pathname + window.location.search);
             },
 
+            /**
+             * Регистрация service worker для работы меню без сети
+             */
+            registerServiceWorker() {
+                if (!('serviceWorker' in navigator)) {
+                    return;
+                }
+                navigator.serviceWorker.register(serviceWorkerUrl, {scope: '/'}).catch((error) => {
+                    console.warn('Service worker не зарегистрирован:', error);
+                });
+            },
+
+            /**
+             * Загрузка всего меню: сохраненное в localStorage обновляется
+             * с сервера - неизменившиеся категории сервер присылает без блюд.
+             * До успешного обновления блюда загружаются с сервера как обычно
+             */
+            loadBundle() {
+                try {
+                    this.storedBundle = JSON.parse(localStorage.getItem('menu_bundle'));
+                } catch (e) {
+                    this.storedBundle = null;
+                }
+
+                const stored = this.storedBundle;
+                const known = stored ? stored.categories.map(category => category.hash) : [];
+                const url = known.length ? `${menuBundleUrl}?known=${known.join(',')}` : menuBundleUrl;
+                $.ajax({
+                    url: url,
+                    method: 'GET',
+                    timeout: 15000,
+                    success: (response) => {
+                        const previous = {};
+                        (stored ? stored.categories : []).forEach(category => {
+                            previous[category.id] = category;
+                        });
+                        // Заглушки {id, hash} заменяем сохраненными категориями
+                        response.categories = response.categories.map(category =>
+                            category.dishes ? category : previous[category.id]
+                        ).filter(Boolean);
+                        this.bundle = this.storedBundle = response;
+                        try {
+                            localStorage.setItem('menu_bundle', JSON.stringify(response));
+                        } catch (e) {
+                            console.warn('Не удалось сохранить меню:', e);
+                        }
+                    }
+                });
+            },
+
+            /**
+             * Страница блюд категории из меню bundle (null, если меню или категории нет)
+             */
+            getBundlePage(categoryId, page, bundle = this.bundle) {
+                if (!bundle) {
+                    return null;
+                }
+                const category = bundle.categories.find(item => item.id === Number(categoryId));
+                if (!category) {
+                    return null;
+                }
+                const perPage = this.config.itemsPerPage;
+                const totalPages = Math.max(1, Math.ceil(category.dishes.length / perPage));
+                const current = Math.min(Math.max(1, page), totalPages);
+                return {
+                    dishes: category.dishes.slice((current - 1) * perPage, current * perPage),
+                    has_next: current < totalPages,
+                    has_previous: current > 1,
+                    total_pages: totalPages,
+                    current_page: current
+                };
+            },
+
             /**
              * Загрузка блюд для категории с кешированием
              */
             loadDishes(categoryId, page = 1) {
+                // Сохраненное меню могло устареть: без сети - лучше оно, чем ничего
+                const bundle = this.bundle || (navigator.onLine === false ? this.storedBundle : null);
+                const bundlePage = isEditMode ? null : this.getBundlePage(categoryId, page, bundle);
+                if (bundlePage) {
+                    this.renderDishes(bundlePage);
+                    return;
+                }
+
                 const cacheKey = `dishes_${categoryId}_${page}`;
                 const cachedData = this.getCachedData(cacheKey);
 
@@ -496,6 +587,14 @@
                     error: (xhr) => {
                         this.hideLoadingIndicator();
 
+                        const offlinePage = xhr.status === 0 && !isEditMode
+                            ? this.getBundlePage(categoryId, page, this.storedBundle)
+                            : null;
+                        if (offlinePage) {
+                            this.renderDishes(offlinePage);
+                            return;
+                        }
+
                         let errorMessage = 'Ошибка при загрузке блюд';
 
                         if (xhr.status === 404) {
@@ -530,6 +629,7 @@
                         <div class="card h-70 dish-card" data-dish-id="${dish.id}">
                             <div class="dish-image-container">
                                 <img src="${dish.image_url || '/static/images/no-image.png'}"
+                                     ${dish.image_srcset ? `srcset="${dish.image_srcset}" sizes="(max-width: 768px) 50vw, 320px"` : ''}
                                      alt="${this.escapeHtml(dish.name)}"
                                      class="dish-image"
                                      loading="lazy"
@@ -0,0 +1,73 @@
+/**
+ * Service worker меню: офлайн-доступ к странице, данным и изображениям.
+ * Генерируется сервером (menu.views.service_worker) для версии меню {{ version }}.
+ */
+'use strict';
+
+const CACHE_NAME = 'menu-{{ version }}';
+const PRECACHE_URLS = {{ precache|safe }};
+const BUNDLE_URL = '{% url "menu_bundle" %}';
+const FALLBACK_PAGE = '{% url "menu" %}';
+
+self.addEventListener('install', (event) => {
+    event.waitUntil(
+        caches.open(CACHE_NAME)
+            // Отсутствующее изображение не должно срывать установку
+            .then(cache => Promise.all(PRECACHE_URLS.map(url => cache.add(url).catch(() => null))))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', (event) => {
+    // Кеши прошлых версий меню больше не нужны
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(
+                names.filter(name => name.startsWith('menu-') && name !== CACHE_NAME)
+                    .map(name => caches.delete(name))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+function cacheFirst(request) {
+    return caches.match(request).then(cached => cached || fetch(request).then(response => {
+        if (response.ok) {
+            const copy = response.clone();
+            caches.open(CACHE_NAME).then(cache => cache.put(request, copy));
+        }
+        return response;
+    }));
+}
+
+function networkFirst(request, fallbackUrl) {
+    return fetch(request).then(response => {
+        if (response.ok) {
+            const copy = response.clone();
+            caches.open(CACHE_NAME).then(cache => cache.put(request, copy));
+        }
+        return response;
+    }).catch(() => caches.match(request, {ignoreSearch: true})
+        .then(cached => cached || (fallbackUrl && caches.match(fallbackUrl))));
+}
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+    // Режим редактирования всегда работает с сервером
+    if (url.origin !== self.location.origin || url.searchParams.has('edit')) {
+        return;
+    }
+
+    if (url.pathname.startsWith('/static/') || url.pathname.startsWith('/media/')) {
+        // Статика и изображения меняют URL при изменении содержимого
+        event.respondWith(cacheFirst(request));
+    } else if (request.mode === 'navigate') {
+        event.respondWith(networkFirst(request, FALLBACK_PAGE));
+    } else if (url.pathname === BUNDLE_URL) {
+        event.respondWith(networkFirst(request));
+    }
+});